@@ -40,20 +40,120 @@ INSTALLED_APPS = [
     'orders',
     'rest_framework',
     'django_filters',
-    'drf_spectacular',
     'widget_tweaks',
 ]
 
+# Orders app
+
+# Number of orders per page of the HTML order list (keyset pagination).
+ORDERS_PAGE_SIZE = 50
+
+# Order events streamed to the live board: how many recent events are kept for
+# reconnecting clients, and the keep-alive interval of idle streams in seconds.
+ORDERS_EVENTS_HISTORY = 1000
+ORDERS_EVENTS_KEEPALIVE = 15
+
+# Maximum number of orders accepted by one bulk API request.
+ORDERS_BULK_MAX_ITEMS = 1000
+
+# Requests slower than this many milliseconds are logged to the
+# `orders.slow_requests` logger together with the SQL they ran. None disables
+# the log.
+ORDERS_SLOW_REQUEST_MS = 500
+
+# Per-request profiling for staff users (header `X-Profile: 1` or query
+# parameter `profile=1`). Stats are saved to ORDERS_PROFILE_DIR, keeping the
+# newest ORDERS_PROFILE_KEEP runs; summarize them with `profile_summary`.
+ORDERS_PROFILING = False
+ORDERS_PROFILE_DIR = BASE_DIR / 'profiles'
+ORDERS_PROFILE_KEEP = 50
+
+# Serve the order pages and API reads from the async views in
+# orders.async_views. Only useful with an ASGI server (cafe.asgi.application).
+ORDERS_ASYNC_VIEWS = False
+
+# Serve the live order board (board/) and its server-sent event stream
+# (events/). Needs an ASGI server (cafe.asgi.application): the stream never
+# ends, so under WSGI every open board would hold a worker thread.
+ORDERS_LIVE_BOARD = False
+
+# Cache for the rendered rows of the HTML order list (an alias in CACHES) and
+# how long a row is kept in seconds. Rows are also dropped on every write.
+ORDERS_FRAGMENT_CACHE = 'order_fragments'
+ORDERS_FRAGMENT_TIMEOUT = 24 * 3600
+
+# Run order writes of the views on one writer thread, which commits queued
+# writes together in batches of up to ORDERS_WRITE_BATCH_SIZE (see
+# orders.writer). Writes inside a transaction always run inline.
+ORDERS_WRITE_QUEUE = True
+ORDERS_WRITE_BATCH_SIZE = 100
+# Order creations queued together are inserted with one bulk_create; the
+# writer waits up to this long for more writes once a burst has started.
+ORDERS_WRITE_LINGER_MS = 2
+# At most this many writes wait in the queue; further writers block.
+ORDERS_WRITE_QUEUE_SIZE = 1000
+# A write not committed within this many seconds fails with a 503.
+ORDERS_WRITE_TIMEOUT = 30
+
+# Database aliases that the order reads of GET/HEAD requests are sent to
+# (see orders.replicas), e.g. ['replica']. After a write the client reads
+# from `default` for ORDERS_REPLICA_STICKY_SECONDS.
+ORDERS_READ_REPLICAS = []
+ORDERS_REPLICA_STICKY_SECONDS = 10
+
+# How long the open bills per table (orders.tables) are cached, in seconds.
+# They are cached per version of the orders, so every write recomputes them.
+ORDERS_TABLES_TIMEOUT = 5
+
+# Serve /api/schema/, /api/docs/ and /api/redoc/ from the files written to
+# ORDERS_SCHEMA_DIR by `build_schema` instead of generating the schema per
+# request (see orders.schema).
+ORDERS_PRECOMPUTED_SCHEMA = False
+ORDERS_SCHEMA_DIR = BASE_DIR / 'schema'
+
+# Paid orders older than this many days are moved to the archive by the
+# `archive_orders` command.
+ORDERS_ARCHIVE_AFTER_DAYS = 90
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'order_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'order-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+# With a prebuilt schema drf_spectacular is neither installed nor imported
+# by the web workers, and the views get DRF's plain inspector; build_schema
+# installs it and switches to its AutoSchema while generating.
+if not ORDERS_PRECOMPUTED_SCHEMA:
+    INSTALLED_APPS.append('drf_spectacular')
+
 REST_FRAMEWORK = {
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_SCHEMA_CLASS': (
+        'rest_framework.schemas.inspectors.ViewInspector' if ORDERS_PRECOMPUTED_SCHEMA
+        else 'drf_spectacular.openapi.AutoSchema'
+    ),
+}
+
+SPECTACULAR_SETTINGS = {
+    # Keep the schema endpoint itself out of the schema, so a prebuilt schema
+    # matches the generated one.
+    'SERVE_INCLUDE_SCHEMA': False,
 }
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'orders.middleware.RequestMetricsMiddleware',
+    'orders.middleware.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'orders.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -82,13 +182,45 @@ WSGI_APPLICATION = 'cafe.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite tuned for concurrent requests: in WAL mode readers never wait for the
+# writer; writers take the lock when their transaction starts (IMMEDIATE)
+# rather than failing on lock upgrades, and wait up to `timeout` seconds for
+# it. Connections are kept open between requests so that the pragmas run once
+# per connection.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA cache_size=-20000;'
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA mmap_size=134217728;'
+            ),
+        },
+    },
+    # A local stand-in read replica, kept current from `default` by
+    # `manage.py sync_replica`. Only used when listed in ORDERS_READ_REPLICAS.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.replica.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'init_command': 'PRAGMA cache_size=-20000;PRAGMA temp_store=MEMORY;PRAGMA mmap_size=134217728;',
+        },
+    },
 }
 
+DATABASE_ROUTERS = ['orders.replicas.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
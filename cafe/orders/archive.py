@@ -0,0 +1,142 @@
+"""
+Archiving of old paid orders.
+
+Paid orders older than ORDERS_ARCHIVE_AFTER_DAYS are moved from Order to
+OrderArchive by the `archive_orders` command, so the table behind the order
+lists, filters and signal handlers only holds recent orders however long the
+history gets. Orders are moved in batches, one transaction per batch: an
+interrupted run loses nothing, and running the command again continues with
+the orders that are still in Order.
+
+Archiving does not change the orders themselves, so it does not send
+`orders_changed`: the revenue ledger and the dish index keep counting
+archived orders. It does bump the change version and drop the cached list
+rows, since the lists no longer show the archived orders.
+
+Lists read Order only, unless their `created_after`/`created_before` range
+overlaps the archived orders; then they read OrderHistory, the union of both
+tables (see `orders_for`).
+"""
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from . import conditional, fragments
+from .filters import OrderFilter
+from .models import Order, OrderArchive, OrderHistory, OrderItem
+
+
+DEFAULT_AFTER_DAYS = 90
+
+BATCH_SIZE = 1000
+
+
+def archive_cutoff(days=None):
+    """Paid orders created before this moment are archived."""
+    if days is None:
+        days = getattr(settings, 'ORDERS_ARCHIVE_AFTER_DAYS', DEFAULT_AFTER_DAYS)
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable(cutoff):
+    return Order.objects.filter(status='paid', created_at__lt=cutoff)
+
+
+def archive_batch(cutoff, batch_size=BATCH_SIZE, after_id=0):
+    """
+    Moves up to `batch_size` archivable orders with ids above `after_id` to
+    the archive in one transaction. Returns their ids in ascending order.
+    """
+    using = router.db_for_write(Order)
+    with transaction.atomic(using=using):
+        orders = list(
+            archivable(cutoff).using(using).filter(id__gt=after_id)
+            .order_by('id').select_for_update()[:batch_size]
+        )
+        if not orders:
+            return []
+        ids = [order.id for order in orders]
+        now = timezone.now()
+        OrderArchive.objects.using(using).bulk_create([
+            OrderArchive(
+                id=order.id, table_number=order.table_number, items=order.items,
+                total_price=order.total_price, status=order.status,
+                created_at=order.created_at, updated_at=order.updated_at, archived_at=now,
+            )
+            for order in orders
+        ])
+        OrderItem.objects.using(using).filter(order_id__in=ids).delete()
+        # Not Order.delete(): its signals would take the orders out of the
+        # revenue ledger and the dish index.
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {connection.ops.quote_name(Order._meta.db_table)}"
+                f" WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                ids,
+            )
+        conditional.bump()
+        transaction.on_commit(partial(fragments.invalidate, ids), using=using)
+    return ids
+
+
+def archive_orders(cutoff, batch_size=BATCH_SIZE, progress=None):
+    """Archives every archivable order, calling `progress(archived so far)` after each batch. Returns the count."""
+    archived = 0
+    after_id = 0
+    while True:
+        ids = archive_batch(cutoff, batch_size, after_id)
+        if not ids:
+            return archived
+        archived += len(ids)
+        after_id = ids[-1]
+        if progress is not None:
+            progress(archived)
+
+
+def bounds():
+    """Returns (earliest, latest) `created_at` of the archived orders, or None if there are none."""
+    # Two queries rather than one aggregate, so that each is a lookup in the created_at index.
+    dates = OrderArchive.objects.order_by('created_at').values_list('created_at', flat=True)
+    first = dates.first()
+    return (first, dates.last()) if first is not None else None
+
+
+async def abounds():
+    dates = OrderArchive.objects.order_by('created_at').values_list('created_at', flat=True)
+    first = await dates.afirst()
+    return (first, await dates.alast()) if first is not None else None
+
+
+def requested_range(params):
+    """Returns the (created_after, created_before) of list parameters; None for absent or invalid values."""
+    form = OrderFilter(params, queryset=Order.objects.none()).form
+    if not form.is_valid():
+        return None, None
+    return form.cleaned_data.get('created_after'), form.cleaned_data.get('created_before')
+
+
+def reaches_archive(archive_bounds, after=None, before=None):
+    """True if the range [after, before) was given and overlaps the archived orders."""
+    if archive_bounds is None or (after is None and before is None):
+        return False
+    first, last = archive_bounds
+    return (after is None or after <= last) and (before is None or before > first)
+
+
+def orders_for(params):
+    """Order.objects, or OrderHistory.objects if the `created_at` range in `params` reaches into the archive."""
+    after, before = requested_range(params)
+    if (after or before) and reaches_archive(bounds(), after, before):
+        return OrderHistory.objects.all()
+    return Order.objects.all()
+
+
+async def aorders_for(params):
+    after, before = requested_range(params)
+    if (after or before) and reaches_archive(await abounds(), after, before):
+        return OrderHistory.objects.all()
+    return Order.objects.all()
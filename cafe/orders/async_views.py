@@ -0,0 +1,231 @@
+"""
+Async versions of the order views, for deployments on `cafe.asgi.application`.
+
+With `ORDERS_ASYNC_VIEWS = True` the URLs of the HTML views and the read
+actions of the orders API are served from here. The reads use the async ORM
+and do not hold a worker thread while waiting for the database; writes go
+through the async ORM as well, which runs the (transactional, signal-sending)
+model methods in Django's thread for sync code, or through the writer thread
+of `orders.writer` when ORDERS_WRITE_QUEUE is enabled.
+
+The API views serve JSON list and detail GETs themselves and hand every other
+request (writes, the browsable API, other formats) to OrderViewSet. Their
+list responses have the same shape as the viewset's (`next`, `previous`,
+`results`); the cursors are keyset cursors from `orders.pagination`, which
+clients treat as opaque anyway.
+"""
+import logging
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseServerError
+from django.shortcuts import aget_object_or_404, redirect, render
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from . import archive, conditional, writer
+from .filters import order_filterset
+from .forms import OrderFilterForm, OrderUpdateForm
+from .models import Order, OrderHistory
+from .pagination import InvalidCursor, OrderCursorPagination, akeyset_paginate, get_page_size
+from .revenue import atotal_revenue
+from .serializers import OrderSerializer
+from .views import OrderViewSet, filter_orders, list_context, parse_fields, parse_items
+
+
+logger = logging.getLogger(__name__)
+
+API_ORDERING_FIELDS = OrderViewSet.ordering_fields
+
+order_api_list_view = OrderViewSet.as_view({'get': 'list', 'post': 'create'})
+order_api_detail_view = OrderViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy',
+})
+
+
+@conditional.async_condition(etag_func=conditional.page_etag)
+async def order_list(request):
+    """Async version of `views.order_list`."""
+    try:
+        form = OrderFilterForm(request.GET)
+        orders, ordering = filter_orders(form)
+        page = await akeyset_paginate(orders, ordering, request.GET.get('cursor'))
+        revenue = await atotal_revenue()
+        return render(request, 'orders/orders_list.html', list_context(request, page, revenue, form))
+    except InvalidCursor as e:
+        return HttpResponseBadRequest(str(e))
+    except Exception as e:
+        logger.exception("Error in order_list: %s", e)
+        return HttpResponseServerError("An error occurred while processing your request.")
+
+
+async def order_create(request):
+    """Async version of `views.order_create`."""
+    if request.method == 'POST':
+        try:
+            table_number = request.POST.get('table_number')
+            items_input = request.POST.get('items')
+
+            if not table_number or not items_input:
+                return HttpResponseBadRequest("Table number and items are required.")
+
+            items = parse_items(items_input)
+            if not items:
+                return HttpResponseBadRequest("Invalid items format.")
+            total_price = sum(Decimal(item['price']) for item in items)
+
+            await writer.acreate(Order(
+                table_number=table_number,
+                items=items,
+                total_price=total_price,
+                status='pending'
+            ))
+            return redirect('orders_list')
+        except (ValueError, KeyError) as e:
+            return HttpResponseBadRequest(f"Invalid input data: {e}")
+        except writer.WriteTimeout as e:
+            return HttpResponse(e.detail, status=e.status_code)
+        except Exception as e:
+            logger.exception("Error in order_create: %s", e)
+            return HttpResponseServerError("An error occurred while creating the order.")
+
+    return render(request, 'orders/order_form.html')
+
+
+async def order_update(request, pk):
+    """Async version of `views.order_update`."""
+    try:
+        order = await aget_object_or_404(Order, pk=pk)
+
+        if request.method == 'POST':
+            form = OrderUpdateForm(request.POST, instance=order)
+            # Model validation may query the database.
+            if await sync_to_async(form.is_valid)():
+                await writer.arun(form.save)
+                return redirect('orders_list')
+        else:
+            form = OrderUpdateForm(instance=order)
+        return render(request, 'orders/order_edit.html', {'form': form, 'order': order})
+
+    except Http404:
+        raise Http404("Order not found")
+    except writer.WriteTimeout as e:
+        return HttpResponse(e.detail, status=e.status_code)
+    except Exception as e:
+        logger.exception("Error in order_update: %s", e)
+        return HttpResponseServerError("An error occurred while updating the order.")
+
+
+async def order_delete(request, pk):
+    """Async version of `views.order_delete`."""
+    try:
+        order = await aget_object_or_404(Order, pk=pk)
+        if request.method == 'POST':
+            await writer.arun(order.delete)
+            return redirect('orders_list')
+        return render(request, 'orders/order_confirm_delete.html', {'order': order})
+    except Http404:
+        raise Http404("Order not found")
+    except writer.WriteTimeout as e:
+        return HttpResponse(e.detail, status=e.status_code)
+    except Exception as e:
+        logger.exception("Error in order_delete: %s", e)
+        return HttpResponseServerError("An error occurred while deleting the order.")
+
+
+def wants_json(request):
+    """True for GETs the async API views answer themselves: JSON, not the browsable API."""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.GET.get(api_settings.URL_FORMAT_OVERRIDE, 'json') != 'json':
+        return False
+    return 'text/html' not in request.headers.get('Accept', '')
+
+
+def json_response(data, status=200):
+    response = HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+    response['Vary'] = 'Accept'
+    return response
+
+
+def api_ordering(request, searching):
+    """The keyset ordering for the `ordering` parameter, like OrderViewSet's OrderingFilter."""
+    param = request.GET.get(api_settings.ORDERING_PARAM, '').split(',')[0].strip()
+    if param.lstrip('-') in API_ORDERING_FIELDS:
+        return param
+    return 'search_rank' if searching else '-id'
+
+
+def api_page_size(request):
+    pagination = OrderCursorPagination
+    try:
+        size = int(request.GET[pagination.page_size_query_param])
+    except (KeyError, ValueError):
+        return get_page_size()
+    return min(size, pagination.max_page_size) if size > 0 else get_page_size()
+
+
+@csrf_exempt
+async def order_api_list(request):
+    """`GET /api/orders/` with the async ORM; other requests go to OrderViewSet."""
+    if not wants_json(request):
+        return await sync_to_async(order_api_list_view)(request)
+    return await _api_list(request)
+
+
+@conditional.async_condition(etag_func=conditional.api_etag)
+async def _api_list(request):
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+    except ValidationError as e:
+        return json_response(e.detail, status=400)
+
+    queryset = await archive.aorders_for(request.GET)
+    filterset = order_filterset(queryset)(request.GET, queryset=queryset)
+    if not filterset.is_valid():
+        return json_response(filterset.errors, status=400)
+    orders = filterset.qs
+
+    term = request.GET.get(api_settings.SEARCH_PARAM, '').strip()
+    ordering = api_ordering(request, searching=bool(term))
+    if term:
+        orders = orders.search(term, ranked=ordering == 'search_rank')
+    if fields is not None:
+        sort_field = ordering.lstrip('-')
+        orders = orders.only('id', *fields, *([sort_field] if sort_field != 'search_rank' else []))
+
+    try:
+        page = await akeyset_paginate(orders, ordering, request.GET.get('cursor'), api_page_size(request))
+    except InvalidCursor:
+        return json_response({'detail': "Invalid cursor"}, status=404)
+
+    url = request.build_absolute_uri()
+    return json_response({
+        'next': replace_query_param(url, 'cursor', page.next_cursor) if page.next_cursor else None,
+        'previous': replace_query_param(url, 'cursor', page.previous_cursor) if page.previous_cursor else None,
+        'results': OrderSerializer(page.items, many=True, fields=fields).data,
+    })
+
+
+@csrf_exempt
+async def order_api_detail(request, pk):
+    """`GET /api/orders/<id>/` with the async ORM; other requests go to OrderViewSet."""
+    if not wants_json(request):
+        return await sync_to_async(order_api_detail_view)(request, pk=pk)
+    return await _api_detail(request, pk)
+
+
+@conditional.async_condition(etag_func=conditional.api_etag)
+async def _api_detail(request, pk):
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+    except ValidationError as e:
+        return json_response(e.detail, status=400)
+    orders = OrderHistory.objects.only('id', *fields) if fields is not None else OrderHistory.objects.all()
+    order = await orders.filter(pk=pk).afirst()
+    if order is None:
+        return json_response({'detail': "No Order matches the given query."}, status=404)
+    return json_response(OrderSerializer(order, fields=fields).data)
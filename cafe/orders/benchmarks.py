@@ -0,0 +1,499 @@
+"""
+Synthetic data and benchmark scenarios for the orders app.
+
+`seed_orders` fills the database with realistic orders and `bench_orders`
+runs the scenarios below against it through the Django test client, so the
+full middleware, view, ORM and template stack is measured. Results are
+written as JSON so runs can be compared between commits.
+"""
+import asyncio
+import importlib
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, reverse
+from django.utils import timezone
+
+from . import bulk
+from .models import Order
+from .pagination import keyset_paginate
+from .views import parse_items
+
+
+MENU = [
+    ('Эспрессо', '2.50'), ('Американо', '3.00'), ('Капучино', '3.50'), ('Латте', '3.80'),
+    ('Раф', '4.20'), ('Чай черный', '2.20'), ('Чай зеленый', '2.20'), ('Какао', '3.20'),
+    ('Свежевыжатый сок', '4.50'), ('Лимонад', '3.90'), ('Круассан', '2.00'),
+    ('Круассан с миндалем', '2.80'), ('Сырники', '5.50'), ('Омлет', '5.20'), ('Каша овсяная', '3.90'),
+    ('Блины с ветчиной', '6.30'), ('Салат Цезарь', '7.80'), ('Греческий салат', '6.90'),
+    ('Борщ', '5.90'), ('Суп дня', '4.90'), ('Паста карбонара', '9.50'), ('Паста болоньезе', '9.20'),
+    ('Ризотто с грибами', '10.40'), ('Бургер', '10.99'), ('Чизбургер', '11.50'),
+    ('Картофель фри', '3.99'), ('Пицца Маргарита', '12.00'), ('Пицца Пепперони', '13.50'),
+    ('Стейк из лосося', '18.90'), ('Куриные крылья', '8.70'), ('Чизкейк', '5.40'),
+    ('Тирамису', '5.80'), ('Медовик', '4.90'), ('Мороженое', '3.60'),
+]
+
+STATUS_WEIGHTS = [('paid', 85), ('ready', 7), ('pending', 8)]
+ITEM_COUNT_WEIGHTS = [(1, 20), (2, 30), (3, 25), (4, 15), (5, 7), (6, 3)]
+
+
+def random_items(rng):
+    count = rng.choices(*zip(*ITEM_COUNT_WEIGHTS))[0]
+    return [{'name': name, 'price': price} for name, price in rng.choices(MENU, k=count)]
+
+
+def seed_orders(count, days=365, batch_size=5000, seed=None, progress=None):
+    """
+    Inserts `count` synthetic orders spread over the last `days` days.
+
+    Orders are created through `bulk.create_orders`, so lines, the revenue
+    ledger and the search index are filled as for real orders.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    statuses, status_weights = zip(*STATUS_WEIGHTS)
+    created = 0
+    while created < count:
+        batch = []
+        for _ in range(min(batch_size, count - created)):
+            items = random_items(rng)
+            batch.append(Order(
+                table_number=rng.randint(1, 30),
+                items=items,
+                total_price=sum(Decimal(item['price']) for item in items),
+                status=rng.choices(statuses, status_weights)[0],
+                created_at=now - timedelta(seconds=rng.randint(0, days * 86400)),
+            ))
+        bulk.create_orders(batch)
+        created += len(batch)
+        if progress:
+            progress(created)
+    return created
+
+
+def percentile(values, fraction):
+    """Linear-interpolated percentile of a sorted list."""
+    if not values:
+        return None
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize(timings, query_counts, elapsed):
+    timings = sorted(timings)
+    return {
+        'requests': len(timings),
+        'throughput_rps': len(timings) / elapsed if elapsed else None,
+        'latency_ms': {
+            'mean': statistics.fmean(timings) * 1000,
+            'p50': percentile(timings, 0.50) * 1000,
+            'p90': percentile(timings, 0.90) * 1000,
+            'p95': percentile(timings, 0.95) * 1000,
+            'p99': percentile(timings, 0.99) * 1000,
+            'max': timings[-1] * 1000,
+        },
+        'queries_per_request': statistics.fmean(query_counts) if query_counts else 0,
+    }
+
+
+class Scenario:
+    """A named operation that is timed `requests` times. Writes are rolled back after each run."""
+
+    def __init__(self, name, run, writes=False):
+        self.name = name
+        self.run = run
+        self.writes = writes
+
+    def measure(self, requests, warmup=5):
+        for _ in range(warmup):
+            self.call()
+        timings = []
+        query_counts = []
+        started = time.perf_counter()
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                self.call()
+                timings.append(time.perf_counter() - start)
+            query_counts.append(len(queries))
+        return summarize(timings, query_counts, time.perf_counter() - started)
+
+    def call(self):
+        if not self.writes:
+            return self.run()
+        with transaction.atomic():
+            result = self.run()
+            transaction.set_rollback(True)
+        return result
+
+
+def benchmark_client():
+    hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*']
+    return Client(HTTP_HOST=hosts[0] if hosts else 'localhost')
+
+
+def get(client, url, params=None, expected=200):
+    def run():
+        response = client.get(url, params or {})
+        if response.status_code != expected:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response
+    return run
+
+
+def post(client, url, data, expected, content_type=None):
+    def run():
+        kwargs = {'content_type': content_type} if content_type else {}
+        response = client.post(url, data, **kwargs)
+        if response.status_code != expected:
+            raise RuntimeError(f"POST {url} returned {response.status_code}")
+        return response
+    return run
+
+
+def send(client, method, url, data, expected):
+    """Like `post`, for the PUT, PATCH and DELETE requests of the API, with a JSON body."""
+    def run():
+        body = json.dumps(data) if data is not None else ''
+        response = getattr(client, method)(url, body, content_type='application/json')
+        if response.status_code != expected:
+            raise RuntimeError(f"{method.upper()} {url} returned {response.status_code}")
+        return response
+    return run
+
+
+def default_scenarios(client):
+    """
+    The scenarios run by `bench_orders`: every order page and API action.
+    The live board is left out, since its event stream does not end.
+    """
+    list_url = reverse('orders_list')
+    api_url = reverse('order-list')
+    sample = Order.objects.order_by('-id').values_list('id', flat=True).first()
+    # Transitions and status changes need orders that are not paid yet.
+    pending = list(Order.objects.filter(status='pending').order_by('-id').values_list('id', flat=True)[:50])
+    items = [{'name': 'Капучино', 'price': '3.50'}]
+    next_cursor = keyset_paginate(Order.objects.all(), 'created_at').next_cursor
+
+    scenarios = [
+        Scenario('order_list', get(client, list_url)),
+        Scenario('order_list:status=paid', get(client, list_url, {'status': 'paid'})),
+        Scenario('order_list:ordering=total_price', get(client, list_url, {'ordering': 'total_price'})),
+        Scenario('order_list:search', get(client, list_url, {'search': 'пицца'})),
+        Scenario('order_create', post(client, reverse('order_create'), {
+            'table_number': 7, 'items': 'Капучино 3.50, Круассан 2.00',
+        }, expected=302), writes=True),
+        Scenario('parse_items', lambda: parse_items('Капучино 3.50, Круассан 2.00, Паста карбонара 9.50')),
+        Scenario('api:order-list', get(client, api_url)),
+        Scenario('api:order-list:fields', get(client, api_url, {'fields': 'id,status,total_price'})),
+        Scenario('api:order-list:search', get(client, api_url, {'search': 'пицца'})),
+        Scenario('api:order-create', post(client, api_url, json.dumps({
+            'table_number': 7, 'items': [{'name': 'Капучино', 'price': '3.50'}],
+            'total_price': '3.50', 'status': 'pending',
+        }), expected=201, content_type='application/json'), writes=True),
+        Scenario('api:order-bulk', post(client, reverse('order-bulk'), json.dumps([{
+            'table_number': table, 'items': [{'name': 'Капучино', 'price': '3.50'}],
+            'total_price': '3.50', 'status': 'pending',
+        } for table in range(1, 51)]), expected=201, content_type='application/json'), writes=True),
+        Scenario('api:order-export', get(client, reverse('order-export'), {'format': 'csv', 'status': 'pending'})),
+        Scenario('api:report-sales', get(client, reverse('report-sales'), {'group_by': 'day,status'})),
+        Scenario('api:report-dishes', get(client, reverse('report-dishes'))),
+        Scenario('api:table-list', get(client, reverse('table-list'))),
+        Scenario('order_tables', get(client, reverse('order_tables'))),
+    ]
+    if next_cursor:
+        scenarios.insert(3, Scenario('order_list:page=2', get(
+            client, list_url, {'ordering': 'created_at', 'cursor': next_cursor},
+        )))
+    if sample is not None:
+        detail_url = reverse('order-detail', args=[sample])
+        scenarios += [
+            Scenario('order_update', post(client, reverse('order_edit', args=[sample]), {
+                'table_number': 8, 'items': json.dumps(items), 'status': 'pending',
+            }, expected=302), writes=True),
+            Scenario('order_delete', post(client, reverse('order_delete', args=[sample]), {}, expected=302), writes=True),
+            Scenario('api:order-detail', get(client, detail_url)),
+            Scenario('api:order-update', send(client, 'put', detail_url, {
+                'table_number': 8, 'items': items, 'total_price': '3.50', 'status': 'pending',
+            }, expected=200), writes=True),
+            Scenario('api:order-partial-update', send(client, 'patch', detail_url, {'table_number': 8}, expected=200),
+                     writes=True),
+            Scenario('api:order-destroy', send(client, 'delete', detail_url, None, expected=204), writes=True),
+        ]
+    if pending:
+        scenarios += [
+            Scenario('api:order-transition', post(
+                client, reverse('order-transition', args=[pending[0]]), json.dumps({'status': 'ready'}),
+                expected=200, content_type='application/json',
+            ), writes=True),
+            Scenario('api:order-bulk-status', send(client, 'patch', reverse('order-bulk-status'), [
+                {'id': order_id, 'status': 'ready'} for order_id in pending
+            ], expected=200), writes=True),
+        ]
+    return scenarios
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(scenarios, requests, only=None):
+    results = {}
+    for scenario in scenarios:
+        if only and not any(scenario.name.startswith(name) for name in only):
+            continue
+        results[scenario.name] = scenario.measure(requests)
+    return {
+        'meta': {
+            'timestamp': timezone.now().isoformat(),
+            'revision': git_revision(),
+            'orders': Order.objects.count(),
+            'requests_per_scenario': requests,
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline):
+    """Yields (scenario, metric, baseline value, current value, relative change) for common scenarios."""
+    for name, result in current['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        for metric in ('p50', 'p95'):
+            before = previous['latency_ms'][metric]
+            after = result['latency_ms'][metric]
+            yield name, metric, before, after, (after - before) / before if before else None
+
+
+# Concurrency: the same GETs from many clients at once, through Django's WSGI
+# handler (one thread per client, like a threaded WSGI server) and through
+# its ASGI handler (one asyncio task per client on one event loop), with the
+# sync or the async views. No network server is involved, so the numbers
+# compare the request handling models, not web servers.
+CONCURRENCY_MODES = ['wsgi', 'asgi', 'asgi+async-views']
+
+
+def reload_urlconf():
+    """Re-imports the URLconfs, e.g. after changing ORDERS_ASYNC_VIEWS."""
+    for name in ('orders.urls', settings.ROOT_URLCONF):
+        if name in sys.modules:
+            importlib.reload(sys.modules[name])
+    clear_url_caches()
+
+
+@contextmanager
+def async_views(enabled=True):
+    """Serves the order URLs from `orders.async_views` (or not) for the duration of the block."""
+    try:
+        with override_settings(ORDERS_ASYNC_VIEWS=enabled):
+            reload_urlconf()
+            yield
+    finally:
+        reload_urlconf()
+
+
+def split(total, parts):
+    return [total // parts + (1 if index < total % parts else 0) for index in range(parts)]
+
+
+def check(response, path):
+    if response.status_code != 200:
+        raise RuntimeError(f"GET {path} returned {response.status_code}")
+
+
+def run_threaded(path, clients, requests):
+    def worker(count):
+        client = Client()
+        timings = []
+        try:
+            for _ in range(count):
+                start = time.perf_counter()
+                check(client.get(path), path)
+                timings.append(time.perf_counter() - start)
+        finally:
+            connections.close_all()
+        return timings
+
+    with ThreadPoolExecutor(clients) as pool:
+        return [timing for timings in pool.map(worker, split(requests, clients)) for timing in timings]
+
+
+def run_async(path, clients, requests):
+    async def worker(count):
+        client = AsyncClient()
+        timings = []
+        for _ in range(count):
+            start = time.perf_counter()
+            check(await client.get(path), path)
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    async def main():
+        results = await asyncio.gather(*(worker(count) for count in split(requests, clients)))
+        return [timing for timings in results for timing in timings]
+
+    return asyncio.run(main())
+
+
+def measure_concurrency(mode, path, clients, requests):
+    """Throughput and latency of `requests` GETs of `path` issued by `clients` concurrent clients."""
+    if mode == 'wsgi':
+        run = run_threaded
+    elif mode in ('asgi', 'asgi+async-views'):
+        run = run_async
+    else:
+        raise ValueError(f"Unknown mode: {mode}")
+    # Both test clients send `Host: testserver`.
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), \
+            async_views(mode == 'asgi+async-views'):
+        run(path, 1, min(requests, 5))  # warm up
+        started = time.perf_counter()
+        timings = run(path, clients, requests)
+        elapsed = time.perf_counter() - started
+    result = summarize(timings, [], elapsed)
+    del result['queries_per_request']
+    return result
+
+
+def run_concurrency(paths, client_counts, requests, modes=None):
+    results = []
+    for path in paths:
+        for mode in modes or CONCURRENCY_MODES:
+            for clients in client_counts:
+                result = measure_concurrency(mode, path, clients, requests)
+                results.append({'path': path, 'mode': mode, 'clients': clients, **result})
+    return {
+        'meta': {
+            'timestamp': timezone.now().isoformat(),
+            'revision': git_revision(),
+            'orders': Order.objects.count(),
+            'requests': requests,
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        },
+        'results': results,
+    }
+
+
+# How concurrent order creations are written, compared by `bench_ingest`:
+# each request commits its own transaction, the writer thread commits one
+# write per transaction, or the writer thread inserts the queued creations
+# together (see `orders.writer`).
+INGEST_MODES = {
+    'direct': {'ORDERS_WRITE_QUEUE': False},
+    'queue': {'ORDERS_WRITE_QUEUE': True, 'ORDERS_WRITE_BATCH_SIZE': 1},
+    'coalesced': {'ORDERS_WRITE_QUEUE': True},
+}
+
+INGEST_ENDPOINTS = ['order_create', 'api:order-create']
+
+
+def ingest_request(endpoint):
+    """Returns a function creating one order through `endpoint` with a given test client."""
+    if endpoint == 'order_create':
+        url, data, content_type, expected = reverse('order_create'), {
+            'table_number': 7, 'items': 'Капучино 3.50, Круассан 2.00',
+        }, None, 302
+    elif endpoint == 'api:order-create':
+        url, data, content_type, expected = reverse('order-list'), json.dumps({
+            'table_number': 7, 'items': [{'name': 'Капучино', 'price': '3.50'}], 'total_price': '3.50',
+        }), 'application/json', 201
+    else:
+        raise ValueError(f"Unknown endpoint: {endpoint}")
+    return lambda client: post(client, url, data, expected, content_type)()
+
+
+def run_ingest(create, clients, requests):
+    def worker(count):
+        client = benchmark_client()
+        timings = []
+        try:
+            for _ in range(count):
+                start = time.perf_counter()
+                create(client)
+                timings.append(time.perf_counter() - start)
+        finally:
+            connections.close_all()
+        return timings
+
+    with ThreadPoolExecutor(clients) as pool:
+        return [timing for timings in pool.map(worker, split(requests, clients)) for timing in timings]
+
+
+def measure_ingest(mode, endpoint, clients, requests):
+    """
+    Throughput, latency and commits per second of `requests` order creations
+    issued by `clients` concurrent clients. The created orders are deleted
+    afterwards.
+    """
+    from . import writer
+    create = ingest_request(endpoint)
+    last_id = Order.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    try:
+        with override_settings(**INGEST_MODES[mode]):
+            writer.stop()
+            run_ingest(create, 1, min(requests, 5))  # warm up
+            writer.stop()
+            started = time.perf_counter()
+            timings = run_ingest(create, clients, requests)
+            elapsed = time.perf_counter() - started
+            commits = writer.get_writer().batches if writer.is_enabled() else len(timings)
+            writer.stop()
+    finally:
+        Order.objects.filter(id__gt=last_id).delete()
+    result = summarize(timings, [], elapsed)
+    del result['queries_per_request']
+    result['commits'] = commits
+    result['commits_per_second'] = commits / elapsed
+    return result
+
+
+def run_ingest_benchmark(endpoints, client_counts, requests, modes=None):
+    results = []
+    for endpoint in endpoints:
+        for mode in modes or INGEST_MODES:
+            for clients in client_counts:
+                result = measure_ingest(mode, endpoint, clients, requests)
+                results.append({'endpoint': endpoint, 'mode': mode, 'clients': clients, **result})
+    return {
+        'meta': {
+            'timestamp': timezone.now().isoformat(),
+            'revision': git_revision(),
+            'orders': Order.objects.count(),
+            'requests': requests,
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        },
+        'results': results,
+    }
@@ -0,0 +1,61 @@
+"""
+Bulk writes to orders.
+
+`bulk_create` and `queryset.update` bypass the model signals, so these helpers
+update the order lines and send `orders_changed` themselves, in the same
+transaction as the write.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, OrderItem, OrderState
+from .signals import OrderChange, orders_changed
+
+
+BATCH_SIZE = 500
+
+
+def create_orders(orders):
+    """Inserts unsaved Order instances with one bulk_create. Returns them with their ids set."""
+    orders = list(orders)
+    if not orders:
+        return orders
+    with transaction.atomic():
+        Order.objects.bulk_create(orders, batch_size=BATCH_SIZE)
+        OrderItem.objects.replace_for(orders, created=True)
+        orders_changed.send(sender=Order, changes=[OrderChange(None, order.state()) for order in orders])
+    return orders
+
+
+def set_statuses(statuses):
+    """
+    Moves orders to new statuses given as {order id: status}.
+
+    Issues one `UPDATE ... WHERE id IN (...)` per target status. Returns
+    {order id: result} where result is 'updated', 'unchanged' (the order
+    already had that status) or 'not_found'.
+    """
+    results = {pk: 'not_found' for pk in statuses}
+    if not statuses:
+        return results
+    with transaction.atomic():
+        rows = Order.objects.filter(id__in=list(statuses)).values_list(*OrderState._fields)
+        current = {row[0]: OrderState(*row) for row in rows}
+
+        by_status = {}
+        for pk, state in current.items():
+            if state.status == statuses[pk]:
+                results[pk] = 'unchanged'
+            else:
+                by_status.setdefault(statuses[pk], []).append(pk)
+
+        changes = []
+        now = timezone.now()
+        for status, ids in by_status.items():
+            Order.objects.filter(id__in=ids).update(status=status, updated_at=now)
+            for pk in ids:
+                results[pk] = 'updated'
+                changes.append(OrderChange(current[pk], current[pk]._replace(status=status)))
+        if changes:
+            orders_changed.send(sender=Order, changes=changes)
+    return results
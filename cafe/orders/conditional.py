@@ -0,0 +1,116 @@
+"""
+Conditional GETs of order lists and orders.
+
+Every write to orders bumps the 'orders' ChangeVersion row through
+`orders_changed`. Its version is the ETag and its timestamp the
+Last-Modified of the order views (through Django's `condition` decorator),
+so a client polling an unchanged list gets a 304 after one single-row query,
+before any order is read or serialized. The version is table-wide: any write
+changes the ETag of every list and order.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone, translation
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .models import ChangeVersion
+
+
+ORDERS = 'orders'
+
+
+def bump(name=ORDERS):
+    """Increments a change version; call inside the transaction of the write."""
+    now = timezone.now()
+    if not ChangeVersion.objects.filter(name=name).update(version=F('version') + 1, changed_at=now):
+        ChangeVersion.objects.get_or_create(name=name, defaults={'version': 1, 'changed_at': now})
+
+
+def current(name=ORDERS):
+    """Returns (version, changed_at) of a change version, or (0, None) if nothing was written yet."""
+    row = ChangeVersion.objects.filter(name=name).values_list('version', 'changed_at').first()
+    return row or (0, None)
+
+
+async def acurrent(name=ORDERS):
+    row = await ChangeVersion.objects.filter(name=name).values_list('version', 'changed_at').afirst()
+    return row or (0, None)
+
+
+def request_version(request):
+    # The ETag and Last-Modified functions both need the version; read it once per request.
+    if not hasattr(request, '_orders_version'):
+        request._orders_version = current()
+    return request._orders_version
+
+
+def make_etag(version, *variant):
+    """
+    A weak ETag for `version`. `variant` holds whatever else the response
+    depends on besides the URL and the data, e.g. the negotiated format.
+    """
+    digest = hashlib.sha1(repr(variant).encode()).hexdigest()[:12]
+    return f'W/"{version}-{digest}"'
+
+
+def page_etag(request, *args, **kwargs):
+    """ETag of HTML pages, which also embed the CSRF token and localized dates."""
+    version, _ = request_version(request)
+    return make_etag(
+        version, request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+        translation.get_language(), timezone.get_current_timezone_name(),
+    )
+
+
+def api_etag(request, *args, **kwargs):
+    """
+    ETag of API responses; call after content negotiation. The browsable
+    API embeds the CSRF token too. Requests without content negotiation (the
+    async API views) only serve JSON.
+    """
+    version, _ = request_version(request)
+    renderer = getattr(request, 'accepted_renderer', None)
+    return make_etag(
+        version, renderer.format if renderer else 'json', request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+        translation.get_language(),
+    )
+
+
+def last_modified(request, *args, **kwargs):
+    _, changed_at = request_version(request)
+    return changed_at
+
+
+def async_condition(etag_func, last_modified_func=last_modified):
+    """
+    Django's `condition` for async views.
+
+    `condition` calls the ETag and Last-Modified functions synchronously, so
+    this version loads the change version with the async ORM first, and the
+    functions find it on the request. Like the viewset's actions, only
+    successful responses get the headers.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await view(request, *args, **kwargs)
+            request._orders_version = await acurrent()
+            etag = quote_etag(etag_func(request, *args, **kwargs))
+            changed_at = last_modified_func(request, *args, **kwargs)
+            modified = int(changed_at.timestamp()) if changed_at else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response.headers.setdefault('ETag', etag)
+                if modified is not None:
+                    response.headers.setdefault('Last-Modified', http_date(modified))
+            return response
+        return inner
+    return decorator
@@ -0,0 +1,98 @@
+"""
+Fast JSON encoding of order list pages.
+
+The JSON lists of OrderViewSet read plain rows with `.values()` and encode
+them here instead of going through OrderSerializer, which builds a model
+instance per row and calls a serializer field per value. Each field gets a
+small encoder, picked once from the serializer's own fields, that turns a
+database value straight into JSON text. The output is byte-for-byte what
+OrderSerializer and DRF's JSONRenderer produce with the default settings
+(UNICODE_JSON, COMPACT_JSON, STRICT_JSON, COERCE_DECIMAL_TO_STRING).
+"""
+import decimal
+import json
+from functools import lru_cache
+
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .export import format_datetime
+from .serializers import OrderSerializer
+
+
+encode_value = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), allow_nan=False).encode
+
+
+def encode_string(value):
+    return encode_value(str(value))
+
+
+def encode_int(value):
+    return str(int(value))
+
+
+def decimal_encoder(field):
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def encode(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return f'"{value.quantize(exponent, rounding=rounding, context=context):f}"'
+    return encode
+
+
+def encode_datetime(value):
+    return f'"{format_datetime(value)}"'
+
+
+def value_encoder(field):
+    """Returns a function encoding a non-null database value the way `field` and JSONRenderer would."""
+    if isinstance(field, serializers.IntegerField):
+        return encode_int
+    if (
+        isinstance(field, serializers.DecimalField) and field.decimal_places is not None
+        and getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING) and not field.localize
+    ):
+        return decimal_encoder(field)
+    if (
+        isinstance(field, serializers.DateTimeField) and not hasattr(field, 'timezone')
+        and getattr(field, 'format', api_settings.DATETIME_FORMAT) == ISO_8601
+    ):
+        return encode_datetime
+    if isinstance(field, serializers.ChoiceField):
+        return encode_string
+    if isinstance(field, serializers.JSONField) and not field.binary:
+        return encode_value
+    return lambda value: encode_value(field.to_representation(value))
+
+
+@lru_cache(maxsize=64)
+def row_encoder(fields=None):
+    """
+    Returns (columns, encode) for OrderSerializer limited to `fields` (a
+    tuple, or None for all): the columns to select with `.values()` and a
+    function encoding one such row as a JSON object.
+    """
+    parts = [
+        (name, encode_value(name) + ':', value_encoder(field))
+        for name, field in OrderSerializer(fields=fields).fields.items()
+    ]
+
+    def encode(row):
+        return '{' + ','.join([
+            key + ('null' if row[name] is None else encoder(row[name])) for name, key, encoder in parts
+        ]) + '}'
+    return [name for name, _, _ in parts], encode
+
+
+def encode_page(rows, encode, next_link=None, previous_link=None):
+    """Encodes a cursor-paginated page like OrderCursorPagination's response. Returns bytes."""
+    body = '{"next":%s,"previous":%s,"results":[%s]}' % (
+        encode_value(next_link), encode_value(previous_link), ','.join([encode(row) for row in rows]),
+    )
+    # JSONRenderer escapes these two for JavaScript.
+    return body.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
@@ -0,0 +1,132 @@
+"""
+In-process broker for order events streamed to kitchen and floor boards.
+
+Events are published from the `orders_changed` signal once the write is
+committed and fan out to every connected subscriber without touching the
+database. Each event has a sequence number; the broker keeps the most recent
+ones so that a reconnecting client can catch up from its `Last-Event-ID`
+instead of reloading the snapshot.
+
+The broker lives in the process memory, so every ASGI worker serves the
+events of the writes it handled itself. Run a single worker (or put a shared
+message bus behind `publish`) when boards must see writes from all workers.
+"""
+import asyncio
+import json
+import threading
+from collections import deque, namedtuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Order, OrderState
+
+
+Event = namedtuple('Event', ['seq', 'kind', 'data'])
+
+DEFAULT_HISTORY = 1000
+DEFAULT_QUEUE_SIZE = 1000
+
+
+class Subscription:
+    """Events delivered to one client. `overflowed` is set when the client fell too far behind."""
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def deliver(self, event):
+        # Runs on the subscriber's event loop.
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class EventBroker:
+    def __init__(self, history=None, queue_size=None):
+        self.seq = 0
+        self.history = deque(maxlen=history or getattr(settings, 'ORDERS_EVENTS_HISTORY', DEFAULT_HISTORY))
+        self.queue_size = queue_size or DEFAULT_QUEUE_SIZE
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def publish(self, kind, data):
+        with self.lock:
+            self.seq += 1
+            event = Event(self.seq, kind, data)
+            self.history.append(event)
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's loop is closed; it is removed when its stream ends.
+                pass
+        return event
+
+    def subscribe(self):
+        """Registers a subscriber on the running loop. Returns (subscription, current seq)."""
+        subscription = Subscription(asyncio.get_running_loop(), self.queue_size)
+        with self.lock:
+            self.subscribers.add(subscription)
+            return subscription, self.seq
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def events_since(self, seq):
+        """Events published after `seq`, or None if some of them are no longer kept."""
+        with self.lock:
+            if seq > self.seq:
+                return None
+            if seq == self.seq:
+                return []
+            if not self.history or self.history[0].seq > seq + 1:
+                return None
+            return [event for event in self.history if event.seq > seq]
+
+
+broker = EventBroker()
+
+
+def order_payload(state):
+    return {
+        'id': state.id,
+        'table_number': state.table_number,
+        'status': state.status,
+        'total_price': state.total_price,
+        'created_at': state.created_at,
+        'items': state.items,
+    }
+
+
+def snapshot():
+    """Orders shown on the boards: everything that is not paid yet."""
+    rows = Order.objects.exclude(status='paid').order_by('id').values_list(*OrderState._fields)
+    return [order_payload(OrderState(*row)) for row in rows]
+
+
+def publish_changes(changes):
+    """Publishes a list of OrderChange as order events."""
+    for before, after in changes:
+        if after is None:
+            broker.publish('order_deleted', {'id': before.id})
+        elif before is None:
+            broker.publish('order_created', order_payload(after))
+        elif before != after:
+            data = order_payload(after)
+            data['previous_status'] = before.status
+            broker.publish('order_updated', data)
+
+
+def format_event(kind, data, seq=None):
+    """Formats one server-sent event."""
+    lines = []
+    if seq is not None:
+        lines.append(f'id: {seq}')
+    lines.append(f'event: {kind}')
+    lines.append(f'data: {json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)}')
+    return '\n'.join(lines) + '\n\n'
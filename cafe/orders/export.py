@@ -0,0 +1,92 @@
+"""
+Streaming export of orders as CSV or NDJSON.
+
+Rows are read with a chunked `.iterator()` and written out in blocks, so the
+memory used by an export does not depend on the number of orders.
+"""
+import csv
+import io
+import json
+
+from django.utils import timezone
+
+from .models import OrderState, iter_items
+
+
+CHUNK_SIZE = 2000
+
+ORDER_COLUMNS = ['id', 'table_number', 'status', 'total_price', 'created_at', 'updated_at', 'items']
+ITEM_COLUMNS = ['order_id', 'table_number', 'status', 'created_at', 'position', 'name', 'price']
+
+
+def format_datetime(value):
+    """Formats a datetime the way the API does (ISO 8601, `Z` for UTC)."""
+    value = timezone.localtime(value) if timezone.is_aware(value) else value
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def iter_states(queryset, *extra):
+    """Yields OrderState for every order, or (state, *extra field values) when `extra` fields are given."""
+    rows = queryset.values_list(*OrderState._fields, *extra).iterator(chunk_size=CHUNK_SIZE)
+    size = len(OrderState._fields)
+    for row in rows:
+        state = OrderState(*row[:size])
+        yield (state, *row[size:]) if extra else state
+
+
+def order_rows(queryset):
+    for state, updated_at in iter_states(queryset, 'updated_at'):
+        yield {
+            'id': state.id,
+            'table_number': state.table_number,
+            'status': state.status,
+            'total_price': str(state.total_price),
+            'created_at': format_datetime(state.created_at),
+            'updated_at': format_datetime(updated_at),
+            'items': state.items,
+        }
+
+
+def item_rows(queryset):
+    for state in iter_states(queryset):
+        created_at = format_datetime(state.created_at)
+        for position, (name, price) in enumerate(iter_items(state.items)):
+            yield {
+                'order_id': state.id,
+                'table_number': state.table_number,
+                'status': state.status,
+                'created_at': created_at,
+                'position': position,
+                'name': name,
+                'price': str(price),
+            }
+
+
+def stream_csv(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([
+            json.dumps(row[column], ensure_ascii=False) if column == 'items' else row[column]
+            for column in columns
+        ])
+        if count % CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_ndjson(rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, ensure_ascii=False))
+        if len(lines) == CHUNK_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
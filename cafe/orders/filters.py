@@ -0,0 +1,95 @@
+import django_filters
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+from .models import DishSales, HourlySales, Order, OrderHistory
+
+
+class OrderFilter(django_filters.FilterSet):
+    """Filters of the orders API: status, table and a `created_at` range."""
+    created_after = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='lt')
+
+    class Meta:
+        model = Order
+        fields = ['status', 'table_number']
+
+
+class OrderHistoryFilter(OrderFilter):
+    """OrderFilter for OrderHistory, which lists archived orders too."""
+    class Meta(OrderFilter.Meta):
+        model = OrderHistory
+
+
+def order_filterset(queryset):
+    """The FilterSet class for a queryset of Order or OrderHistory."""
+    return OrderHistoryFilter if queryset.model is OrderHistory else OrderFilter
+
+
+class OrderFilterBackend(DjangoFilterBackend):
+    """DjangoFilterBackend that also filters OrderHistory querysets."""
+    def get_filterset_class(self, view, queryset=None):
+        if queryset is not None:
+            return order_filterset(queryset)
+        return super().get_filterset_class(view, queryset)
+
+
+class HourlySalesFilter(django_filters.FilterSet):
+    """Filters of the sales report: status, table and a range of hours (`created_after` inclusive)."""
+    created_after = django_filters.IsoDateTimeFilter(field_name='hour', lookup_expr='gte')
+    created_before = django_filters.IsoDateTimeFilter(field_name='hour', lookup_expr='lt')
+
+    class Meta:
+        model = HourlySales
+        fields = ['status', 'table_number']
+
+
+class DishSalesFilter(django_filters.FilterSet):
+    """Filters of the dish report: a range of days (`day_after` inclusive) and the dish name."""
+    day_after = django_filters.DateFilter(field_name='day', lookup_expr='gte')
+    day_before = django_filters.DateFilter(field_name='day', lookup_expr='lt')
+
+    class Meta:
+        model = DishSales
+        fields = ['dish']
+
+
+class DishSearchFilter(BaseFilterBackend):
+    """
+    Full-text search over dish names (`?search=бур пиц`).
+
+    Every word is matched as a prefix. Unless the request asks for an explicit
+    `ordering`, results are annotated with `search_rank` so the pagination
+    can return the most relevant orders first.
+    """
+    search_param = api_settings.SEARCH_PARAM
+    ordering_param = api_settings.ORDERING_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        if not term:
+            return queryset
+        ranked = not request.query_params.get(self.ordering_param)
+        return queryset.search(term, ranked=ranked)
+
+
+class ReportGroupingFilter(BaseFilterBackend):
+    """
+    The `group_by` parameter of the reports: a comma-separated list of the
+    names in the view's `get_grouping()` groups. The report itself groups
+    the rows; this backend only documents the parameter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        groups, default = view.get_grouping()
+        return [{
+            'name': 'group_by',
+            'required': False,
+            'in': 'query',
+            'description': f"Comma-separated list of: {', '.join(groups)} (default: {default}).",
+            'schema': {'type': 'string'},
+        }]
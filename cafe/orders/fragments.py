@@ -0,0 +1,77 @@
+"""
+Cached table rows of the HTML order list.
+
+Each order's `<tr>` is rendered once from `orders/order_row.html` and kept in
+the `ORDERS_FRAGMENT_CACHE` cache under its id and FRAGMENT_VERSION. The
+cached value is stamped with the order's `updated_at` and holds one rendering
+per language and time zone, since both change the output. A row whose stamp
+no longer matches is rendered again, and rows are also dropped through
+`orders_changed` whenever an order is written, so paid orders, which rarely
+change, are rendered once instead of on every page view.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils import timezone, translation
+from django.utils.safestring import mark_safe
+
+
+# Bump when order_row.html changes so that rows rendered by the old template
+# are not served.
+FRAGMENT_VERSION = 2
+
+DEFAULT_TIMEOUT = 24 * 3600
+
+
+def get_cache():
+    return caches[getattr(settings, 'ORDERS_FRAGMENT_CACHE', 'default')]
+
+
+def fragment_key(order_id):
+    return f'orders:row:v{FRAGMENT_VERSION}:{order_id}'
+
+
+def fragment_stamp(order):
+    return order.updated_at.isoformat()
+
+
+def current_variant():
+    return f'{translation.get_language()}|{timezone.get_current_timezone_name()}'
+
+
+def render_row(order):
+    return render_to_string('orders/order_row.html', {'order': order})
+
+
+def render_rows(orders):
+    """Returns the rendered row of every order, rendering and caching the missing ones."""
+    cache = get_cache()
+    variant = current_variant()
+    keys = {order.id: fragment_key(order.id) for order in orders}
+    cached = cache.get_many(keys.values())
+
+    rows = []
+    missing = {}
+    for order in orders:
+        key = keys[order.id]
+        stamp = fragment_stamp(order)
+        entry = cached.get(key)
+        if entry is None or entry['stamp'] != stamp:
+            entry = {'stamp': stamp, 'rows': {}}
+        html = entry['rows'].get(variant)
+        if html is None:
+            html = render_row(order)
+            missing[key] = {'stamp': stamp, 'rows': {**entry['rows'], variant: html}}
+        rows.append(mark_safe(html))
+    if missing:
+        cache.set_many(missing, getattr(settings, 'ORDERS_FRAGMENT_TIMEOUT', DEFAULT_TIMEOUT))
+    return rows
+
+
+def invalidate(order_ids):
+    get_cache().delete_many([fragment_key(order_id) for order_id in order_ids])
+
+
+def apply_changes(changes):
+    """Drops the cached rows of the orders in a list of OrderChange."""
+    invalidate({(after or before).id for before, after in changes})
@@ -0,0 +1,167 @@
+"""
+Bulk import of historical orders from CSV or JSON Lines files.
+
+Every source record becomes an order only if it passes the checks of the
+order form: its items follow the rules of `parse_items` (a "dish price, ..."
+string, or a JSON list of {"name", "price"} objects like the exports write),
+and the table number, status and total fit the Order fields. Other records
+are rejected and reported; they do not stop the import.
+
+Valid orders are inserted through `bulk.create_orders` in chunks of
+`batch_size` source records, one transaction per chunk, so order lines, the
+revenue ledger, the report rollups and the search index are filled as for
+orders created one by one. The OrderImport row of the run is updated in the
+same transaction, so after a failure the import is resumed right after the
+last committed chunk.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import bulk
+from .models import Order
+from .views import parse_items
+
+
+BATCH_SIZE = 2000
+
+# Imported history is usually settled; records without a status are taken as paid.
+DEFAULT_STATUS = 'paid'
+
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+
+def read_records(stream, fmt):
+    """
+    Yields (line number, record) for every record of a CSV or JSON Lines
+    stream: a dict of the CSV columns, or the text of a JSON line. Blank JSON
+    lines are yielded as None so that they count as records when resuming.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for number, line in enumerate(stream, 1):
+            yield number, line.strip() or None
+
+
+def clean_items(value):
+    """Returns the items of a record as stored on orders. Raises ValueError if they are invalid or empty."""
+    if isinstance(value, str) and value.lstrip().startswith('['):
+        value = json.loads(value)
+    if isinstance(value, str):
+        try:
+            items = parse_items(value)
+        except InvalidOperation:
+            items = []
+    elif isinstance(value, list):
+        items = []
+        for item in value:
+            if not isinstance(item, dict) or not str(item.get('name', '')).strip():
+                raise ValueError(f"Invalid item format: {item}")
+            try:
+                Decimal(str(item.get('price')))
+            except InvalidOperation:
+                raise ValueError(f"Invalid price format: {item.get('price')}")
+            items.append({'name': str(item['name']).strip(), 'price': str(item['price'])})
+    else:
+        items = []
+    if not items:
+        raise ValueError("Invalid items format.")
+    if not all(Decimal(item['price']).is_finite() for item in items):
+        raise ValueError("Invalid price format.")
+    return items
+
+
+def clean_created_at(value):
+    if not value:
+        raise ValueError("created_at is required.")
+    created_at = parse_datetime(str(value))
+    if created_at is None:
+        raise ValueError(f"Invalid created_at: {value}")
+    if timezone.is_naive(created_at):
+        created_at = timezone.make_aware(created_at)
+    return created_at
+
+
+def build_order(record):
+    """Returns an unsaved Order for a source record. Raises ValueError if the record is rejected."""
+    if isinstance(record, str):
+        record = json.loads(record)
+    if not isinstance(record, dict):
+        raise ValueError("Record is not an object.")
+    items = clean_items(record.get('items'))
+    total_price = sum(Decimal(item['price']) for item in items)
+    given = record.get('total_price')
+    if given not in (None, ''):
+        try:
+            given = Decimal(str(given))
+        except InvalidOperation:
+            raise ValueError(f"Invalid total_price: {given}")
+        if given != total_price:
+            raise ValueError(f"total_price {given} does not match the items ({total_price}).")
+    order = Order(
+        table_number=record.get('table_number'),
+        items=items,
+        total_price=total_price,
+        status=record.get('status') or DEFAULT_STATUS,
+        created_at=clean_created_at(record.get('created_at')),
+    )
+    try:
+        order.clean_fields()
+    except ValidationError as e:
+        raise ValueError('; '.join(
+            f"{field}: {' '.join(messages)}" for field, messages in e.message_dict.items()
+        ))
+    return order
+
+
+def import_orders(records, run=None, batch_size=BATCH_SIZE, on_reject=None, progress=None):
+    """
+    Imports the (line number, record) pairs of `read_records`.
+
+    `run` is the OrderImport keeping the progress of this source: records
+    before its `position` are skipped, and it is saved with every chunk and
+    marked finished at the end. Without a run, records are only checked.
+    `on_reject(line, record, error)` is called for every rejected record and
+    `progress(imported, rejected)` after every chunk. Returns the numbers of
+    orders imported and records rejected by this call.
+    """
+    records = iter(records)
+    if run is not None and run.position:
+        records = islice(records, run.position, None)
+    imported = rejected = 0
+    while chunk := list(islice(records, batch_size)):
+        orders, rejects = [], []
+        for line, record in chunk:
+            if record is None:
+                continue
+            try:
+                orders.append(build_order(record))
+            except ValueError as e:
+                rejects.append((line, record, str(e)))
+        if run is not None:
+            with transaction.atomic():
+                bulk.create_orders(orders)
+                run.position += len(chunk)
+                run.imported += len(orders)
+                run.rejected += len(rejects)
+                run.save()
+        imported += len(orders)
+        rejected += len(rejects)
+        if on_reject is not None:
+            for reject in rejects:
+                on_reject(*reject)
+        if progress is not None:
+            progress(imported, rejected)
+    if run is not None:
+        run.finished = True
+        run.save()
+    return imported, rejected
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders import archive
+
+
+class Command(BaseCommand):
+    help = "Moves paid orders older than ORDERS_ARCHIVE_AFTER_DAYS days to the archive, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help="Archive paid orders older than this many days (default: ORDERS_ARCHIVE_AFTER_DAYS).",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=archive.BATCH_SIZE, help="Orders moved per transaction.",
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Only count the orders that would be archived.")
+
+    def handle(self, *args, **options):
+        cutoff = archive.archive_cutoff(options['days'])
+        if options['dry_run']:
+            count = archive.archivable(cutoff).count()
+            self.stdout.write(f"{count} paid orders created before {cutoff:%Y-%m-%d %H:%M} would be archived.")
+            return
+
+        started = time.perf_counter()
+
+        def progress(done):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{done} orders archived")
+
+        archived = archive.archive_orders(cutoff, batch_size=options['batch_size'], progress=progress)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived} paid orders created before {cutoff:%Y-%m-%d %H:%M} in {elapsed:.1f}s."
+        ))
@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the throughput of concurrent clients under the WSGI handler, the ASGI handler "
+        "and the ASGI handler with the async views (ORDERS_ASYNC_VIEWS)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help="Path to request; may be repeated (default: / and /api/orders/).",
+        )
+        parser.add_argument(
+            '--clients', type=int, nargs='+', default=[1, 8, 32], help="Numbers of concurrent clients.",
+        )
+        parser.add_argument('--requests', type=int, default=400, help="Requests per measurement.")
+        parser.add_argument(
+            '--mode', action='append', dest='modes', choices=benchmarks.CONCURRENCY_MODES,
+            help="Run only this mode; may be repeated.",
+        )
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or min(options['clients']) < 1:
+            raise CommandError("--requests and --clients must be positive.")
+        report = benchmarks.run_concurrency(
+            options['paths'] or ['/', '/api/orders/'], options['clients'], options['requests'], options['modes'],
+        )
+
+        self.stdout.write(f"{report['meta']['orders']} orders, {options['requests']} requests per measurement")
+        self.stdout.write(f"{'path':<24}{'mode':<20}{'clients':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}")
+        for result in report['results']:
+            latency = result['latency_ms']
+            self.stdout.write(
+                f"{result['path']:<24}{result['mode']:<20}{result['clients']:>8}"
+                f"{result['throughput_rps']:>9.0f}{latency['p50']:>9.2f}{latency['p95']:>9.2f}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares order creations per second and commits per second of concurrent clients when every "
+        "request commits its own write, when the writer thread commits one write at a time and when it "
+        "inserts queued creations together. Created orders are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--endpoint', action='append', dest='endpoints', choices=benchmarks.INGEST_ENDPOINTS,
+            help="Endpoint to create orders through; may be repeated (default: order_create).",
+        )
+        parser.add_argument(
+            '--clients', type=int, nargs='+', default=[1, 8, 32], help="Numbers of concurrent clients.",
+        )
+        parser.add_argument('--requests', type=int, default=400, help="Orders created per measurement.")
+        parser.add_argument(
+            '--mode', action='append', dest='modes', choices=list(benchmarks.INGEST_MODES),
+            help="Run only this mode; may be repeated.",
+        )
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or min(options['clients']) < 1:
+            raise CommandError("--requests and --clients must be positive.")
+        report = benchmarks.run_ingest_benchmark(
+            options['endpoints'] or ['order_create'], options['clients'], options['requests'], options['modes'],
+        )
+
+        self.stdout.write(f"{report['meta']['orders']} orders, {options['requests']} creations per measurement")
+        self.stdout.write(
+            f"{'endpoint':<20}{'mode':<12}{'clients':>8}{'orders/s':>10}{'commits/s':>11}{'p50 ms':>9}{'p95 ms':>9}"
+        )
+        for result in report['results']:
+            latency = result['latency_ms']
+            self.stdout.write(
+                f"{result['endpoint']:<20}{result['mode']:<12}{result['clients']:>8}"
+                f"{result['throughput_rps']:>10.0f}{result['commits_per_second']:>11.0f}"
+                f"{latency['p50']:>9.2f}{latency['p95']:>9.2f}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures latency percentiles, queries per request and throughput of the order views "
+        "and API actions against the current database, and writes the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Timed requests per scenario.")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--compare', help="Print the change against a previous results file.")
+        parser.add_argument('--only', nargs='+', help="Run only scenarios whose name starts with one of these.")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError("--requests must be positive.")
+        client = benchmarks.benchmark_client()
+        report = benchmarks.run_benchmarks(
+            benchmarks.default_scenarios(client), options['requests'], only=options['only'],
+        )
+
+        self.stdout.write(f"{report['meta']['orders']} orders, {options['requests']} requests per scenario")
+        self.stdout.write(f"{'scenario':<36}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'queries':>9}")
+        for name, result in report['results'].items():
+            latency = result['latency_ms']
+            self.stdout.write(
+                f"{name:<36}{latency['p50']:>9.2f}{latency['p95']:>9.2f}{latency['p99']:>9.2f}"
+                f"{result['throughput_rps']:>9.0f}{result['queries_per_request']:>9.1f}"
+            )
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            self.stdout.write(f"\nCompared with {options['compare']} ({baseline['meta'].get('revision')}):")
+            for name, metric, before, after, change in benchmarks.compare(report, baseline):
+                change = f"{change:+.1%}" if change is not None else 'n/a'
+                self.stdout.write(f"{name:<36}{metric:>5} {before:>9.2f} -> {after:>9.2f} ms  {change}")
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
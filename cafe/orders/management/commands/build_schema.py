@@ -0,0 +1,96 @@
+import json
+import os
+import re
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.apps import apps
+from django.test import RequestFactory, modify_settings, override_settings
+from django.urls import reverse
+
+from orders import schema
+
+
+SCHEMA_CLASS = 'drf_spectacular.openapi.AutoSchema'
+
+APP = 'drf_spectacular'
+
+
+def read_csrf_cookie(content):
+    """
+    Makes a rendered Swagger UI page send the CSRF token of the browser's
+    cookie instead of the token of the request it was rendered for, which
+    would be the same for every visitor and valid for none of them.
+    """
+    header = settings.CSRF_HEADER_NAME.removeprefix('HTTP_').replace('_', '-')
+    pattern = re.compile(rb'(request\.headers\[' + re.escape(json.dumps(header).encode()) + rb'\] = )"[^"]*";')
+    cookie = re.escape(settings.CSRF_COOKIE_NAME).replace('/', '\\/')
+    script = f'(document.cookie.match(/(?:^|;\\s*){cookie}=([^;]*)/) || [])[1] || "";'
+    content, count = pattern.subn(lambda match: match[1] + script.encode(), content)
+    if count != 1:
+        raise CommandError("The Swagger UI page does not set the CSRF header as expected.")
+    return content
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates the OpenAPI schema and the Swagger UI and Redoc pages once into ORDERS_SCHEMA_DIR, "
+        "to be served with ORDERS_PRECOMPUTED_SCHEMA."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help="Output directory (default: ORDERS_SCHEMA_DIR).")
+        parser.add_argument('--keep', type=int, default=3, help="Number of previous builds to keep.")
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only compare with the current build; exit with an error if the schema changed.",
+        )
+
+    def handle(self, *args, **options):
+        # With ORDERS_PRECOMPUTED_SCHEMA drf_spectacular is not installed and the
+        # views use DRF's plain inspector; generate with drf_spectacular's.
+        rest_framework = {**getattr(settings, 'REST_FRAMEWORK', {}), 'DEFAULT_SCHEMA_CLASS': SCHEMA_CLASS}
+        installed = [] if apps.is_installed(APP) else [APP]
+        with modify_settings(INSTALLED_APPS={'append': installed}), override_settings(REST_FRAMEWORK=rest_framework):
+            self.build(options)
+
+    def build(self, options):
+        # The only place drf_spectacular is imported when the schema is served prebuilt.
+        from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
+
+        directory = options['dir'] or schema.get_schema_dir()
+        if options['keep'] < 0:
+            raise CommandError("--keep must not be negative.")
+        started = time.perf_counter()
+        factory = RequestFactory()
+        schema_url = reverse('schema')
+
+        def render(view, path, **query):
+            response = view(factory.get(path, query))
+            if response.status_code != 200:
+                raise CommandError(f"Generating {path} returned {response.status_code}.")
+            return response.render().content
+
+        files = {
+            'yaml': render(SpectacularAPIView.as_view(), schema_url, format='yaml'),
+            'json': render(SpectacularAPIView.as_view(), schema_url, format='json'),
+        }
+        version = schema.schema_version(files['json'])
+        current = schema.current_version(directory)
+        if options['check']:
+            if version != current:
+                raise CommandError(f"The schema changed (built: {current}, now: {version}); run build_schema.")
+            self.stdout.write(self.style.SUCCESS(f"Schema {version} is up to date."))
+            return
+
+        url = schema_url + schema.file_names(version)['json']
+        files['swagger'] = read_csrf_cookie(render(SpectacularSwaggerView.as_view(url=url), reverse('swagger-ui')))
+        files['redoc'] = render(SpectacularRedocView.as_view(url=url), reverse('redoc'))
+        schema.write_build(directory, version, files, keep=options['keep'])
+
+        elapsed = time.perf_counter() - started
+        state = "unchanged" if version == current else "new"
+        self.stdout.write(self.style.SUCCESS(
+            f"Built schema {version} ({state}) in {elapsed * 1000:.0f} ms: {os.path.abspath(directory)}"
+        ))
@@ -0,0 +1,99 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import importer
+from orders.models import OrderImport
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports historical orders from a CSV or JSON Lines file in chunks, one transaction per chunk. "
+        "An interrupted import is continued with --resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV (with a header row) or JSON Lines file.")
+        parser.add_argument(
+            '--format', choices=sorted(set(importer.FORMATS.values())), default=None,
+            help="Format of the file (default: from its extension).",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=importer.BATCH_SIZE, help="Source records per transaction.",
+        )
+        parser.add_argument(
+            '--name', default=None,
+            help="Name under which the progress of the import is kept (default: the absolute path of the file).",
+        )
+        parser.add_argument('--resume', action='store_true', help="Continue an interrupted import of this file.")
+        parser.add_argument('--restart', action='store_true', help="Forget earlier progress and import from the start.")
+        parser.add_argument('--rejects', default=None, help="Write rejected records to this file as JSON Lines.")
+        parser.add_argument('--dry-run', action='store_true', help="Only check the records; import nothing.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or importer.FORMATS.get(os.path.splitext(path)[1].lower())
+        if fmt is None:
+            raise CommandError(f"Cannot tell the format of {path}; pass --format.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        run = None
+        if not options['dry_run']:
+            run = self.get_run(options['name'] or os.path.abspath(path), options['resume'], options['restart'])
+
+        rejects = None
+        if options['rejects']:
+            rejects = open(options['rejects'], 'a' if run is not None and run.position else 'w', encoding='utf-8')
+        started = time.perf_counter()
+
+        def on_reject(line, record, error):
+            if options['verbosity'] > 1:
+                self.stderr.write(f"Line {line}: {error}")
+            if rejects is not None:
+                rejects.write(json.dumps({'line': line, 'error': error, 'record': record}, ensure_ascii=False) + '\n')
+
+        def progress(imported, rejected):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{imported} orders imported, {rejected} records rejected")
+
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                imported, rejected = importer.import_orders(
+                    importer.read_records(stream, fmt), run=run, batch_size=options['batch_size'],
+                    on_reject=on_reject, progress=progress,
+                )
+        finally:
+            if rejects is not None:
+                rejects.close()
+
+        elapsed = time.perf_counter() - started
+        verb = "Checked" if run is None else "Imported"
+        message = (
+            f"{verb} {imported} orders in {elapsed:.1f}s ({imported / elapsed:.0f} orders/s); "
+            f"{rejected} records rejected."
+        )
+        if rejected:
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+
+    def get_run(self, name, resume, restart):
+        """Returns the OrderImport to continue, or a new one."""
+        run = OrderImport.objects.filter(name=name).first()
+        if run is not None and restart:
+            run.delete()
+            run = None
+        if run is None:
+            return OrderImport(name=name)
+        if run.finished:
+            raise CommandError(f"{name} was already imported ({run.imported} orders); pass --restart to import it again.")
+        if not resume:
+            raise CommandError(
+                f"An import of {name} stopped after {run.position} records; "
+                "pass --resume to continue it or --restart to start over."
+            )
+        self.stdout.write(f"Resuming after {run.position} records ({run.imported} orders imported).")
+        return run
@@ -0,0 +1,36 @@
+from io import StringIO
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import profiling
+
+
+class Command(BaseCommand):
+    help = "Summarizes the hot spots across the request profiles saved by ProfilerMiddleware."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help="Directory with saved profiles (default: ORDERS_PROFILE_DIR).")
+        parser.add_argument('--view', help="Only use profiles of this URL name, e.g. orders_list.")
+        parser.add_argument('--limit', type=int, default=20, help="Number of functions to list (default: 20).")
+        parser.add_argument(
+            '--sort', choices=['cumulative', 'tottime', 'ncalls'], default='cumulative',
+            help="Order of the function list (default: cumulative).",
+        )
+
+    def handle(self, *args, **options):
+        paths = profiling.saved_profiles(options['dir'], options['view'])
+        if not paths:
+            raise CommandError("No saved profiles found.")
+
+        buffer = StringIO()
+        stats = profiling.load_stats(paths, stream=buffer)
+        self.stdout.write(f"{len(paths)} profile(s), {stats.total_tt * 1000:.1f} ms in total\n")
+
+        self.stdout.write("Own time by area:")
+        for area, seconds in profiling.time_by_area(stats):
+            share = seconds / stats.total_tt * 100 if stats.total_tt else 0
+            self.stdout.write(f"  {area:<16} {seconds * 1000:10.1f} ms  {share:5.1f}%")
+        self.stdout.write("")
+
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['limit'])
+        self.stdout.write(buffer.getvalue(), ending='')
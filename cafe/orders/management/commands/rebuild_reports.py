@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import reports
+
+
+class Command(BaseCommand):
+    help = "Checks the sales rollups of the reports against the orders and rebuilds them from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only compare the rollups with the orders; exit with an error if they differ.",
+        )
+
+    def handle(self, *args, **options):
+        mismatches = reports.compare_rollups()
+        for model, key, stored, actual in mismatches:
+            key = ' | '.join(str(value) for value in key)
+            self.stdout.write(f"{model} {key}: rollup {stored}, orders {actual}")
+
+        if options['check']:
+            if mismatches:
+                raise CommandError(f"Sales rollups differ from the orders in {len(mismatches)} bucket(s).")
+            self.stdout.write(self.style.SUCCESS("Sales rollups match the orders."))
+            return
+
+        hourly, dishes = reports.rebuild_rollups()
+        if reports.compare_rollups():
+            raise CommandError("Sales rollups still differ from the orders after the rebuild.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {hourly} hourly and {dishes} dish bucket(s); {len(mismatches)} bucket(s) were out of date."
+        ))
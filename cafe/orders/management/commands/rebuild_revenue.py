@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import revenue
+
+
+class Command(BaseCommand):
+    help = "Checks the daily revenue ledger against the orders table and rebuilds it from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only compare the ledger with the orders table; exit with an error if they differ.",
+        )
+
+    def handle(self, *args, **options):
+        mismatches = revenue.compare_ledger()
+        for day, stored, actual in mismatches:
+            self.stdout.write(
+                f"{day}: ledger {stored[0]} ({stored[1]} orders), orders table {actual[0]} ({actual[1]} orders)"
+            )
+
+        if options['check']:
+            if mismatches:
+                raise CommandError(f"Revenue ledger differs from the orders table on {len(mismatches)} day(s).")
+            self.stdout.write(self.style.SUCCESS("Revenue ledger matches the orders table."))
+            return
+
+        days = revenue.rebuild_ledger()
+        if revenue.compare_ledger():
+            raise CommandError("Revenue ledger still differs from the orders table after the rebuild.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt revenue ledger for {days} day(s); {len(mismatches)} day(s) were out of date."
+        ))
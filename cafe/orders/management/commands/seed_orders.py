@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.benchmarks import seed_orders
+
+
+class Command(BaseCommand):
+    help = "Fills the database with synthetic orders for benchmarking (e.g. 1000, 100000 or 1000000)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('count', type=int, help="Number of orders to create.")
+        parser.add_argument('--days', type=int, default=365, help="Spread orders over this many past days.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Orders inserted per transaction.")
+        parser.add_argument('--seed', type=int, default=None, help="Random seed, for reproducible data sets.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(done):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{done}/{options['count']} orders")
+
+        created = seed_orders(
+            options['count'], days=options['days'], batch_size=options['batch_size'],
+            seed=options['seed'], progress=progress,
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created} orders in {elapsed:.1f}s ({created / elapsed:.0f} orders/s)."
+        ))
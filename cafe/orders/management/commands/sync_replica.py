@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from orders import replicas
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the default SQLite database over the SQLite read replicas with the backup API, "
+        "once or every --interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'aliases', nargs='*', help="Replica database aliases (default: ORDERS_READ_REPLICAS, else 'replica').",
+        )
+        parser.add_argument('--interval', type=float, default=None, help="Copy again every this many seconds.")
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or replicas.get_replicas() or ['replica']
+        for alias in aliases:
+            if alias not in connections.settings or alias == DEFAULT_DB_ALIAS:
+                raise CommandError(f"{alias!r} is not a replica database alias.")
+            if connections[alias].vendor != 'sqlite' or connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+                raise CommandError("sync_replica copies SQLite databases only.")
+
+        while True:
+            for alias in aliases:
+                started = time.perf_counter()
+                pages = replicas.sync(alias)
+                elapsed = time.perf_counter() - started
+                if options['interval'] is None or options['verbosity'] > 1:
+                    self.stdout.write(f"Copied {DEFAULT_DB_ALIAS} to {alias} ({pages} pages) in {elapsed * 1000:.0f} ms.")
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,127 @@
+"""
+In-process request metrics, exposed in the Prometheus text format.
+
+RequestMetricsMiddleware records one observation per request, labelled with
+the URL name of the view. Every worker process keeps its own histograms, so
+Prometheus should scrape each worker (or the deployment should run one).
+"""
+import threading
+from bisect import bisect_left
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Yields (upper bound, cumulative count) pairs, ending with +Inf."""
+        total = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            yield bound, total
+
+
+class Metric:
+    def __init__(self, name, kind, help_text, buckets=None):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = Histogram(self.buckets)
+        series.observe(value)
+
+    def inc(self, labels, amount=1):
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+
+def format_number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = Metric('orders_http_requests_total', 'counter', "HTTP requests by view, method and status.")
+            self.duration = Metric(
+                'orders_http_request_duration_seconds', 'histogram', "Wall time of HTTP requests.", DURATION_BUCKETS,
+            )
+            self.db_queries = Metric(
+                'orders_http_request_db_queries', 'histogram', "Database queries per HTTP request.", QUERY_BUCKETS,
+            )
+            self.db_duration = Metric(
+                'orders_http_request_db_duration_seconds', 'histogram',
+                "Time spent in database queries per HTTP request.", DURATION_BUCKETS,
+            )
+            self.response_size = Metric(
+                'orders_http_response_size_bytes', 'histogram', "Size of HTTP response bodies.", SIZE_BUCKETS,
+            )
+
+    def metrics(self):
+        return [self.requests, self.duration, self.db_queries, self.db_duration, self.response_size]
+
+    def observe(self, view, method, status, duration, queries=None, db_duration=None, size=None):
+        """Records one request. Unknown values (None) are left out of their histograms."""
+        labels = (('view', view), ('method', method))
+        with self.lock:
+            self.requests.inc((*labels, ('status', str(status))))
+            self.duration.observe(labels, duration)
+            if queries is not None:
+                self.db_queries.observe(labels, queries)
+                self.db_duration.observe(labels, db_duration)
+            if size is not None:
+                self.response_size.observe(labels, size)
+
+    def render(self):
+        """Renders all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            for metric in self.metrics():
+                lines.append(f'# HELP {metric.name} {metric.help_text}')
+                lines.append(f'# TYPE {metric.name} {metric.kind}')
+                for labels, series in sorted(metric.series.items()):
+                    if metric.kind == 'counter':
+                        lines.append(f'{metric.name}{format_labels(labels)} {series}')
+                        continue
+                    for bound, count in series.cumulative():
+                        lines.append(f'{metric.name}_bucket{format_labels(labels, [("le", bound)])} {count}')
+                    lines.append(f'{metric.name}_sum{format_labels(labels)} {format_number(series.sum)}')
+                    lines.append(f'{metric.name}_count{format_labels(labels)} {series.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,200 @@
+import cProfile
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from . import profiling, replicas
+from .metrics import registry
+
+
+slow_request_logger = logging.getLogger('orders.slow_requests')
+
+
+class QueryRecorder:
+    """A database execute wrapper that counts and times queries, optionally keeping their SQL."""
+
+    def __init__(self, keep_sql=False):
+        self.keep_sql = keep_sql
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if self.keep_sql:
+                self.queries.append((elapsed, sql, params))
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.url_name or match.view_name if match else '<unmatched>'
+
+
+def response_size(response):
+    if not response.streaming:
+        return len(response.content)
+    length = response.get('Content-Length')
+    return int(length) if length else None
+
+
+class RequestMetricsMiddleware:
+    """
+    Records wall time, database queries and response size of each request.
+
+    Observations go to the in-process registry in `orders.metrics`, labelled
+    with the URL name of the view. Requests slower than
+    `ORDERS_SLOW_REQUEST_MS` are logged to `orders.slow_requests` with the SQL
+    they ran.
+
+    Queries are counted through a database execute wrapper, which only sees
+    the current thread's connections. Async views run their queries in other
+    threads, so for them only wall time and response size are recorded.
+    Streaming responses are measured until the response is returned, not
+    until the body is sent.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        threshold = getattr(settings, 'ORDERS_SLOW_REQUEST_MS', None)
+        recorder = QueryRecorder(keep_sql=threshold is not None)
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+        self.record(request, response, duration, recorder)
+        if threshold is not None and duration * 1000 >= threshold:
+            self.log_slow_request(request, response, duration, recorder)
+        return response
+
+    async def __acall__(self, request):
+        threshold = getattr(settings, 'ORDERS_SLOW_REQUEST_MS', None)
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        duration = time.perf_counter() - start
+        self.record(request, response, duration)
+        if threshold is not None and duration * 1000 >= threshold:
+            self.log_slow_request(request, response, duration)
+        return response
+
+    def record(self, request, response, duration, recorder=None):
+        registry.observe(
+            view_name(request), request.method, response.status_code, duration,
+            queries=recorder.count if recorder else None,
+            db_duration=recorder.duration if recorder else None,
+            size=response_size(response),
+        )
+
+    def log_slow_request(self, request, response, duration, recorder=None):
+        lines = [
+            f"Slow request: {request.method} {request.get_full_path()} ({view_name(request)}) "
+            f"returned {response.status_code} in {duration * 1000:.1f} ms"
+        ]
+        if recorder:
+            lines[0] += f", {recorder.count} queries in {recorder.duration * 1000:.1f} ms"
+            for elapsed, sql, params in recorder.queries:
+                lines.append(f"  {elapsed * 1000:.1f} ms: {sql} {params!r}")
+        slow_request_logger.warning('\n'.join(lines))
+
+
+class ProfilerMiddleware:
+    """
+    Runs requests under cProfile when a staff user asks for it.
+
+    See `orders.profiling` for how profiling is enabled and where the stats
+    go. The saved file name is returned in the `X-Profile-Id` header. Must
+    come after AuthenticationMiddleware. Async requests are profiled on the
+    event loop thread only, so queries run by `sync_to_async` are missing.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not (profiling.is_requested(request) and request.user.is_staff):
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        return self.save(request, response, profiler, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not (profiling.is_requested(request) and (await request.auser()).is_staff):
+            return await self.get_response(request)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.disable()
+        return self.save(request, response, profiler, time.perf_counter() - start)
+
+    def save(self, request, response, profiler, duration):
+        response['X-Profile-Id'] = profiling.save_profile(profiler, view_name(request), duration)
+        return response
+
+
+class ReplicaMiddleware:
+    """
+    Sends the reads of GET, HEAD and OPTIONS requests to one of the read
+    replicas, chosen once per request, and keeps a client on `default` for a while after it writes (see
+    `orders.replicas`). Streaming responses read `default` once the view
+    has returned, unless the view binds its queryset earlier.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with replicas.replica_reads(replicas.choose_replica(request)):
+            response = self.get_response(request)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        with replicas.replica_reads(replicas.choose_replica(request)):
+            response = await self.get_response(request)
+        return self.finish(request, response)
+
+    def finish(self, request, response):
+        if request.method not in replicas.SAFE_METHODS and replicas.get_replicas():
+            replicas.pin(response)
+        return response
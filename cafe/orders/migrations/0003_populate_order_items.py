@@ -0,0 +1,82 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+
+
+BATCH_SIZE = 2000
+
+
+def iter_items(items):
+    if not isinstance(items, list):
+        return
+    for item in items:
+        if not isinstance(item, dict) or not str(item.get('name', '')).strip():
+            continue
+        try:
+            price = Decimal(str(item.get('price')))
+        except (InvalidOperation, ValueError):
+            continue
+        yield str(item['name']).strip(), price
+
+
+def populate_order_items(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    MenuItem = apps.get_model('orders', 'MenuItem')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    db_alias = schema_editor.connection.alias
+
+    menu = {}
+    latest_prices = {}
+
+    def flush(batch):
+        prices = {}
+        for _, items in batch:
+            for name, price in iter_items(items):
+                prices[name] = price
+        latest_prices.update(prices)
+        new_names = [name for name in prices if name not in menu]
+        if new_names:
+            MenuItem.objects.using(db_alias).bulk_create(
+                [MenuItem(name=name, price=prices[name]) for name in new_names],
+                ignore_conflicts=True,
+            )
+            menu.update(
+                MenuItem.objects.using(db_alias).filter(name__in=new_names).values_list('name', 'id')
+            )
+        OrderItem.objects.using(db_alias).bulk_create([
+            OrderItem(order_id=order_id, menu_item_id=menu[name], price=price, position=position)
+            for order_id, items in batch
+            for position, (name, price) in enumerate(iter_items(items))
+        ])
+
+    batch = []
+    orders = Order.objects.using(db_alias).order_by('id').values_list('id', 'items')
+    for row in orders.iterator(chunk_size=BATCH_SIZE):
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    MenuItem.objects.using(db_alias).bulk_update(
+        [MenuItem(pk=menu[name], name=name, price=price) for name, price in latest_prices.items()],
+        ['price'], batch_size=BATCH_SIZE,
+    )
+
+
+def clear_order_items(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    apps.get_model('orders', 'OrderItem').objects.using(db_alias).all().delete()
+    apps.get_model('orders', 'MenuItem').objects.using(db_alias).all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_menu_and_order_items'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_order_items, clear_order_items),
+    ]
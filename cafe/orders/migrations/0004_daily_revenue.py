@@ -0,0 +1,46 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:09
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def populate_daily_revenue(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    DailyRevenue = apps.get_model('orders', 'DailyRevenue')
+    db_alias = schema_editor.connection.alias
+    rows = (
+        Order.objects.using(db_alias).filter(status='paid')
+        .annotate(day=TruncDate('created_at', tzinfo=timezone.get_current_timezone()))
+        .values('day')
+        .annotate(total=Sum('total_price'), orders_count=Count('id'))
+        .order_by('day')
+    )
+    DailyRevenue.objects.using(db_alias).bulk_create(
+        DailyRevenue(day=row['day'], total=row['total'], orders_count=row['orders_count'])
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_populate_order_items'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True, verbose_name='День')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('orders_count', models.IntegerField(default=0, verbose_name='Оплаченных заказов')),
+            ],
+            options={
+                'ordering': ['day'],
+            },
+        ),
+        migrations.RunPython(populate_daily_revenue, migrations.RunPython.noop),
+    ]
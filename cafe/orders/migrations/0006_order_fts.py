@@ -0,0 +1,59 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+
+
+FTS_TABLE = 'orders_order_fts'
+BATCH_SIZE = 2000
+
+
+def dish_names(items):
+    if not isinstance(items, list):
+        return
+    for item in items:
+        if not isinstance(item, dict) or not str(item.get('name', '')).strip():
+            continue
+        try:
+            Decimal(str(item.get('price')))
+        except (InvalidOperation, ValueError):
+            continue
+        yield str(item['name']).strip()
+
+
+def create_fts_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    Order = apps.get_model('orders', 'Order')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"dishes, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        batch = []
+        orders = Order.objects.using(connection.alias).order_by('id').values_list('id', 'items')
+        for pk, items in orders.iterator(chunk_size=BATCH_SIZE):
+            batch.append((pk, '\n'.join(dish_names(items))))
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, dishes) VALUES (%s, %s)', batch)
+                batch = []
+        if batch:
+            cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, dishes) VALUES (%s, %s)', batch)
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
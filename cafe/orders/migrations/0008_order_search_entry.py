@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:18
+
+import django.db.models.deletion
+import orders.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_order_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSearchEntry',
+            fields=[
+                ('order', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='orders.order')),
+                ('dishes', orders.models.FullTextField()),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'orders_order_fts',
+                'managed': False,
+            },
+        ),
+    ]
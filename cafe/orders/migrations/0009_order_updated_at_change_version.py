@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:24
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def populate_versions(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    ChangeVersion = apps.get_model('orders', 'ChangeVersion')
+    db_alias = schema_editor.connection.alias
+    # Existing orders have not changed since they were created, as far as we know.
+    Order.objects.using(db_alias).update(updated_at=F('created_at'))
+    ChangeVersion.objects.using(db_alias).create(name='orders', version=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_order_search_entry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.RunPython(populate_versions, migrations.RunPython.noop),
+    ]
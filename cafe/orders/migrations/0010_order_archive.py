@@ -0,0 +1,57 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:41
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+COLUMNS = 'id, table_number, items, total_price, status, created_at, updated_at'
+
+CREATE_HISTORY_VIEW = f"""
+CREATE VIEW orders_order_history AS
+SELECT {COLUMNS}, FALSE AS archived FROM orders_order
+UNION ALL
+SELECT {COLUMNS}, TRUE AS archived FROM orders_orderarchive
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_order_updated_at_change_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderHistory',
+            fields=[
+                ('table_number', models.IntegerField(verbose_name='Номер стола')),
+                ('items', models.JSONField(verbose_name='Список блюд')),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Общая стоимость')),
+                ('status', models.CharField(choices=[('pending', 'В ожидании'), ('ready', 'Готово'), ('paid', 'Оплачено')], default='pending', max_length=10, verbose_name='Статус заказа')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('archived', models.BooleanField(default=False, verbose_name='В архиве')),
+            ],
+            options={
+                'db_table': 'orders_order_history',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderArchive',
+            fields=[
+                ('table_number', models.IntegerField(verbose_name='Номер стола')),
+                ('items', models.JSONField(verbose_name='Список блюд')),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Общая стоимость')),
+                ('status', models.CharField(choices=[('pending', 'В ожидании'), ('ready', 'Готово'), ('paid', 'Оплачено')], default='pending', max_length=10, verbose_name='Статус заказа')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата создания')),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('updated_at', models.DateTimeField(verbose_name='Дата изменения')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата архивации')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='orderarchive_created_idx'), models.Index(fields=['table_number', 'created_at'], name='orderarchive_table_created_idx')],
+            },
+        ),
+        migrations.RunSQL(CREATE_HISTORY_VIEW, 'DROP VIEW orders_order_history'),
+    ]
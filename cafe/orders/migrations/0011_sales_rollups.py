@@ -0,0 +1,100 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:45
+
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+
+BATCH_SIZE = 2000
+
+
+def priced_dishes(items):
+    if not isinstance(items, list):
+        return
+    for item in items:
+        if not isinstance(item, dict) or not str(item.get('name', '')).strip():
+            continue
+        try:
+            price = Decimal(str(item.get('price')))
+        except (InvalidOperation, ValueError):
+            continue
+        yield str(item['name']).strip(), price
+
+
+def populate_rollups(apps, schema_editor):
+    OrderHistory = apps.get_model('orders', 'OrderHistory')
+    HourlySales = apps.get_model('orders', 'HourlySales')
+    DishSales = apps.get_model('orders', 'DishSales')
+    db_alias = schema_editor.connection.alias
+
+    rows = (
+        OrderHistory.objects.using(db_alias)
+        .annotate(bucket=TruncHour('created_at', tzinfo=dt_timezone.utc))
+        .values_list('bucket', 'table_number', 'status')
+        .annotate(sum_total=Sum('total_price'), count=Count('id'))
+        .order_by()
+    )
+    HourlySales.objects.using(db_alias).bulk_create((
+        HourlySales(
+            hour=hour, day=timezone.localdate(hour), table_number=table_number, status=status,
+            total=Decimal(total).quantize(Decimal('0.01')), orders_count=count,
+        )
+        for hour, table_number, status, total, count in rows
+    ), batch_size=BATCH_SIZE)
+
+    sales = defaultdict(lambda: [0, Decimal(0)])
+    orders = OrderHistory.objects.using(db_alias).filter(status='paid').values_list('created_at', 'items')
+    for created_at, items in orders.iterator(chunk_size=BATCH_SIZE):
+        day = timezone.localdate(created_at)
+        for name, price in priced_dishes(items):
+            sales[(day, name)][0] += 1
+            sales[(day, name)][1] += price
+    DishSales.objects.using(db_alias).bulk_create((
+        DishSales(day=day, dish=dish, quantity=quantity, total=total)
+        for (day, dish), (quantity, total) in sales.items()
+    ), batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_order_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DishSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('dish', models.CharField(max_length=255, verbose_name='Блюдо')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Количество')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'dish'), name='dishsales_bucket_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('day', models.DateField(verbose_name='День')),
+                ('table_number', models.IntegerField(verbose_name='Номер стола')),
+                ('status', models.CharField(choices=[('pending', 'В ожидании'), ('ready', 'Готово'), ('paid', 'Оплачено')], max_length=10, verbose_name='Статус заказа')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Сумма заказов')),
+                ('orders_count', models.IntegerField(default=0, verbose_name='Заказов')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='hourlysales_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('hour', 'table_number', 'status'), name='hourlysales_bucket_unique')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
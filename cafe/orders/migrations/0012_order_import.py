@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Источник')),
+                ('position', models.PositiveBigIntegerField(default=0, verbose_name='Обработано записей')),
+                ('imported', models.PositiveIntegerField(default=0, verbose_name='Импортировано заказов')),
+                ('rejected', models.PositiveIntegerField(default=0, verbose_name='Отклонено записей')),
+                ('finished', models.BooleanField(default=False, verbose_name='Завершен')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Начат')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлен')),
+            ],
+        ),
+    ]
@@ -1,6 +1,57 @@
-from django.db import models
+import json
+import re
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
 
-class Order(models.Model):
+from django.db import connections, models, router, transaction
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+
+# Plain snapshot of the fields of an order that derived data depends on.
+OrderState = namedtuple('OrderState', ['id', 'table_number', 'status', 'total_price', 'created_at', 'items'])
+
+
+def iter_items(items):
+    """Yields (name, price) for every well-formed entry of an `items` list, skipping the rest."""
+    if not isinstance(items, list):
+        return
+    for item in items:
+        if not isinstance(item, dict) or not str(item.get('name', '')).strip():
+            continue
+        try:
+            price = Decimal(str(item.get('price')))
+        except (InvalidOperation, ValueError):
+            continue
+        yield str(item['name']).strip(), price
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_dish(self, term):
+        """Orders containing a dish whose name contains `term` (case-insensitive)."""
+        lines = OrderItem.objects.filter(menu_item__in=MenuItem.objects.filter(name__icontains=term))
+        return self.filter(id__in=lines.values('order_id'))
+
+    def search(self, term, ranked=False):
+        """
+        Orders with dishes matching every word of `term` as a prefix.
+
+        Uses the full-text index where the database has one and falls back to
+        `with_dish` otherwise. With `ranked=True` the orders are annotated
+        with `search_rank` (lower is more relevant).
+        """
+        from . import search
+        if not search.is_available(self.db):
+            queryset = self.with_dish(term)
+            if ranked:
+                # No relevance without the index, but callers still order by `search_rank`.
+                queryset = queryset.annotate(search_rank=models.Value(0.0, output_field=models.FloatField()))
+            return queryset
+        return search.filter_orders(self, term, ranked=ranked)
+
+
+class AbstractOrder(models.Model):
+    """Fields of an order, shared by live orders (Order) and archived ones (OrderArchive)."""
     STATUS_CHOICES = [
         ('pending', 'В ожидании'),
         ('ready', 'Готово'),
@@ -11,7 +62,343 @@ class Order(models.Model):
     items = models.JSONField(verbose_name="Список блюд")
     total_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Общая стоимость")
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name="Статус заказа")
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    # Not auto_now_add, so that bulk loads can keep historical timestamps.
+    created_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name="Дата создания")
+    # Set on save and bulk_create; code that writes with queryset.update() must set it itself.
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
+
+    class Meta:
+        abstract = True
 
     def __str__(self):
         return f"Заказ {self.id} | Стол {self.table_number} | {self.get_status_display()}"
+
+    def state(self):
+        return OrderState(*(getattr(self, name) for name in OrderState._fields))
+
+    def iter_items(self):
+        """Yields (name, price) for every well-formed entry of `items`, skipping the rest."""
+        return iter_items(self.items)
+
+
+class TransitionConflict(Exception):
+    """An order is no longer in the status a transition starts from; `status` is its current status."""
+
+    def __init__(self, status):
+        super().__init__(f"The order is {status}.")
+        self.status = status
+
+
+class Order(AbstractOrder):
+    # Status changes made by `transition`: status -> next status.
+    TRANSITIONS = {'pending': 'ready', 'ready': 'paid'}
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Status filter combined with either sort key of the list views.
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            models.Index(fields=['status', 'total_price'], name='order_status_price_idx'),
+            models.Index(fields=['table_number', 'status'], name='order_table_status_idx'),
+            # Unfiltered lists sorted by date or price.
+            models.Index(fields=['created_at'], name='order_created_idx'),
+            models.Index(fields=['total_price'], name='order_price_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # The signal handlers update data derived from the order (lines,
+        # revenue ledger); run them in the same transaction as the write.
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            return super().delete(*args, **kwargs)
+
+    def transition(self, status):
+        """
+        Moves the order to `status` from the status before it in TRANSITIONS.
+
+        The change is a single `UPDATE ... WHERE id = %s AND status = %s`, so
+        of two concurrent transitions of an order only one takes effect and
+        nothing else written to the row in the meantime is overwritten. Only
+        `pk` has to be set: `Order(pk=pk).transition('paid')` does not read
+        the order first. On success the instance holds the updated row and
+        `orders_changed` is sent.
+
+        Raises ValueError if no transition leads to `status`,
+        Order.DoesNotExist if there is no such order and TransitionConflict if
+        the order is not in the previous status (any more).
+        """
+        from .signals import OrderChange, orders_changed
+        previous = {target: source for source, target in self.TRANSITIONS.items()}.get(status)
+        if previous is None:
+            raise ValueError(f"No transition leads to {status!r}.")
+        using = router.db_for_write(type(self), instance=self)
+        rows = Order.objects.using(using).filter(pk=self.pk)
+        fields = (*OrderState._fields, 'updated_at')
+        with transaction.atomic(using=using):
+            if not rows.filter(status=previous).update(status=status, updated_at=timezone.now()):
+                current = rows.values_list('status', flat=True).first()
+                if current is None:
+                    raise Order.DoesNotExist(f"Order {self.pk} does not exist.")
+                raise TransitionConflict(current)
+            row = rows.values_list(*fields).get()
+            after = OrderState(*row[:len(OrderState._fields)])
+            orders_changed.send(sender=Order, changes=[OrderChange(after._replace(status=previous), after)])
+        for name, value in zip(fields, row):
+            setattr(self, name, value)
+        return self
+
+
+class OrderArchive(AbstractOrder):
+    """
+    A paid order moved out of Order by `archive_orders` (see `orders.archive`).
+
+    Keeps the id it had as an order. Archived orders are read-only: they have
+    no lines, and the revenue ledger and dish index still count them.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    updated_at = models.DateTimeField(verbose_name="Дата изменения")
+    archived_at = models.DateTimeField(default=timezone.now, verbose_name="Дата архивации")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='orderarchive_created_idx'),
+            models.Index(fields=['table_number', 'created_at'], name='orderarchive_table_created_idx'),
+        ]
+
+
+class OrderHistoryQuerySet(models.QuerySet):
+    def with_dish(self, term):
+        """
+        Like `OrderQuerySet.with_dish`. Archived orders have no OrderItem
+        lines, so the `name` values in the text of `items` are matched.
+        """
+        # Without a native JSON type the text is json.dumps', with non-ASCII
+        # characters escaped.
+        ascii_only = not connections[self.db].features.has_native_json_field
+        name = re.escape(json.dumps(term, ensure_ascii=ascii_only)[1:-1])
+        return self.alias(items_text=Cast('items', models.TextField())).filter(
+            items_text__iregex=rf'"name": "[^"]*{name}',
+        )
+
+    def search(self, term, ranked=False):
+        """Like `OrderQuerySet.search`; the dish index also covers archived orders."""
+        from . import search
+        if not search.is_available(self.db):
+            queryset = self.with_dish(term)
+            if ranked:
+                queryset = queryset.annotate(search_rank=models.Value(0.0, output_field=models.FloatField()))
+            return queryset
+        return search.filter_orders(self, term, ranked=ranked)
+
+
+class OrderHistory(AbstractOrder):
+    """
+    Live and archived orders together: a read-only view over Order UNION ALL
+    OrderArchive, created by a migration. Queried instead of Order only when
+    a request reaches into the archive (see `orders.archive`).
+    """
+    id = models.BigIntegerField(primary_key=True)
+    archived = models.BooleanField(default=False, verbose_name="В архиве")
+    # The dish index row of the order (archived orders keep theirs), joined on
+    # rowid like Order.search_entry. No column of its own.
+    search_entry = models.ForeignObject(
+        'OrderSearchEntry', on_delete=models.DO_NOTHING, from_fields=['id'], to_fields=['order'],
+        related_name='+',
+    )
+
+    objects = OrderHistoryQuerySet.as_manager()
+
+    class Meta:
+        managed = False
+        db_table = 'orders_order_history'
+
+
+class FullTextField(models.TextField):
+    """Column of an SQLite FTS5 table. Supports the `match` lookup."""
+
+
+@FullTextField.register_lookup
+class FullTextMatch(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+class OrderSearchEntry(models.Model):
+    """
+    Row of the FTS5 dish index of an order (see `orders.search`).
+
+    The virtual table is created by a migration on SQLite only. `rank` is the
+    bm25 relevance of the row for the current MATCH (lower is better).
+    """
+    order = models.OneToOneField(
+        Order, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+        db_constraint=False, related_name='search_entry',
+    )
+    dishes = FullTextField()
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'orders_order_fts'
+
+
+class MenuItem(models.Model):
+    name = models.CharField(max_length=255, unique=True, verbose_name="Название")
+    price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена")
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class OrderItemManager(models.Manager):
+    def replace_for(self, orders, created=False):
+        """
+        Rebuilds the lines of `orders` from their `items` lists.
+
+        Dishes missing from the menu are added to it; the menu price is set to
+        the latest price a dish was ordered at. Pass `created=True` for orders
+        that were just inserted to skip deleting their (non-existent) lines.
+        """
+        orders = [order for order in orders if order.pk is not None]
+        if not orders:
+            return
+        if not created:
+            self.filter(order__in=orders).delete()
+
+        prices = {}
+        for order in orders:
+            for name, price in order.iter_items():
+                prices[name] = price
+        if not prices:
+            return
+        MenuItem.objects.bulk_create(
+            [MenuItem(name=name, price=price) for name, price in prices.items()],
+            update_conflicts=True, unique_fields=['name'], update_fields=['price'],
+        )
+        menu = dict(MenuItem.objects.filter(name__in=prices).values_list('name', 'id'))
+
+        self.bulk_create([
+            OrderItem(order=order, menu_item_id=menu[name], price=price, position=position)
+            for order in orders
+            for position, (name, price) in enumerate(order.iter_items())
+        ])
+
+
+class OrderItem(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines', verbose_name="Заказ")
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.PROTECT, related_name='order_items', verbose_name="Блюдо")
+    price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена")
+    position = models.PositiveIntegerField(default=0, verbose_name="Позиция")
+
+    objects = OrderItemManager()
+
+    class Meta:
+        ordering = ['order', 'position']
+        indexes = [
+            # Dish search resolves menu items first and then needs only the order ids.
+            models.Index(fields=['menu_item', 'order'], name='orderitem_menu_item_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.menu_item} - {self.price}"
+
+
+class DailyRevenue(models.Model):
+    """Revenue of paid orders per day, maintained incrementally on every order write."""
+    day = models.DateField(unique=True, verbose_name="День")
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Выручка")
+    orders_count = models.IntegerField(default=0, verbose_name="Оплаченных заказов")
+
+    class Meta:
+        ordering = ['day']
+
+    def __str__(self):
+        return f"{self.day}: {self.total}"
+
+
+class HourlySales(models.Model):
+    """
+    Orders per hour (UTC), table and status, maintained incrementally on
+    every order write (see `orders.reports`).
+    """
+    hour = models.DateTimeField(verbose_name="Час")
+    # The day of `hour` in the time zone of the ledger, so that day reports
+    # need no time zone conversion.
+    day = models.DateField(verbose_name="День")
+    table_number = models.IntegerField(verbose_name="Номер стола")
+    status = models.CharField(max_length=10, choices=AbstractOrder.STATUS_CHOICES, verbose_name="Статус заказа")
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Сумма заказов")
+    orders_count = models.IntegerField(default=0, verbose_name="Заказов")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'table_number', 'status'], name='hourlysales_bucket_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='hourlysales_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H}:00 | Стол {self.table_number} | {self.status}: {self.total}"
+
+
+class DishSales(models.Model):
+    """Dishes sold in paid orders per day, maintained incrementally on every order write."""
+    day = models.DateField(verbose_name="День")
+    dish = models.CharField(max_length=255, verbose_name="Блюдо")
+    quantity = models.IntegerField(default=0, verbose_name="Количество")
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Выручка")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'dish'], name='dishsales_bucket_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} | {self.dish}: {self.quantity}"
+
+
+class ChangeVersion(models.Model):
+    """
+    A counter bumped on every write to a set of tables.
+
+    Conditional GETs use it as a table-level version, so an unchanged list
+    can be answered without reading the rows (see `orders.conditional`).
+    """
+    name = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name}: {self.version}"
+
+
+class OrderImport(models.Model):
+    """
+    Progress of an `import_orders` run, updated in the same transaction as
+    every chunk of imported orders, so that a resumed run neither skips nor
+    repeats source records.
+    """
+    name = models.CharField(max_length=255, unique=True, verbose_name="Источник")
+    position = models.PositiveBigIntegerField(default=0, verbose_name="Обработано записей")
+    imported = models.PositiveIntegerField(default=0, verbose_name="Импортировано заказов")
+    rejected = models.PositiveIntegerField(default=0, verbose_name="Отклонено записей")
+    finished = models.BooleanField(default=False, verbose_name="Завершен")
+    started_at = models.DateTimeField(default=timezone.now, verbose_name="Начат")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлен")
+
+    def __str__(self):
+        return f"{self.name}: {self.position}"
@@ -0,0 +1,207 @@
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+
+
+DEFAULT_PAGE_SIZE = 50
+
+# Sort keys supported by keyset pagination, mapped to a parser that turns the
+# value stored in a cursor back into a Python object. `id` is always appended
+# as a tie-breaker so the sort order is total.
+KEYSET_FIELDS = {
+    'id': int,
+    'created_at': parse_datetime,
+    'total_price': Decimal,
+    # Relevance annotation added by full-text search.
+    'search_rank': float,
+}
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor token cannot be decoded."""
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset."""
+
+    def __init__(self, items, field, has_next, has_previous):
+        self.items = items
+        self.field = field
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def next_cursor(self):
+        if not self.has_next or not self.items:
+            return None
+        return encode_cursor(self.field, self.items[-1], 'next')
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous or not self.items:
+            return None
+        return encode_cursor(self.field, self.items[0], 'prev')
+
+
+def get_page_size():
+    return getattr(settings, 'ORDERS_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+
+
+def encode_cursor(field, obj, direction):
+    """Encodes the position of `obj` in the `field` ordering as an opaque token."""
+    payload = {'f': field, 'd': direction, 'id': obj.pk}
+    name = field.lstrip('-')
+    if name != 'id':
+        value = getattr(obj, name)
+        payload['v'] = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decodes a cursor token into (field, direction, value, id)."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        field = payload['f']
+        direction = payload['d']
+        pk = int(payload['id'])
+        name = field.lstrip('-')
+        if name not in KEYSET_FIELDS or direction not in ('next', 'prev'):
+            raise InvalidCursor(f"Invalid cursor: {token}")
+        value = KEYSET_FIELDS[name](payload['v']) if name != 'id' else pk
+        if value is None:
+            raise InvalidCursor(f"Invalid cursor: {token}")
+    except (ValueError, TypeError, KeyError, InvalidOperation) as e:
+        raise InvalidCursor(f"Invalid cursor: {token}") from e
+    return field, direction, value, pk
+
+
+def keyset_paginate(queryset, ordering=None, cursor=None, page_size=None):
+    """
+    Returns a KeysetPage of `queryset` sorted by `(ordering, id)`.
+
+    `ordering` is a field name from KEYSET_FIELDS, prefixed with `-` for
+    descending order. Pages are selected with a `WHERE (field, id) > (value,
+    id)` seek instead of OFFSET, so the cost of fetching a page does not
+    depend on how deep into the result set it is. A cursor produced for
+    another ordering is ignored and the first page is returned.
+    """
+    rows, finish = keyset_query(queryset, ordering, cursor, page_size)
+    return finish(list(rows))
+
+
+async def akeyset_paginate(queryset, ordering=None, cursor=None, page_size=None):
+    """Async version of `keyset_paginate`."""
+    rows, finish = keyset_query(queryset, ordering, cursor, page_size)
+    return finish([obj async for obj in rows])
+
+
+def keyset_query(queryset, ordering=None, cursor=None, page_size=None):
+    """
+    Builds the query of one keyset page without running it.
+
+    Returns (rows, finish): `rows` is the sliced queryset to evaluate and
+    `finish` turns the fetched objects into the KeysetPage.
+    """
+    field = ordering or 'id'
+    name = field.lstrip('-')
+    if name not in KEYSET_FIELDS:
+        raise InvalidCursor(f"Unsupported ordering: {ordering}")
+    page_size = page_size or get_page_size()
+    descending = field.startswith('-')
+    keys = (name, 'id') if name != 'id' else ('id',)
+
+    direction, position = 'next', None
+    if cursor:
+        cursor_field, direction, value, pk = decode_cursor(cursor)
+        if cursor_field == field:
+            position = (value, pk)
+        else:
+            direction = 'next'
+
+    backwards = direction == 'prev'
+    # Walking a descending order forwards is walking the ascending one backwards.
+    reverse = backwards != descending
+    if reverse:
+        queryset = queryset.order_by(*[f'-{key}' for key in keys])
+    else:
+        queryset = queryset.order_by(*keys)
+
+    if position is not None:
+        lookup = 'lt' if reverse else 'gt'
+        value, pk = position
+        if name == 'id':
+            queryset = queryset.filter(**{f'id__{lookup}': pk})
+        else:
+            queryset = queryset.filter(
+                Q(**{f'{name}__{lookup}': value}) | Q(**{name: value, f'id__{lookup}': pk})
+            )
+
+    def finish(items):
+        has_more = len(items) > page_size
+        items = items[:page_size]
+        if backwards:
+            items.reverse()
+            return KeysetPage(items, field, has_next=True, has_previous=has_more)
+        return KeysetPage(items, field, has_next=has_more, has_previous=position is not None)
+
+    return queryset[:page_size + 1], finish
+
+
+class OrderCursorPagination(CursorPagination):
+    """
+    Cursor pagination for the orders API.
+
+    The ordering is taken from the `ordering` query parameter (any of the
+    view's `ordering_fields`) and falls back to relevance for full-text
+    searches and to newest first otherwise. `id` is always
+    appended as a tie-breaker so orders sharing a price or timestamp keep a
+    stable position between pages.
+    """
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_page_size(self, request):
+        self.page_size = get_page_size()
+        return super().get_page_size(request)
+
+    def get_ordering(self, request, queryset, view):
+        if 'search_rank' in queryset.query.annotations:
+            # DishSearchFilter ranks results when no explicit ordering is requested.
+            return ('search_rank', 'id')
+        ordering = super().get_ordering(request, queryset, view)
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            descending = ordering[0].startswith('-')
+            ordering += ('-id' if descending else 'id',)
+        return ordering
+
+
+class ResultsPagination(BasePagination):
+    """
+    Returns all rows in one `{"results": [...]}` object, the shape of the
+    report answers. As a pagination class it also tells the schema generator
+    about the envelope.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return list(queryset)
+
+    def get_paginated_response(self, data):
+        return Response({'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {'type': 'object', 'required': ['results'], 'properties': {'results': schema}}
@@ -0,0 +1,108 @@
+"""
+Saved cProfile runs of single requests.
+
+`ProfilerMiddleware` profiles a request when profiling is enabled with
+`ORDERS_PROFILING` and a staff user asks for it with the `X-Profile: 1`
+header or the `profile=1` query parameter. Each run is written as a pstats
+file to `ORDERS_PROFILE_DIR`; only the newest `ORDERS_PROFILE_KEEP` files are
+kept. `profile_summary` merges the saved runs and reports the hot spots.
+"""
+import os
+import pstats
+import re
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+
+DEFAULT_KEEP = 50
+SUFFIX = '.prof'
+
+# Where the time of a request goes, by the source file of the function that
+# spent it. The first matching area wins.
+AREAS = [
+    ('json', ('/json/', '/django/db/models/fields/json.py')),
+    ('orm', ('/django/db/',)),
+    ('templates', ('/django/template/', '/django/templatetags/', '/widget_tweaks/')),
+    ('rest_framework', ('/rest_framework/',)),
+    ('orders', ('/orders/',)),
+    ('django', ('/django/',)),
+    ('imports', ('<frozen importlib',)),
+]
+
+
+def profile_dir():
+    return Path(getattr(settings, 'ORDERS_PROFILE_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+
+def is_requested(request):
+    """True if profiling is enabled and the request asks to be profiled. The caller checks that the user is staff."""
+    if not getattr(settings, 'ORDERS_PROFILING', False):
+        return False
+    return request.headers.get('X-Profile') == '1' or request.GET.get('profile') == '1'
+
+
+def save_profile(profiler, view, duration):
+    """Writes the stats of one run and removes the oldest runs. Returns the file name."""
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '_', view)
+    name = f'{time.time_ns()}-{slug}-{duration * 1000:.0f}ms{SUFFIX}'
+    profiler.dump_stats(directory / name)
+    rotate(directory, getattr(settings, 'ORDERS_PROFILE_KEEP', DEFAULT_KEEP))
+    return name
+
+
+def saved_profiles(directory=None, view=None):
+    """Saved profile files, oldest first, optionally only those of one URL name."""
+    directory = Path(directory) if directory else profile_dir()
+    if not directory.is_dir():
+        return []
+    files = sorted(path for path in directory.iterdir() if path.suffix == SUFFIX)
+    if view:
+        files = [path for path in files if path.name.split('-', 1)[1].rsplit('-', 1)[0] == view]
+    return files
+
+
+def rotate(directory, keep):
+    files = saved_profiles(directory)
+    for path in files[:max(len(files) - keep, 0)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def load_stats(paths, stream=None):
+    stats = pstats.Stats(str(paths[0]), stream=stream)
+    for path in paths[1:]:
+        stats.add(str(path))
+    return stats
+
+
+def area_of(filename):
+    filename = filename.replace(os.sep, '/')
+    for area, fragments in AREAS:
+        if any(fragment in filename for fragment in fragments):
+            return area
+    return 'other'
+
+
+def time_by_area(stats):
+    """
+    Own (not cumulative) time per area, largest first, as [(area, seconds)].
+
+    Builtins such as `sqlite3.Cursor.execute` have no source file; their time
+    is attributed to the areas of their callers.
+    """
+    totals = {}
+    for (filename, _, _), (_, _, own_time, _, callers) in stats.stats.items():
+        if filename == '~' and callers:
+            for (caller_file, _, _), caller_stats in callers.items():
+                area = area_of(caller_file)
+                totals[area] = totals.get(area, 0) + caller_stats[2]
+            continue
+        area = area_of(filename)
+        totals[area] = totals.get(area, 0) + own_time
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,109 @@
+"""
+Read replicas for order reads.
+
+With aliases listed in `ORDERS_READ_REPLICAS`, ReplicaRouter sends reads of
+the orders app made while serving a GET, HEAD or OPTIONS request to one of
+these databases: the order lists, order and report API reads, the revenue
+total and the ETag versions. The replica is picked once per request, so
+all reads of a request see the same snapshot. Writes, and every read made while serving
+another method, go to `default`, as do reads outside requests (commands,
+the writer thread).
+
+A replica lags behind `default`, so a client that has just written would
+not see its own write on the next page. After a request with another
+method the client gets a cookie that sends its reads to `default` for
+`ORDERS_REPLICA_STICKY_SECONDS`.
+
+For SQLite, `sync_replica` copies `default` over a replica file with the
+backup API; run it periodically (`--interval`) to keep a local stand-in
+replica current.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+DEFAULT_STICKY_SECONDS = 10
+
+PIN_COOKIE = 'orders_primary'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# The alias of the local stand-in replica in DATABASES.
+STANDIN_ALIAS = 'replica'
+
+_replica = ContextVar('orders_replica', default=None)
+
+
+def get_replicas():
+    return list(getattr(settings, 'ORDERS_READ_REPLICAS', []))
+
+
+@contextmanager
+def replica_reads(alias):
+    """Sends reads of the orders app in the block to the replica `alias` (None: to `default`)."""
+    token = _replica.set(alias)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def reads_replica(request):
+    """True if the reads made for `request` may go to a replica."""
+    return request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES and bool(get_replicas())
+
+
+def choose_replica(request):
+    """The replica to serve the reads of `request` from, or None for `default`."""
+    return random.choice(get_replicas()) if reads_replica(request) else None
+
+
+def pin(response):
+    """Sends the client's reads to `default` for the next ORDERS_REPLICA_STICKY_SECONDS."""
+    seconds = getattr(settings, 'ORDERS_REPLICA_STICKY_SECONDS', DEFAULT_STICKY_SECONDS)
+    response.set_cookie(PIN_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax')
+
+
+class ReplicaRouter:
+    """Routes reads of the orders app to the replica of the enclosing `replica_reads` block."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'orders':
+            return None
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema with the data from `default`. The stand-in
+        # is refused even when it is not in use, so that `migrate` and
+        # `makemigrations` never create its file.
+        if db == STANDIN_ALIAS or db in get_replicas():
+            return False
+        return None
+
+
+def sync(alias, source=DEFAULT_DB_ALIAS):
+    """
+    Copies the SQLite database `source` over the SQLite database `alias`
+    with the backup API. Returns the number of pages copied.
+    """
+    for name in (source, alias):
+        if connections[name].vendor != 'sqlite':
+            raise ValueError(f"Database {name!r} is not SQLite.")
+    source_connection, target_connection = connections[source], connections[alias]
+    source_connection.ensure_connection()
+    target_connection.ensure_connection()
+    source_connection.connection.backup(target_connection.connection)
+    return target_connection.connection.execute('PRAGMA page_count').fetchone()[0]
@@ -0,0 +1,178 @@
+"""
+Sales rollups behind the reports API.
+
+HourlySales holds the number and value of orders per hour (UTC), table and
+status; DishSales the quantity and revenue of every dish sold in paid orders
+per day. Like the revenue ledger, both are kept in step from `orders_changed`
+in the same transaction as the order write, and archiving leaves them alone.
+Reports only read these buckets, so their cost depends on the range and
+grouping asked for, not on the number of orders. `rebuild_reports`
+recomputes them from the orders, archived ones included.
+"""
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import DishSales, HourlySales, OrderHistory, iter_items
+from .revenue import add_to_buckets, order_day, round_money
+
+
+CHUNK_SIZE = 2000
+
+# `day` is determined by `hour`; it is part of the key so that it is set on new rows.
+HOURLY_KEY = ('hour', 'day', 'table_number', 'status')
+HOURLY_VALUES = ('total', 'orders_count')
+DISH_KEY = ('day', 'dish')
+DISH_VALUES = ('quantity', 'total')
+
+# Groupings of the reports: parameter value -> field of the grouped rows.
+SALES_GROUPS = {'hour': 'hour', 'day': 'day', 'table': 'table_number', 'status': 'status'}
+DISH_GROUPS = {'day': 'day', 'dish': 'dish'}
+
+
+def sales_hour(created_at):
+    """The HourlySales bucket of an order: its creation time truncated to the hour, in UTC."""
+    if timezone.is_aware(created_at):
+        created_at = created_at.astimezone(dt_timezone.utc)
+    return created_at.replace(minute=0, second=0, microsecond=0)
+
+
+def signed_states(changes):
+    """Yields (state, -1) for the old and (state, 1) for the new state of every OrderChange."""
+    for before, after in changes:
+        if before is not None:
+            yield before, -1
+        if after is not None:
+            yield after, 1
+
+
+def hourly_deltas(changes):
+    """Returns {(hour, day, table_number, status): (total delta, orders_count delta)} for a list of OrderChange."""
+    deltas = defaultdict(lambda: [Decimal(0), 0])
+    for state, sign in signed_states(changes):
+        hour = sales_hour(state.created_at)
+        delta = deltas[(hour, order_day(hour), state.table_number, state.status)]
+        delta[0] += sign * Decimal(state.total_price)
+        delta[1] += sign
+    return {key: tuple(delta) for key, delta in deltas.items() if delta[0] or delta[1]}
+
+
+def dish_deltas(changes):
+    """Returns {(day, dish): (quantity delta, total delta)} for a list of OrderChange."""
+    deltas = defaultdict(lambda: [0, Decimal(0)])
+    for state, sign in signed_states(changes):
+        if state.status != 'paid':
+            continue
+        day = order_day(state.created_at)
+        for name, price in iter_items(state.items):
+            delta = deltas[(day, name)]
+            delta[0] += sign
+            delta[1] += sign * price
+    return {key: tuple(delta) for key, delta in deltas.items() if delta[0] or delta[1]}
+
+
+def apply_changes(changes):
+    """Applies order changes to the rollups."""
+    add_to_buckets(HourlySales, HOURLY_KEY, HOURLY_VALUES, hourly_deltas(changes))
+    add_to_buckets(DishSales, DISH_KEY, DISH_VALUES, dish_deltas(changes))
+
+
+def live_hourly_sales():
+    """Computes the HourlySales buckets from the orders: {key: (total, orders_count)}."""
+    rows = (
+        OrderHistory.objects
+        .annotate(bucket=TruncHour('created_at', tzinfo=dt_timezone.utc))
+        .values_list('bucket', 'table_number', 'status')
+        .annotate(sum_total=Sum('total_price'), count=Count('id'))
+        .order_by()
+    )
+    return {
+        (hour, order_day(hour), table_number, status): (round_money(total), count)
+        for hour, table_number, status, total, count in rows
+    }
+
+
+def live_dish_sales():
+    """Computes the DishSales buckets from the items of the paid orders: {key: (quantity, total)}."""
+    sales = defaultdict(lambda: [0, Decimal(0)])
+    rows = OrderHistory.objects.filter(status='paid').values_list('created_at', 'items')
+    for created_at, items in rows.iterator(chunk_size=CHUNK_SIZE):
+        day = order_day(created_at)
+        for name, price in iter_items(items):
+            bucket = sales[(day, name)]
+            bucket[0] += 1
+            bucket[1] += price
+    return {key: tuple(bucket) for key, bucket in sales.items()}
+
+
+def stored_buckets(model, key_fields, value_fields):
+    rows = model.objects.values_list(*key_fields, *value_fields)
+    size = len(key_fields)
+    return {row[:size]: row[size:] for row in rows if any(row[size:])}
+
+
+def compare_rollups():
+    """Returns a list of (model name, key, stored, live) for every bucket that disagrees with the orders."""
+    mismatches = []
+    for model, key_fields, value_fields, live in [
+        (HourlySales, HOURLY_KEY, HOURLY_VALUES, live_hourly_sales()),
+        (DishSales, DISH_KEY, DISH_VALUES, live_dish_sales()),
+    ]:
+        stored = stored_buckets(model, key_fields, value_fields)
+        empty = (0,) * len(value_fields)
+        for key in sorted(set(stored) | set(live), key=str):
+            if tuple(stored.get(key, empty)) != tuple(live.get(key, empty)):
+                mismatches.append((model.__name__, key, stored.get(key, empty), live.get(key, empty)))
+    return mismatches
+
+
+@transaction.atomic
+def rebuild_rollups():
+    """Replaces the rollups with buckets computed from the orders. Returns (hourly buckets, dish buckets)."""
+    hourly = live_hourly_sales()
+    dishes = live_dish_sales()
+    HourlySales.objects.all().delete()
+    HourlySales.objects.bulk_create(
+        (HourlySales(**dict(zip(HOURLY_KEY, key)), **dict(zip(HOURLY_VALUES, values))) for key, values in hourly.items()),
+        batch_size=CHUNK_SIZE,
+    )
+    DishSales.objects.all().delete()
+    DishSales.objects.bulk_create(
+        (DishSales(**dict(zip(DISH_KEY, key)), **dict(zip(DISH_VALUES, values))) for key, values in dishes.items()),
+        batch_size=CHUNK_SIZE,
+    )
+    return len(hourly), len(dishes)
+
+
+def group_rows(queryset, groups, sums):
+    """
+    Sums the `sums` fields of rollup rows per `groups` (fields of the rows).
+    Returns dicts ordered by the groups; buckets that add up to nothing are
+    left out.
+    """
+    totals = {f'sum_{name}': Sum(name) for name in sums}
+    rows = queryset.values(*groups).annotate(**totals).order_by(*groups)
+    results = []
+    for row in rows:
+        values = {name: row.pop(f'sum_{name}') for name in sums}
+        if not any(values.values()):
+            continue
+        if 'total' in values:
+            values['total'] = round_money(values['total'])
+        results.append({**row, **values})
+    return results
+
+
+def sales_report(queryset, groups):
+    """Orders and their value per the given SALES_GROUPS fields, from HourlySales rows."""
+    return group_rows(queryset, groups, HOURLY_VALUES)
+
+
+def dish_report(queryset, groups):
+    """Dishes sold per the given DISH_GROUPS fields, from DishSales rows."""
+    return group_rows(queryset, groups, DISH_VALUES)
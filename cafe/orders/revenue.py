@@ -0,0 +1,144 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyRevenue, OrderHistory
+
+
+CENTS = Decimal('0.01')
+
+
+def round_money(value):
+    """
+    A sum of prices from the database as a Decimal of the prices' precision:
+    SQLite sums decimals as floats, or as decimals without their scale.
+    """
+    return Decimal(value).quantize(CENTS)
+
+
+def order_day(created_at):
+    """The ledger day an order belongs to."""
+    return timezone.localdate(created_at) if timezone.is_aware(created_at) else created_at.date()
+
+
+def ledger_deltas(changes):
+    """Returns {day: (total delta, orders_count delta)} for a list of OrderChange."""
+    deltas = defaultdict(lambda: [Decimal(0), 0])
+    for before, after in changes:
+        if before is not None and before.status == 'paid':
+            delta = deltas[order_day(before.created_at)]
+            delta[0] -= Decimal(before.total_price)
+            delta[1] -= 1
+        if after is not None and after.status == 'paid':
+            delta = deltas[order_day(after.created_at)]
+            delta[0] += Decimal(after.total_price)
+            delta[1] += 1
+    return {day: tuple(delta) for day, delta in deltas.items() if delta[0] or delta[1]}
+
+
+def add_to_buckets(model, key_fields, value_fields, deltas):
+    """
+    Adds {key: values} deltas to the rows of a rollup model, creating the
+    missing rows. The affected rows are read once and written back with bulk
+    inserts, so a bulk write of orders costs a few queries however many
+    buckets it touches. Used for the revenue ledger and the report rollups.
+    """
+    if not deltas:
+        return
+    with transaction.atomic():
+        # Narrowed by the first key field only; the other rows of those hours or days are few.
+        candidates = model.objects.select_for_update().filter(
+            **{f'{key_fields[0]}__in': {key[0] for key in deltas}},
+        )
+        rows = {tuple(getattr(row, name) for name in key_fields): row for row in candidates}
+        updated, created = [], []
+        for key, values in deltas.items():
+            row = rows.get(key)
+            if row is None:
+                created.append(model(**dict(zip(key_fields, key)), **dict(zip(value_fields, values))))
+                continue
+            for name, value in zip(value_fields, values):
+                setattr(row, name, getattr(row, name) + value)
+            updated.append(row)
+        if updated:
+            # Deleted and inserted again with the same ids: much cheaper than
+            # bulk_update's CASE expressions when a write touches many buckets.
+            model.objects.filter(pk__in=[row.pk for row in updated]).delete()
+            model.objects.bulk_create(updated)
+        if not created:
+            return
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(created)
+        except IntegrityError:
+            # Another writer created some of the rows in the meantime.
+            for row in created:
+                lookup = {name: getattr(row, name) for name in key_fields}
+                increments = {name: F(name) + getattr(row, name) for name in value_fields}
+                if not model.objects.filter(**lookup).update(**increments):
+                    row.save(force_insert=True)
+
+
+def apply_changes(changes):
+    """Applies order changes to the revenue ledger."""
+    deltas = {(day,): delta for day, delta in ledger_deltas(changes).items()}
+    add_to_buckets(DailyRevenue, ('day',), ('total', 'orders_count'), deltas)
+
+
+def total_revenue():
+    """Total revenue of all paid orders, read from the ledger."""
+    return DailyRevenue.objects.aggregate(total=Sum('total'))['total'] or 0
+
+
+async def atotal_revenue():
+    total = await DailyRevenue.objects.aaggregate(total=Sum('total'))
+    return total['total'] or 0
+
+
+def live_daily_revenue():
+    """Computes {day: (total, orders_count)} from the orders, archived ones included."""
+    rows = (
+        OrderHistory.objects.filter(status='paid')
+        .annotate(day=TruncDate('created_at', tzinfo=timezone.get_current_timezone()))
+        .values('day')
+        .annotate(total=Sum('total_price'), orders_count=Count('id'))
+        .order_by('day')
+    )
+    return {row['day']: (round_money(row['total']), row['orders_count']) for row in rows}
+
+
+def ledger_daily_revenue():
+    """Returns {day: (total, orders_count)} as currently stored in the ledger."""
+    return {
+        row.day: (row.total, row.orders_count)
+        for row in DailyRevenue.objects.all()
+        if row.total or row.orders_count
+    }
+
+
+def compare_ledger():
+    """Returns a list of (day, ledger, live) for every day where the ledger disagrees with the orders."""
+    ledger = ledger_daily_revenue()
+    live = live_daily_revenue()
+    mismatches = []
+    for day in sorted(set(ledger) | set(live)):
+        stored = ledger.get(day, (Decimal(0), 0))
+        actual = live.get(day, (Decimal(0), 0))
+        if Decimal(stored[0]) != Decimal(actual[0]) or stored[1] != actual[1]:
+            mismatches.append((day, stored, actual))
+    return mismatches
+
+
+@transaction.atomic
+def rebuild_ledger():
+    """Replaces the ledger with totals computed from the orders table. Returns the number of days."""
+    live = live_daily_revenue()
+    DailyRevenue.objects.all().delete()
+    DailyRevenue.objects.bulk_create(
+        DailyRevenue(day=day, total=total, orders_count=count) for day, (total, count) in live.items()
+    )
+    return len(live)
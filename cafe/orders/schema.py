@@ -0,0 +1,190 @@
+"""
+The OpenAPI schema and API docs served from a build artifact.
+
+`build_schema` generates the schema once with drf_spectacular and writes it
+to ORDERS_SCHEMA_DIR as `openapi-<version>.yaml` and `.json`, where the
+version is a hash of the schema, together with the Swagger UI and Redoc
+pages (`swagger-<version>.html`, `redoc-<version>.html`) pointing at the
+versioned JSON and a `manifest.json` naming the current version. The
+Swagger UI page takes the CSRF token for "Try it out" from the `csrftoken`
+cookie, which `swagger_view` sets.
+
+With ORDERS_PRECOMPUTED_SCHEMA the URLconf serves these files instead of
+drf_spectacular's views and the settings leave drf_spectacular out of
+INSTALLED_APPS, so it is not imported by the web workers and no request
+introspects the viewsets. The versioned schema
+files never change and are served with a one-year `immutable` lifetime;
+`/api/schema/`, `/api/docs/` and `/api/redoc/` keep their URLs, so they
+are revalidated with an ETag on every use.
+"""
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_safe
+
+
+MANIFEST = 'manifest.json'
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+CONTENT_TYPES = {
+    'yaml': 'application/vnd.oai.openapi; charset=utf-8',
+    'json': 'application/vnd.oai.openapi+json; charset=utf-8',
+    'html': 'text/html; charset=utf-8',
+}
+
+# ?format= values of SpectacularAPIView's renderers.
+FORMATS = {'yaml': 'yaml', 'openapi': 'yaml', 'json': 'json', 'openapi-json': 'json'}
+
+SCHEMA_FILE = re.compile(r'openapi-[0-9a-f]+\.(yaml|json)')
+
+
+def get_schema_dir():
+    return os.fspath(getattr(settings, 'ORDERS_SCHEMA_DIR', settings.BASE_DIR / 'schema'))
+
+
+def file_names(version):
+    """The files of a build, by kind."""
+    return {
+        'yaml': f'openapi-{version}.yaml',
+        'json': f'openapi-{version}.json',
+        'swagger': f'swagger-{version}.html',
+        'redoc': f'redoc-{version}.html',
+    }
+
+
+def current_version(directory=None):
+    """The version named by the manifest of `directory`, or None if nothing was built."""
+    try:
+        with open(os.path.join(directory or get_schema_dir(), MANIFEST), encoding='utf-8') as f:
+            return json.load(f)['version']
+    except FileNotFoundError:
+        return None
+
+
+def schema_version(content):
+    """The version of a schema: a hash of its JSON text."""
+    return hashlib.sha256(content).hexdigest()[:12]
+
+
+def write_build(directory, version, files, keep=3):
+    """
+    Writes the files of a build (content by kind, see `file_names`) to
+    `directory` and makes it current. The files of the `keep` previous
+    builds are left for clients still holding their URLs; older ones are
+    deleted.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for kind, name in file_names(version).items():
+        with open(os.path.join(directory, name), 'wb') as f:
+            f.write(files[kind])
+    # Readers see either the old manifest or the new one, never a partial file.
+    temporary = os.path.join(directory, MANIFEST + '.tmp')
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump({'version': version}, f)
+    os.replace(temporary, os.path.join(directory, MANIFEST))
+
+    builds = {}
+    for name in os.listdir(directory):
+        match = re.fullmatch(r'openapi-([0-9a-f]+)\.json', name)
+        if match and match[1] != version:
+            builds[match[1]] = os.stat(os.path.join(directory, name)).st_mtime
+    for old in sorted(builds, key=builds.get, reverse=True)[keep:]:
+        for name in file_names(old).values():
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def current_build():
+    """The files of the current build, by kind, as (content, ETag). Raises Http404 if nothing was built."""
+    path = os.path.join(get_schema_dir(), MANIFEST)
+    try:
+        modified = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        raise Http404("The API schema has not been built; run `manage.py build_schema`.")
+    return load_build(path, modified)
+
+
+@lru_cache(maxsize=4)
+def load_build(path, modified):
+    # Keyed on the manifest's mtime, so a new build is picked up without a restart.
+    directory = os.path.dirname(path)
+    build = {}
+    for kind, name in file_names(current_version(directory)).items():
+        with open(os.path.join(directory, name), 'rb') as f:
+            content = f.read()
+        build[kind] = content, quote_etag(hashlib.sha256(content).hexdigest()[:16])
+    return build
+
+
+def serve(request, content, etag, kind, max_age=0, immutable=False):
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type=CONTENT_TYPES[kind])
+    response.headers['ETag'] = etag
+    if immutable:
+        patch_cache_control(response, public=True, max_age=max_age, immutable=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def schema_format(request):
+    """YAML or JSON, chosen like SpectacularAPIView's content negotiation. Raises Http404 for other formats."""
+    fmt = request.GET.get('format')
+    if fmt is not None:
+        if fmt not in FORMATS:
+            raise Http404(f"Unknown schema format: {fmt}")
+        return FORMATS[fmt]
+    accept = request.headers.get('Accept', '')
+    return 'json' if 'json' in accept and 'yaml' not in accept else 'yaml'
+
+
+@require_safe
+def schema_view(request):
+    """
+    The current schema in YAML or JSON (`?format=json` or an Accept header
+    with JSON).
+    """
+    fmt = schema_format(request)
+    content, etag = current_build()[fmt]
+    response = serve(request, content, etag, fmt)
+    response.headers['Content-Disposition'] = f'inline; filename="schema.{fmt}"'
+    return response
+
+
+@require_safe
+def schema_file_view(request, name):
+    """A versioned schema file. Its content never changes, so it is cached for a year."""
+    match = SCHEMA_FILE.fullmatch(name)
+    path = os.path.join(get_schema_dir(), name)
+    if match is None or not os.path.isfile(path):
+        raise Http404("No such schema version.")
+    with open(path, 'rb') as f:
+        content = f.read()
+    return serve(request, content, quote_etag(name), match[1], max_age=IMMUTABLE_MAX_AGE, immutable=True)
+
+
+@require_safe
+@ensure_csrf_cookie
+def swagger_view(request):
+    """The Swagger UI page of the current build, with the CSRF cookie its requests send back."""
+    response = serve(request, *current_build()['swagger'], 'html')
+    response.headers['Cross-Origin-Opener-Policy'] = 'unsafe-none'
+    return response
+
+
+@require_safe
+def redoc_view(request):
+    """The Redoc page of the current build."""
+    return serve(request, *current_build()['redoc'], 'html')
@@ -0,0 +1,84 @@
+"""
+Full-text dish search on top of an SQLite FTS5 table.
+
+`orders_order_fts` holds one row per order, with the order id as rowid and the
+names of its dishes as the indexed text; it is mapped to the unmanaged
+OrderSearchEntry model. It is kept in sync from the
+`orders_changed` signal, in the same transaction as the order write.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import F
+
+from .models import Order, iter_items
+
+
+FTS_TABLE = 'orders_order_fts'
+
+WORD_RE = re.compile(r'\w+')
+
+
+def is_available(using):
+    return connections[using].vendor == 'sqlite'
+
+
+def match_expression(term):
+    """Turns user input into an FTS5 query matching every word as a prefix, or None."""
+    words = WORD_RE.findall(term or '')
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def document(items):
+    """The indexed text of an order."""
+    return '\n'.join(name for name, _ in iter_items(items))
+
+
+def filter_orders(queryset, term, ranked=False):
+    """
+    Joins the index to `queryset` (of Order or OrderHistory), so SQLite
+    drives the query from the full-text match and looks orders up by primary
+    key. Archived orders keep their rows in the index; for OrderHistory
+    SQLite pushes the join into both halves of the view.
+    """
+    expression = match_expression(term)
+    if expression is None:
+        return queryset.none()
+    queryset = queryset.filter(search_entry__dishes__match=expression)
+    if ranked:
+        queryset = queryset.annotate(search_rank=F('search_entry__rank'))
+    return queryset
+
+
+def index_orders(rows, using=None):
+    """(Re)indexes orders given as (id, items) pairs."""
+    rows = list(rows)
+    using = using or router.db_for_write(Order)
+    if not rows or not is_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk, _ in rows])
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, dishes) VALUES (%s, %s)',
+            [(pk, document(items)) for pk, items in rows],
+        )
+
+
+def unindex_orders(ids, using=None):
+    ids = list(ids)
+    using = using or router.db_for_write(Order)
+    if not ids or not is_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in ids])
+
+
+def apply_changes(changes):
+    """Updates the index for a list of OrderChange."""
+    index_orders(
+        (after.id, after.items) for before, after in changes
+        if after is not None and (before is None or before.items != after.items)
+    )
+    unindex_orders(before.id for before, after in changes if after is None)
@@ -2,6 +2,63 @@ from rest_framework import serializers
 from .models import Order
 
 class OrderSerializer(serializers.ModelSerializer):
+    """
+    Serializer for orders.
+
+    Accepts an optional `fields` argument with the names of the fields to
+    keep, so clients can ask for a sparse representation of an order.
+    """
     class Meta:
         model = Order
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class OrderStatusSerializer(serializers.Serializer):
+    """One entry of a bulk status change."""
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+
+class OrderTransitionSerializer(serializers.Serializer):
+    """The status an order is moved to by a transition."""
+    status = serializers.ChoiceField(choices=[
+        (value, label) for value, label in Order.STATUS_CHOICES if value in Order.TRANSITIONS.values()
+    ])
+
+
+class SalesReportSerializer(serializers.Serializer):
+    """A row of the sales report; only the fields the report is grouped by are present."""
+    hour = serializers.DateTimeField(required=False)
+    day = serializers.DateField(required=False)
+    table_number = serializers.IntegerField(required=False)
+    status = serializers.CharField(required=False)
+    total = serializers.DecimalField(max_digits=14, decimal_places=2)
+    orders_count = serializers.IntegerField()
+
+
+class TableStatusSerializer(serializers.Serializer):
+    orders_count = serializers.IntegerField()
+    total = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class OpenBillSerializer(serializers.Serializer):
+    """The open bill of a table: its orders that are not paid yet, in all and per status."""
+    table_number = serializers.IntegerField()
+    orders_count = serializers.IntegerField()
+    total = serializers.DecimalField(max_digits=14, decimal_places=2)
+    statuses = serializers.DictField(child=TableStatusSerializer())
+
+
+class DishReportSerializer(serializers.Serializer):
+    """A row of the dish report; only the fields the report is grouped by are present."""
+    day = serializers.DateField(required=False)
+    dish = serializers.CharField(required=False)
+    quantity = serializers.IntegerField()
+    total = serializers.DecimalField(max_digits=14, decimal_places=2)
@@ -0,0 +1,101 @@
+from collections import namedtuple
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from . import conditional, events, fragments, reports, revenue, search, tables
+from .models import Order, OrderItem, OrderState
+
+
+# A change to one order: `before` is None for a created order and `after` is
+# None for a deleted one. Both are OrderState snapshots.
+OrderChange = namedtuple('OrderChange', ['before', 'after'])
+
+# Sent with `changes`, a list of OrderChange, for every write to orders. Single
+# saves and deletes send it from the model signals below; code that writes in
+# bulk (bulk_create, queryset.update) must send it itself.
+orders_changed = Signal()
+
+
+@receiver(pre_save, sender=Order)
+def remember_previous_state(sender, instance, raw=False, **kwargs):
+    """Stores the row as it is in the database before an update is written."""
+    instance._previous_state = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    row = Order.objects.filter(pk=instance.pk).values_list(*OrderState._fields).first()
+    if row is not None:
+        instance._previous_state = OrderState(*row)
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_previous_state', None)
+    if before is not None and update_fields is not None:
+        # Fields that were not written keep their stored values; this also
+        # avoids loading deferred fields.
+        after = before._replace(**{
+            name: getattr(instance, name) for name in update_fields if name in OrderState._fields
+        })
+    else:
+        after = instance.state()
+    if before is None or before.items != after.items:
+        OrderItem.objects.replace_for([instance], created=created)
+    orders_changed.send(sender=Order, changes=[OrderChange(before, after)])
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    orders_changed.send(sender=Order, changes=[OrderChange(instance.state(), None)])
+
+
+@receiver(orders_changed)
+def bump_change_version(sender, changes, **kwargs):
+    """Changes the ETag of the order lists and orders (see `orders.conditional`)."""
+    conditional.bump()
+
+
+@receiver(orders_changed)
+def update_revenue_ledger(sender, changes, **kwargs):
+    """Keeps DailyRevenue in step with paid orders."""
+    revenue.apply_changes(changes)
+
+
+@receiver(orders_changed)
+def update_sales_rollups(sender, changes, **kwargs):
+    """Keeps the hourly and per-dish sales rollups of the reports in step."""
+    reports.apply_changes(changes)
+
+
+@receiver(orders_changed)
+def update_search_index(sender, changes, **kwargs):
+    """Keeps the full-text dish index in step with `Order.items`."""
+    search.apply_changes(changes)
+
+
+@receiver(orders_changed)
+def publish_order_events(sender, changes, **kwargs):
+    """Streams the changes to connected boards once they are committed."""
+    transaction.on_commit(partial(events.publish_changes, changes))
+
+
+@receiver(orders_changed)
+def invalidate_order_fragments(sender, changes, **kwargs):
+    """
+    Drops the cached list rows of the changed orders.
+
+    Rows are dropped again after the commit: a page rendered while the
+    transaction was open may have cached the rows as they were before it.
+    """
+    fragments.apply_changes(changes)
+    transaction.on_commit(partial(fragments.apply_changes, changes))
+
+
+@receiver(orders_changed)
+def drop_replaced_open_bills(sender, changes, **kwargs):
+    """Frees the open bills cached under the version the write replaced."""
+    transaction.on_commit(tables.drop_replaced)
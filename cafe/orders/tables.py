@@ -0,0 +1,88 @@
+"""
+Open bills per table for the floor view.
+
+A table's open bill is the sum of its orders that are not paid yet. All
+tables are read with one `GROUP BY table_number, status` query over the open
+statuses, which seeks the `(status, total_price)` index, so its cost follows
+the number of open orders rather than the order history or the number of
+tables.
+
+The result is cached per database alias (a replica may lag behind
+`default`) and per ChangeVersion of the orders, the version of the ETag.
+The version is read before the bills, so bills computed from an older
+snapshot are only ever stored under an older version and every write makes
+the next read recompute them. The entries of a replaced version can no
+longer be read; they are dropped after the write commits, or expire after
+ORDERS_TABLES_TIMEOUT seconds.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, Sum
+
+from . import conditional
+from .models import Order
+from .revenue import round_money
+
+
+DEFAULT_TIMEOUT = 5
+
+# Statuses of orders on an open bill, in the order they are shown.
+OPEN_STATUSES = [status for status, _ in Order.STATUS_CHOICES if status != 'paid']
+
+
+def cache_key(alias, version):
+    return f'orders:tables:v2:{alias}:{version}'
+
+
+def compute_open_bills(queryset):
+    """
+    One row per table with open orders, by table number: `table_number`,
+    `orders_count` and `total` of the open orders, and `statuses`, the count
+    and total per open status.
+    """
+    rows = (
+        queryset.filter(status__in=OPEN_STATUSES)
+        .values('table_number', 'status')
+        .annotate(orders_count=Count('id'), total=Sum('total_price'))
+        .order_by()
+    )
+    tables = {}
+    for row in rows:
+        row['total'] = round_money(row['total'])
+        table = tables.get(row['table_number'])
+        if table is None:
+            table = tables[row['table_number']] = {
+                'table_number': row['table_number'], 'orders_count': 0, 'total': Decimal('0.00'),
+                'statuses': {status: {'orders_count': 0, 'total': Decimal('0.00')} for status in OPEN_STATUSES},
+            }
+        table['orders_count'] += row['orders_count']
+        table['total'] += row['total']
+        table['statuses'][row['status']] = {'orders_count': row['orders_count'], 'total': row['total']}
+    return [tables[number] for number in sorted(tables)]
+
+
+def open_bills(version=None):
+    """
+    The rows of `compute_open_bills` for all orders, from the cache when
+    they were computed at `version`: the ChangeVersion of the orders, read
+    from the same database before the call (e.g. for the ETag), or here.
+    """
+    queryset = Order.objects.all()
+    if version is None:
+        version, _ = conditional.current()
+    key = cache_key(queryset.db, version)
+    bills = cache.get(key)
+    if bills is None:
+        bills = compute_open_bills(queryset)
+        cache.set(key, bills, getattr(settings, 'ORDERS_TABLES_TIMEOUT', DEFAULT_TIMEOUT))
+    return bills
+
+
+def drop_replaced():
+    """Drops the bills cached under the version before the current one, which can no longer be read."""
+    version, _ = conditional.current()
+    aliases = {DEFAULT_DB_ALIAS, *getattr(settings, 'ORDERS_READ_REPLICAS', [])}
+    cache.delete_many([cache_key(alias, version - 1) for alias in aliases])
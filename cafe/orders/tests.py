@@ -1,11 +1,52 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, RequestFactory, modify_settings, override_settings
+from django.core.handlers.wsgi import WSGIHandler
 from unittest.mock import patch
-from django.urls import reverse
-from .models import Order
+from django.urls import resolve, reverse
+from django.utils.http import urlencode
+from django.utils import timezone
+from django.utils.formats import date_format
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.apps import apps
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, router, transaction
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from asgiref.sync import sync_to_async
+from .models import (
+    DailyRevenue, DishSales, HourlySales, MenuItem, Order, OrderArchive, OrderHistory, OrderImport, OrderItem,
+    TransitionConflict,
+)
 from .forms import OrderUpdateForm, OrderFilterForm
-from . import views
+from .serializers import OrderSerializer
+from . import (
+    archive, async_views, benchmarks, bulk, conditional, events, export, fragments, reports, revenue, schema, tables,
+    views, writer,
+)
+from .benchmarks import percentile, reload_urlconf
+from .conditional import current
+from .metrics import Histogram, format_labels, registry
+from .middleware import ReplicaMiddleware
+from .profiling import area_of, saved_profiles
+from .replicas import ReplicaRouter, choose_replica, replica_reads
+from .writer import Writer
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal, InvalidOperation
+from io import StringIO
+from types import SimpleNamespace
+import contextlib
+import csv
+import importlib
 import json
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
 
 class OrderViewsTest(TestCase):
     def setUp(self):
@@ -279,4 +320,2028 @@ class OrderModelTest(TestCase):
         expected_total_price = Decimal('7.50') + Decimal('5.00')
         order.total_price = expected_total_price  # Set the total_price before saving.
         order.save()  # Now save should work.
-        self.assertEqual(order.total_price, expected_total_price)
\ No newline at end of file
+        self.assertEqual(order.total_price, expected_total_price)
+
+@override_settings(ORDERS_PAGE_SIZE=2)
+class OrderListPaginationTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.list_url = reverse('orders_list')
+        prices = ['5.00', '3.00', '5.00', '1.00', '4.00']
+        self.orders = [
+            Order.objects.create(
+                table_number=i + 1,
+                items=[{'name': f'Dish {i}', 'price': price}],
+                total_price=Decimal(price),
+            )
+            for i, price in enumerate(prices)
+        ]
+
+    def walk(self, params):
+        pages = []
+        response = self.client.get(self.list_url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append([order.pk for order in response.context['orders']])
+            next_query = response.context['next_query']
+            if not next_query:
+                return pages, response
+            response = self.client.get(f'{self.list_url}?{next_query}')
+
+    def test_pages_by_id(self):
+        pages, _ = self.walk({})
+        ids = [order.pk for order in self.orders]
+        self.assertEqual(pages, [ids[0:2], ids[2:4], ids[4:]])
+
+    def test_pages_by_total_price_with_ties(self):
+        pages, _ = self.walk({'ordering': 'total_price'})
+        expected = [o.pk for o in sorted(self.orders, key=lambda o: (o.total_price, o.pk))]
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+
+    def test_pages_by_created_at(self):
+        pages, _ = self.walk({'ordering': 'created_at'})
+        expected = [o.pk for o in sorted(self.orders, key=lambda o: (o.created_at, o.pk))]
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_previous_page(self):
+        pages, response = self.walk({'ordering': 'total_price', 'status': 'pending'})
+        self.assertIsNone(response.context['next_query'])
+        response = self.client.get(f"{self.list_url}?{response.context['previous_query']}")
+        self.assertEqual([order.pk for order in response.context['orders']], pages[1])
+        self.assertIn('status=pending', response.context['next_query'])
+        response = self.client.get(f"{self.list_url}?{response.context['previous_query']}")
+        self.assertEqual([order.pk for order in response.context['orders']], pages[0])
+        self.assertIsNone(response.context['previous_query'])
+
+    def test_first_page_has_no_previous(self):
+        response = self.client.get(self.list_url)
+        self.assertIsNone(response.context['previous_query'])
+        self.assertContains(response, 'Вперёд')
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.list_url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ORDERS_PAGE_SIZE=2)
+class OrderAPIPaginationTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.list_url = reverse('order-list')
+        prices = ['5.00', '3.00', '5.00', '1.00', '4.00']
+        self.orders = [
+            Order.objects.create(
+                table_number=i + 1,
+                items=[{'name': f'Dish {i}', 'price': price}],
+                total_price=Decimal(price),
+                status='paid' if i % 2 else 'pending',
+            )
+            for i, price in enumerate(prices)
+        ]
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            ids.extend(order['id'] for order in data['results'])
+            url = data['next']
+        return ids
+
+    def test_cursor_pagination_default_ordering(self):
+        response = self.client.get(self.list_url)
+        data = response.json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNone(data['previous'])
+        self.assertIsNotNone(data['next'])
+        expected = sorted((o.pk for o in self.orders), reverse=True)
+        self.assertEqual(self.walk(self.list_url), expected)
+
+    def test_cursor_pagination_by_total_price_with_ties(self):
+        expected = [o.pk for o in sorted(self.orders, key=lambda o: (o.total_price, o.pk))]
+        self.assertEqual(self.walk(f'{self.list_url}?ordering=total_price'), expected)
+        expected = [o.pk for o in sorted(self.orders, key=lambda o: (-o.total_price, -o.pk))]
+        self.assertEqual(self.walk(f'{self.list_url}?ordering=-total_price'), expected)
+
+    def test_page_size_param(self):
+        response = self.client.get(self.list_url, {'page_size': 4})
+        self.assertEqual(len(response.json()['results']), 4)
+
+    def test_sparse_fieldset(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.list_url, {'fields': 'id,status'})
+        self.assertEqual(response.status_code, 200)
+        for order in response.json()['results']:
+            self.assertEqual(set(order), {'id', 'status'})
+        # The orders change version (for the ETag), then the page.
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('"items"', queries[1]['sql'])
+
+    def test_sparse_fieldset_with_ordering(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.list_url, {'fields': 'status', 'ordering': 'created_at'})
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(set(response.json()['results'][0]), {'status'})
+
+    def test_sparse_fieldset_retrieve(self):
+        url = reverse('order-detail', args=[self.orders[0].pk])
+        response = self.client.get(url, {'fields': 'total_price'})
+        self.assertEqual(response.json(), {'total_price': '5.00'})
+
+    def test_sparse_fieldset_unknown_field(self):
+        response = self.client.get(self.list_url, {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+
+
+class OrderItemTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.order = Order.objects.create(
+            table_number=1,
+            items=[{'name': 'Burger', 'price': '10.99'}, {'name': 'Coke', 'price': '2.50'}],
+            total_price=Decimal('13.49'),
+        )
+
+    def test_lines_created_with_order(self):
+        lines = list(self.order.lines.select_related('menu_item'))
+        self.assertEqual([(line.menu_item.name, line.price, line.position) for line in lines],
+                         [('Burger', Decimal('10.99'), 0), ('Coke', Decimal('2.50'), 1)])
+        self.assertEqual(MenuItem.objects.count(), 2)
+
+    def test_lines_rebuilt_when_items_change(self):
+        self.order.items = [{'name': 'Pizza', 'price': '12.00'}, {'name': 'Coke', 'price': '3.00'}]
+        self.order.save()
+        self.assertEqual([line.menu_item.name for line in self.order.lines.all()], ['Pizza', 'Coke'])
+        self.assertEqual(MenuItem.objects.get(name='Coke').price, Decimal('3.00'))
+
+    def test_lines_untouched_when_items_not_saved(self):
+        line_ids = list(self.order.lines.values_list('id', flat=True))
+        self.order.status = 'ready'
+        self.order.save(update_fields=['status'])
+        self.assertEqual(list(self.order.lines.values_list('id', flat=True)), line_ids)
+
+    def test_malformed_items_are_skipped(self):
+        order = Order.objects.create(
+            table_number=2,
+            items=[{'name': 'Tea', 'price': 'free'}, 'junk', {'price': '1.00'}, {'name': 'Tea', 'price': '1.50'}],
+            total_price=Decimal('1.50'),
+        )
+        self.assertEqual([line.price for line in order.lines.all()], [Decimal('1.50')])
+
+    def test_lines_deleted_with_order(self):
+        self.order.delete()
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_search_does_not_match_json_keys(self):
+        response = self.client.get(reverse('orders_list'), {'search': 'price'})
+        self.assertEqual(len(response.context['orders']), 0)
+        response = self.client.get(reverse('orders_list'), {'search': 'cok'})
+        self.assertEqual(len(response.context['orders']), 1)
+
+    def test_api_search_and_items_shape(self):
+        Order.objects.create(table_number=2, items=[{'name': 'Pizza', 'price': '12.00'}], total_price=Decimal('12.00'))
+        response = self.client.get(reverse('order-list'), {'search': 'burg'})
+        results = response.json()['results']
+        self.assertEqual([order['id'] for order in results], [self.order.pk])
+        self.assertEqual(results[0]['items'], self.order.items)
+
+    def test_data_migration(self):
+        migration = importlib.import_module('orders.migrations.0003_populate_order_items')
+        OrderItem.objects.all().delete()
+        MenuItem.objects.all().delete()
+        migration.populate_order_items(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(
+            list(self.order.lines.values_list('menu_item__name', 'price')),
+            [('Burger', Decimal('10.99')), ('Coke', Decimal('2.50'))],
+        )
+
+
+class RevenueLedgerTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.order = Order.objects.create(
+            table_number=1, items=[{'name': 'Burger', 'price': '10.99'}], total_price=Decimal('10.99'),
+        )
+
+    def ledger(self):
+        return [(row.total, row.orders_count) for row in DailyRevenue.objects.all()]
+
+    def test_pending_order_not_counted(self):
+        self.assertEqual(revenue.total_revenue(), 0)
+
+    def test_update_view_moves_order_into_and_out_of_paid(self):
+        url = reverse('order_edit', args=[self.order.pk])
+        data = {'table_number': 1, 'items': json.dumps(self.order.items), 'status': 'paid'}
+        self.client.post(url, data)
+        self.assertEqual(self.ledger(), [(Decimal('10.99'), 1)])
+        data['status'] = 'ready'
+        self.client.post(url, data)
+        self.assertEqual(self.ledger(), [(Decimal('0.00'), 0)])
+
+    def test_delete_paid_order(self):
+        self.order.status = 'paid'
+        self.order.save()
+        self.client.post(reverse('order_delete', args=[self.order.pk]))
+        self.assertEqual(revenue.total_revenue(), 0)
+
+    def test_api_write_paths(self):
+        response = self.client.post(reverse('order-list'), {
+            'table_number': 2, 'items': [{'name': 'Pizza', 'price': '12.00'}],
+            'total_price': '12.00', 'status': 'paid',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        url = reverse('order-detail', args=[self.order.pk])
+        self.client.patch(url, {'status': 'paid'}, content_type='application/json')
+        self.assertEqual(revenue.total_revenue(), Decimal('22.99'))
+        self.client.patch(url, {'total_price': '11.99'}, content_type='application/json')
+        self.assertEqual(revenue.total_revenue(), Decimal('23.99'))
+        self.client.delete(url)
+        self.assertEqual(revenue.total_revenue(), Decimal('12.00'))
+
+    def test_queryset_delete(self):
+        Order.objects.filter(pk=self.order.pk).update(status='paid')
+        revenue.rebuild_ledger()
+        Order.objects.all().delete()
+        self.assertEqual(revenue.total_revenue(), 0)
+
+    def test_list_view_reads_ledger(self):
+        self.order.status = 'paid'
+        self.order.save()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('orders_list'))
+        self.assertEqual(response.context['revenue'], Decimal('10.99'))
+        self.assertFalse(any('SUM("orders_order"' in query['sql'] for query in queries))
+
+    def test_rebuild_command(self):
+        Order.objects.filter(pk=self.order.pk).update(status='paid')  # bypasses the ledger
+        with self.assertRaises(CommandError):
+            call_command('rebuild_revenue', '--check', stdout=StringIO())
+        out = StringIO()
+        call_command('rebuild_revenue', stdout=out)
+        self.assertIn('1 day(s) were out of date', out.getvalue())
+        self.assertEqual(self.ledger(), [(Decimal('10.99'), 1)])
+        call_command('rebuild_revenue', '--check', stdout=StringIO())
+
+
+class QueryPlanTest(TestCase):
+    """
+    Runs EXPLAIN QUERY PLAN on the queries issued by the list views for every
+    filter/ordering combination and fails if one of them scans the orders or
+    order lines table.
+
+    A bare scan is only tolerated for an unfiltered walk in primary key order,
+    which the LIMIT of the page stops early.
+    """
+    SCANNED_TABLES = ('orders_order', 'orders_orderitem')
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(30):
+            Order.objects.create(
+                table_number=i % 5,
+                items=[{'name': f'Dish {i % 7}', 'price': '2.00'}],
+                total_price=Decimal(i),
+                status=('pending', 'ready', 'paid')[i % 3],
+            )
+
+    def setUp(self):
+        self.client = Client()
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_no_full_scan(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        for query in queries:
+            sql = query['sql']
+            if not any(f'"{table}"' in sql for table in self.SCANNED_TABLES):
+                continue
+            plan = self.plan(sql)
+            sorts = any('TEMP B-TREE' in step for step in plan)
+            for step in plan:
+                for table in self.SCANNED_TABLES:
+                    if step in (f'SCAN {table}', f'SCAN {table} AS U0'):
+                        allowed = table == 'orders_order' and ' WHERE ' not in sql and not sorts
+                        self.assertTrue(allowed, f'Full scan for {params}:\n{sql}\n{plan}')
+        return response
+
+    def combinations(self, orderings):
+        for status in ('', 'pending'):
+            for table_number in ('', '3'):
+                for ordering in orderings:
+                    params = {'status': status, 'table_number': table_number, 'ordering': ordering}
+                    yield {key: value for key, value in params.items() if value}
+
+    @override_settings(ORDERS_PAGE_SIZE=2)
+    def test_order_list_plans(self):
+        url = reverse('orders_list')
+        for params in self.combinations(['', 'total_price', 'created_at']):
+            response = self.assert_no_full_scan(url, params)
+            next_query = response.context['next_query']
+            if next_query:
+                self.assert_no_full_scan(f'{url}?{next_query}', {})
+        self.assert_no_full_scan(url, {'search': 'Dish 3'})
+
+    @override_settings(ORDERS_PAGE_SIZE=2)
+    def test_api_list_plans(self):
+        url = reverse('order-list')
+        orderings = ['', 'total_price', '-total_price', 'created_at', '-created_at']
+        for params in self.combinations(orderings):
+            response = self.assert_no_full_scan(url, params)
+            next_url = response.json()['next']
+            if next_url:
+                self.assert_no_full_scan(next_url, {})
+
+
+class DishSearchTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.burger = Order.objects.create(
+            table_number=1, items=[{'name': 'Бургер', 'price': '10.99'}, {'name': 'Кола', 'price': '2.50'}],
+            total_price=Decimal('13.49'),
+        )
+        self.double = Order.objects.create(
+            table_number=2, items=[{'name': 'Бургер', 'price': '10.99'}, {'name': 'Бургер', 'price': '10.99'}],
+            total_price=Decimal('21.98'),
+        )
+        self.pizza = Order.objects.create(
+            table_number=3, items=[{'name': 'Pizza Margherita', 'price': '12.00'}],
+            total_price=Decimal('12.00'),
+        )
+
+    def search(self, term, **kwargs):
+        return list(Order.objects.search(term, **kwargs).values_list('id', flat=True))
+
+    def test_prefix_and_case_insensitive(self):
+        self.assertCountEqual(self.search('бург'), [self.burger.pk, self.double.pk])
+        self.assertEqual(self.search('MARG'), [self.pizza.pk])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search('pizza marg'), [self.pizza.pk])
+        self.assertEqual(self.search('pizza кола'), [])
+
+    def test_no_words(self):
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_json_keys_are_not_indexed(self):
+        self.assertEqual(self.search('price'), [])
+        self.assertEqual(self.search('name'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.pizza.items = [{'name': 'Salad', 'price': '5.00'}]
+        self.pizza.save()
+        self.assertEqual(self.search('pizza'), [])
+        self.assertEqual(self.search('sal'), [self.pizza.pk])
+        self.pizza.delete()
+        self.assertEqual(self.search('sal'), [])
+
+    def test_ranking(self):
+        ranked = Order.objects.search('бургер', ranked=True).order_by('search_rank')
+        self.assertEqual([order.pk for order in ranked], [self.double.pk, self.burger.pk])
+
+    def test_list_view_ranks_without_ordering(self):
+        response = self.client.get(reverse('orders_list'), {'search': 'бург'})
+        self.assertEqual([order.pk for order in response.context['orders']], [self.double.pk, self.burger.pk])
+        response = self.client.get(reverse('orders_list'), {'search': 'бург', 'ordering': 'total_price'})
+        self.assertEqual([order.pk for order in response.context['orders']], [self.burger.pk, self.double.pk])
+
+    @override_settings(ORDERS_PAGE_SIZE=1)
+    def test_api_search_pages_by_rank(self):
+        url = f"{reverse('order-list')}?{urlencode({'search': 'бург'})}"
+        ids = []
+        while url:
+            data = self.client.get(url).json()
+            ids.extend(order['id'] for order in data['results'])
+            url = data['next']
+        self.assertEqual(ids, [self.double.pk, self.burger.pk])
+
+    def test_api_search_with_ordering(self):
+        response = self.client.get(reverse('order-list'), {'search': 'бург', 'ordering': '-total_price'})
+        self.assertEqual([order['id'] for order in response.json()['results']], [self.double.pk, self.burger.pk])
+
+    @patch('orders.search.is_available', return_value=False)
+    def test_fallback_without_index(self, is_available):
+        self.assertEqual(self.search('Pizza', ranked=True), [self.pizza.pk])
+        response = self.client.get(reverse('orders_list'), {'search': 'Pizza'})
+        self.assertEqual([order.pk for order in response.context['orders']], [self.pizza.pk])
+        response = self.client.get(reverse('order-list'), {'search': 'Pizza'})
+        self.assertEqual([order['id'] for order in response.json()['results']], [self.pizza.pk])
+
+
+class OrderEventsTest(TestCase):
+    def setUp(self):
+        self.enterContext(override_settings(ORDERS_LIVE_BOARD=True))
+        reload_urlconf()
+        self.addCleanup(reload_urlconf)
+        self.broker = events.EventBroker(history=3)
+        patcher = patch.object(events, 'broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.order = Order.objects.create(
+            table_number=1, items=[{'name': 'Burger', 'price': '10.99'}], total_price=Decimal('10.99'),
+        )
+
+    def test_events_since(self):
+        for i in range(5):
+            self.broker.publish('order_deleted', {'id': i})
+        self.assertEqual([event.seq for event in self.broker.events_since(3)], [4, 5])
+        self.assertEqual(self.broker.events_since(5), [])
+        self.assertIsNone(self.broker.events_since(1))  # seq 2 is no longer kept
+        self.assertIsNone(self.broker.events_since(6))
+
+    def test_writes_publish_events_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(
+                table_number=2, items=[{'name': 'Pizza', 'price': '12.00'}], total_price=Decimal('12.00'),
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'ready'
+            order.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+        history = list(self.broker.history)
+        self.assertEqual([event.kind for event in history], ['order_created', 'order_updated', 'order_deleted'])
+        self.assertEqual(history[1].data['previous_status'], 'pending')
+        self.assertEqual(history[1].data['status'], 'ready')
+
+    def test_no_events_before_commit(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            self.order.delete()
+        self.assertEqual(len(self.broker.history), 0)
+
+    def test_board_page(self):
+        response = self.client.get(reverse('order_board'))
+        self.assertContains(response, reverse('order_events'))
+        self.assertContains(self.client.get(reverse('orders_list')), reverse('order_board'))
+
+    def test_board_is_off_by_default(self):
+        with override_settings(ORDERS_LIVE_BOARD=False):
+            reload_urlconf()
+            self.assertEqual(self.client.get('/board/').status_code, 404)
+            self.assertEqual(self.client.get('/events/').status_code, 404)
+            self.assertNotContains(self.client.get(reverse('orders_list')), '/board/')
+
+    def test_stream_needs_asgi(self):
+        result = {}
+
+        def start_response(status, headers):
+            result['status'] = status
+
+        def request():
+            environ = RequestFactory().get(reverse('order_events')).environ
+            result['body'] = b''.join(WSGIHandler()(environ, start_response))
+
+        # Under WSGI a stream would be read to its end before it is sent: it must not block.
+        thread = threading.Thread(target=request, daemon=True)
+        thread.start()
+        thread.join(timeout=10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(result['status'], '501 Not Implemented')
+        self.assertEqual(self.broker.subscribers, set())
+
+    async def read(self, stream):
+        return (await anext(stream)).decode()
+
+    async def test_stream_snapshot_then_deltas(self):
+        response = await self.async_client.get(reverse('order_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            snapshot = await self.read(stream)
+            self.assertIn('event: snapshot', snapshot)
+            self.assertIn('"Burger"', snapshot)
+            self.broker.publish('order_deleted', {'id': self.order.pk})
+            delta = await self.read(stream)
+            self.assertEqual(delta, f'id: 1\nevent: order_deleted\ndata: {{"id": {self.order.pk}}}\n\n')
+        finally:
+            await stream.aclose()
+
+    async def test_stream_unsubscribes_when_closed(self):
+        stream = views._event_stream(None)
+        await anext(stream)
+        self.assertEqual(len(self.broker.subscribers), 1)
+        await stream.aclose()
+        self.assertEqual(self.broker.subscribers, set())
+
+    async def test_stream_resumes_from_last_event_id(self):
+        self.broker.publish('order_deleted', {'id': 1})
+        self.broker.publish('order_deleted', {'id': 2})
+        response = await self.async_client.get(reverse('order_events'), headers={'Last-Event-ID': '1'})
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertTrue((await self.read(stream)).startswith('id: 2\nevent: order_deleted'))
+        finally:
+            await stream.aclose()
+
+    @override_settings(ORDERS_EVENTS_KEEPALIVE=0.01)
+    async def test_stream_keepalive(self):
+        response = await self.async_client.get(reverse('order_events'), headers={'Last-Event-ID': '0'})
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertEqual(await self.read(stream), ': keepalive\n\n')
+        finally:
+            await stream.aclose()
+
+
+class OrderBulkAPITest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.bulk_url = reverse('order-bulk')
+        self.status_url = reverse('order-bulk-status')
+
+    def order_data(self, table_number, status='pending'):
+        return {
+            'table_number': table_number, 'items': [{'name': 'Tea', 'price': '2.00'}],
+            'total_price': '2.00', 'status': status,
+        }
+
+    def test_bulk_create(self):
+        payload = [self.order_data(i, 'paid') for i in range(1, 51)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.bulk_url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        results = response.json()['results']
+        self.assertEqual([result['result'] for result in results], ['created'] * 50)
+        self.assertEqual(Order.objects.count(), 50)
+        self.assertEqual(results[0]['order']['id'], Order.objects.get(table_number=1).pk)
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "orders_order"')]
+        self.assertEqual(len(inserts), 1)
+        # Derived data follows the bulk insert.
+        self.assertEqual(OrderItem.objects.count(), 50)
+        self.assertEqual(revenue.total_revenue(), Decimal('100.00'))
+        self.assertEqual(Order.objects.search('tea').count(), 50)
+
+    def test_bulk_create_partial(self):
+        payload = [self.order_data(1), {'table_number': 'x'}, self.order_data(3)]
+        response = self.client.post(self.bulk_url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 207)
+        results = response.json()['results']
+        self.assertEqual([result['result'] for result in results], ['created', 'invalid', 'created'])
+        self.assertIn('table_number', results[1]['errors'])
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_bulk_create_rejects_non_list(self):
+        response = self.client.post(self.bulk_url, self.order_data(1), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(ORDERS_BULK_MAX_ITEMS=2)
+    def test_bulk_create_limit(self):
+        payload = [self.order_data(i) for i in range(3)]
+        response = self.client.post(self.bulk_url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_bulk_status(self):
+        orders = bulk.create_orders([Order(**self.order_data(i)) for i in range(1, 5)])
+        orders[3].status = 'ready'
+        orders[3].save()
+        payload = [
+            {'id': orders[0].pk, 'status': 'paid'},
+            {'id': orders[1].pk, 'status': 'paid'},
+            {'id': orders[2].pk, 'status': 'ready'},
+            {'id': orders[3].pk, 'status': 'ready'},
+            {'id': 9999, 'status': 'paid'},
+            {'id': orders[0].pk, 'status': 'eaten'},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.status_url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(
+            [result['result'] for result in response.json()['results']],
+            ['updated', 'updated', 'updated', 'unchanged', 'not_found', 'invalid'],
+        )
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "orders_order"')]
+        self.assertEqual(len(updates), 2)  # one per target status
+        self.assertEqual(
+            list(Order.objects.order_by('id').values_list('status', flat=True)),
+            ['paid', 'paid', 'ready', 'ready'],
+        )
+        self.assertEqual(revenue.total_revenue(), Decimal('4.00'))
+
+    def test_bulk_status_repeated_id(self):
+        order, other = bulk.create_orders([Order(**self.order_data(i)) for i in range(1, 3)])
+        payload = [
+            {'id': order.pk, 'status': 'paid'},
+            {'id': other.pk, 'status': 'ready'},
+            {'id': order.pk, 'status': 'ready'},
+        ]
+        response = self.client.patch(self.status_url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 207)
+        results = response.json()['results']
+        self.assertEqual([result['result'] for result in results], ['invalid', 'updated', 'invalid'])
+        self.assertIn('id', results[0]['errors'])
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'pending')
+
+    def test_bulk_status_all_ok(self):
+        order = Order.objects.create(**self.order_data(1))
+        response = self.client.patch(self.status_url, [{'id': order.pk, 'status': 'ready'}],
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+
+class OrderExportTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.url = reverse('order-export')
+        self.burger = Order.objects.create(
+            table_number=1, items=[{'name': 'Burger', 'price': '10.99'}, {'name': 'Coke, large', 'price': '2.50'}],
+            total_price=Decimal('13.49'), status='paid',
+        )
+        self.pizza = Order.objects.create(
+            table_number=2, items=[{'name': 'Pizza', 'price': '12.00'}], total_price=Decimal('12.00'),
+        )
+
+    def content(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_per_order(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(self.content(response).splitlines()))
+        self.assertEqual([int(row['id']) for row in rows], [self.pizza.pk, self.burger.pk])
+        self.assertEqual(json.loads(rows[1]['items']), self.burger.items)
+        self.assertEqual(rows[1]['total_price'], '13.49')
+
+    def test_csv_per_item(self):
+        response = self.client.get(self.url, {'rows': 'item', 'status': 'paid'})
+        rows = list(csv.DictReader(self.content(response).splitlines()))
+        self.assertEqual([(row['name'], row['price']) for row in rows],
+                         [('Burger', '10.99'), ('Coke, large', '2.50')])
+
+    def test_ndjson(self):
+        response = self.client.get(self.url, {'format': 'ndjson', 'table_number': 2})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lines = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual(lines, [self.client.get(reverse('order-detail', args=[self.pizza.pk])).json()])
+
+    def test_ndjson_by_accept_header(self):
+        response = self.client.get(self.url, {'rows': 'item'}, HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(len(self.content(response).splitlines()), 3)
+
+    def test_date_range(self):
+        Order.objects.filter(pk=self.burger.pk).update(created_at='2020-01-01T12:00:00Z')
+        response = self.client.get(self.url, {'format': 'ndjson', 'created_before': '2021-01-01T00:00:00Z'})
+        lines = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual([line['id'] for line in lines], [self.burger.pk])
+        response = self.client.get(reverse('order-list'), {'created_after': '2021-01-01T00:00:00Z'})
+        self.assertEqual([order['id'] for order in response.json()['results']], [self.pizza.pk])
+
+    def test_invalid_rows(self):
+        response = self.client.get(self.url, {'rows': 'dish'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_chunked_output(self):
+        with patch.object(export, 'CHUNK_SIZE', 1):
+            chunks = list(self.client.get(self.url, {'format': 'ndjson'}).streaming_content)
+        self.assertEqual(len(chunks), 2)
+
+
+class BenchmarkCommandsTest(TestCase):
+    def test_seed_orders(self):
+        call_command('seed_orders', '120', '--batch-size', '50', '--seed', '1', '--days', '3', stdout=StringIO())
+        self.assertEqual(Order.objects.count(), 120)
+        self.assertEqual(OrderItem.objects.count(), sum(len(items) for items in Order.objects.values_list('items', flat=True)))
+        self.assertEqual(revenue.compare_ledger(), [])
+        oldest = Order.objects.order_by('created_at').first().created_at
+        self.assertGreater(timezone.now() - oldest, timedelta(hours=1))
+
+    def test_bench_orders_writes_json(self):
+        benchmarks.seed_orders(60, seed=1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.json')
+            out = StringIO()
+            call_command('bench_orders', '--requests', '3', '--output', path, stdout=out)
+            with open(path) as f:
+                report = json.load(f)
+            call_command('bench_orders', '--requests', '2', '--only', 'parse_items', '--compare', path, stdout=out)
+        self.assertEqual(report['meta']['orders'], 60)
+        self.assertLessEqual({
+            'order_list', 'order_create', 'order_update', 'order_delete', 'order_tables',
+            'api:order-list', 'api:order-detail', 'api:order-create', 'api:order-update', 'api:order-partial-update',
+            'api:order-destroy', 'api:order-bulk', 'api:order-bulk-status', 'api:order-transition',
+            'api:order-export', 'api:report-sales', 'api:report-dishes', 'api:table-list',
+        }, set(report['results']))
+        result = report['results']['order_create']
+        self.assertEqual(result['requests'], 3)
+        self.assertEqual(set(result['latency_ms']), {'mean', 'p50', 'p90', 'p95', 'p99', 'max'})
+        self.assertGreater(result['queries_per_request'], 0)
+        self.assertEqual(Order.objects.count(), 60)  # write scenarios are rolled back
+        self.assertIn('parse_items', out.getvalue())
+
+    def test_bench_concurrency(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'concurrency.json')
+            out = StringIO()
+            call_command(
+                'bench_concurrency', '--clients', '1', '3', '--requests', '6', '--path', '/api/orders/',
+                '--output', path, stdout=out,
+            )
+            with open(path) as f:
+                report = json.load(f)
+        self.assertEqual(
+            [(result['mode'], result['clients']) for result in report['results']],
+            [(mode, clients) for mode in ('wsgi', 'asgi', 'asgi+async-views') for clients in (1, 3)],
+        )
+        self.assertEqual({result['requests'] for result in report['results']}, {6})
+        self.assertIn('asgi+async-views', out.getvalue())
+        # The URLconf is back to the sync views.
+        self.assertIs(resolve(reverse('orders_list')).func, views.order_list)
+
+    def test_percentile(self):
+        self.assertEqual(percentile([1, 2, 3, 4], 0.5), 2.5)
+        self.assertEqual(percentile([5], 0.99), 5)
+
+
+@override_settings(ORDERS_SLOW_REQUEST_MS=None)
+class RequestMetricsTest(TestCase):
+    def setUp(self):
+        self.registry = registry
+        registry.reset()
+        Order.objects.create(table_number=1, items=[{'name': 'Burger', 'price': '10.99'}], total_price=Decimal('10.99'))
+
+    def test_records_requests_by_url_name(self):
+        self.client.get(reverse('orders_list'))
+        self.client.get(reverse('orders_list'))
+        self.client.get(reverse('order-list'))
+        labels = (('view', 'orders_list'), ('method', 'GET'))
+        self.assertEqual(self.registry.requests.series[(*labels, ('status', '200'))], 2)
+        self.assertEqual(self.registry.duration.series[labels].count, 2)
+        self.assertGreater(self.registry.db_queries.series[labels].sum, 0)
+        self.assertGreater(self.registry.db_duration.series[labels].sum, 0)
+        self.assertGreater(self.registry.response_size.series[labels].sum, 0)
+        self.assertEqual(self.registry.duration.series[(('view', 'order-list'), ('method', 'GET'))].count, 1)
+
+    def test_unmatched_and_error_statuses(self):
+        self.client.get('/no-such-page/')
+        self.client.get(reverse('order_edit', args=[999999]))
+        self.assertEqual(self.registry.requests.series[(('view', '<unmatched>'), ('method', 'GET'), ('status', '404'))], 1)
+        self.assertEqual(self.registry.requests.series[(('view', 'order_edit'), ('method', 'GET'), ('status', '404'))], 1)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('orders_list'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE orders_http_request_duration_seconds histogram', body)
+        self.assertIn('orders_http_requests_total{view="orders_list",method="GET",status="200"} 1', body)
+        self.assertIn('orders_http_request_duration_seconds_bucket{view="orders_list",method="GET",le="+Inf"} 1', body)
+        self.assertIn('orders_http_request_duration_seconds_count{view="orders_list",method="GET"} 1', body)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram((1, 5, 10))
+        for value in (0, 1, 3, 7, 50):
+            histogram.observe(value)
+        self.assertEqual(list(histogram.cumulative()), [(1, 2), (5, 3), (10, 4), ('+Inf', 5)])
+        self.assertEqual(histogram.sum, 61)
+
+    def test_label_values_are_escaped(self):
+        self.assertEqual(format_labels([('view', 'a"b\\c\nd')]), '{view="a\\"b\\\\c\\nd"}')
+
+    def test_slow_request_log_includes_sql(self):
+        with override_settings(ORDERS_SLOW_REQUEST_MS=0):
+            with self.assertLogs('orders.slow_requests', 'WARNING') as logs:
+                self.client.get(reverse('orders_list'))
+        self.assertIn('Slow request: GET / (orders_list) returned 200', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+        self.assertIn('"orders_order"', logs.output[0])
+
+    def test_fast_requests_are_not_logged(self):
+        with override_settings(ORDERS_SLOW_REQUEST_MS=60000):
+            with self.assertNoLogs('orders.slow_requests'):
+                self.client.get(reverse('orders_list'))
+
+
+class ProfilerTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.staff = User.objects.create_user('staff', is_staff=True)
+        self.waiter = User.objects.create_user('waiter')
+        Order.objects.create(table_number=1, items=[{'name': 'Burger', 'price': '10.99'}], total_price=Decimal('10.99'))
+
+    def profiled_get(self, user, **kwargs):
+        self.client.force_login(user)
+        with override_settings(ORDERS_PROFILING=True, ORDERS_PROFILE_DIR=self.directory.name, ORDERS_PROFILE_KEEP=2):
+            return self.client.get(reverse('orders_list'), **kwargs)
+
+    def saved(self):
+        return saved_profiles(self.directory.name)
+
+    def test_staff_request_is_profiled(self):
+        response = self.profiled_get(self.staff, HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([path.name for path in self.saved()], [response['X-Profile-Id']])
+        self.assertIn('-orders_list-', response['X-Profile-Id'])
+
+    def test_query_parameter(self):
+        self.client.force_login(self.staff)
+        with override_settings(ORDERS_PROFILING=True, ORDERS_PROFILE_DIR=self.directory.name):
+            response = self.client.get(reverse('orders_list'), {'profile': '1'})
+        self.assertIn('X-Profile-Id', response)
+
+    def test_not_profiled_without_staff_or_setting(self):
+        response = self.profiled_get(self.waiter, HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        response = self.profiled_get(self.staff)
+        self.assertNotIn('X-Profile-Id', response)
+        self.client.force_login(self.staff)
+        with override_settings(ORDERS_PROFILE_DIR=self.directory.name):
+            response = self.client.get(reverse('orders_list'), HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.saved(), [])
+
+    def test_old_profiles_are_rotated(self):
+        names = [self.profiled_get(self.staff, HTTP_X_PROFILE='1')['X-Profile-Id'] for _ in range(3)]
+        self.assertEqual([path.name for path in self.saved()], names[1:])
+
+    def test_profile_summary(self):
+        self.profiled_get(self.staff, HTTP_X_PROFILE='1')
+        out = StringIO()
+        call_command('profile_summary', '--dir', self.directory.name, '--view', 'orders_list', '--limit', '5', stdout=out)
+        output = out.getvalue()
+        self.assertIn('1 profile(s)', output)
+        self.assertIn('orm', output)
+        self.assertIn('templates', output)
+        self.assertIn('function calls', output)
+
+    def test_profile_summary_without_profiles(self):
+        with self.assertRaises(CommandError):
+            call_command('profile_summary', '--dir', self.directory.name)
+
+    def test_area_of(self):
+        self.assertEqual(area_of('/usr/lib/python3/json/decoder.py'), 'json')
+        self.assertEqual(area_of('/site-packages/django/db/models/fields/json.py'), 'json')
+        self.assertEqual(area_of('/site-packages/django/db/models/query.py'), 'orm')
+        self.assertEqual(area_of('/site-packages/django/template/base.py'), 'templates')
+        self.assertEqual(area_of('~'), 'other')
+
+
+class OrderFragmentCacheTest(TestCase):
+    def setUp(self):
+        self.fragments = fragments
+        fragments.get_cache().clear()
+        self.order = Order.objects.create(
+            table_number=3, items=[{'name': 'Бургер', 'price': '10.99'}], total_price=Decimal('10.99'), status='paid',
+        )
+        self.url = reverse('orders_list')
+
+    def test_rows_are_cached(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Бургер - 10.99₽')
+        self.assertEqual(list(response.context['orders']), [self.order])
+        with patch.object(self.fragments, 'render_row') as render_row:
+            response = self.client.get(self.url)
+        render_row.assert_not_called()
+        self.assertContains(response, 'Бургер - 10.99₽')
+
+    def test_cached_rows_match_rendered_rows(self):
+        def table_body():
+            content = self.client.get(self.url).content.decode()
+            return content[content.index('<tbody>'):content.index('</tbody>')]
+        first = table_body()
+        self.assertEqual(table_body(), first)
+
+    def test_save_invalidates_row(self):
+        self.client.get(self.url)
+        self.order.items = [{'name': 'Пицца', 'price': '12.00'}]
+        self.order.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Пицца - 12.00₽')
+        self.assertNotContains(response, 'Бургер')
+
+    def test_bulk_status_change_invalidates_row(self):
+        self.client.get(self.url)
+        bulk.set_statuses({self.order.id: 'pending'})
+        self.assertContains(self.client.get(self.url), 'bg-warning')
+
+    def test_delete_invalidates_row(self):
+        self.client.get(self.url)
+        self.assertIsNotNone(self.fragments.get_cache().get(self.fragments.fragment_key(self.order.id)))
+        self.order.delete()
+        self.assertIsNone(self.fragments.get_cache().get(self.fragments.fragment_key(self.order.id)))
+
+    def test_rows_are_cached_per_time_zone(self):
+        self.client.get(self.url)
+        with timezone.override('Asia/Tokyo'):
+            rows = self.fragments.render_rows([self.order])
+        local = timezone.localtime(self.order.created_at, timezone=timezone.get_fixed_timezone(540))
+        self.assertIn(date_format(local, 'DATETIME_FORMAT'), rows[0])
+        cached = self.fragments.get_cache().get(self.fragments.fragment_key(self.order.id))
+        self.assertEqual(len(cached['rows']), 2)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(
+            table_number=1, items=[{'name': 'Burger', 'price': '10.99'}], total_price=Decimal('10.99'),
+        )
+        self.api_url = reverse('order-list')
+        self.detail_url = reverse('order-detail', args=[self.order.pk])
+
+    def test_updated_at(self):
+        created = self.order.updated_at
+        self.order.status = 'ready'
+        self.order.save()
+        self.assertGreater(self.order.updated_at, created)
+        bulk.set_statuses({self.order.pk: 'paid'})
+        self.assertGreater(Order.objects.get(pk=self.order.pk).updated_at, self.order.updated_at)
+
+    def test_unchanged_list_is_not_modified(self):
+        self.client.get(reverse('orders_list'))  # sets the CSRF cookie, which is part of the page ETag
+        for url in (self.api_url, self.detail_url, reverse('orders_list')):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Last-Modified', response)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(len(queries), 1)
+            self.assertIn('orders_changeversion', queries[0]['sql'])
+
+    def test_if_modified_since(self):
+        response = self.client.get(self.api_url)
+        response = self.client.get(self.api_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_change_the_etag(self):
+        etag = self.client.get(self.api_url)['ETag']
+        bulk.set_statuses({self.order.pk: 'paid'})
+        response = self.client.get(self.api_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        etag = response['ETag']
+        self.order.delete()
+        response = self.client.get(self.api_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_etag_depends_on_format(self):
+        json_etag = self.client.get(self.api_url)['ETag']
+        response = self.client.get(self.api_url, HTTP_ACCEPT='text/html', HTTP_IF_NONE_MATCH=json_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], json_etag)
+
+    def test_missing_order_is_still_404(self):
+        response = self.client.get(reverse('order-detail', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        self.enterContext(benchmarks.async_views())
+        self.enterContext(override_settings(ORDERS_PAGE_SIZE=2))
+        self.serializer_class = OrderSerializer
+        self.orders = [
+            Order.objects.create(
+                table_number=table, items=[{'name': f'Блюдо {table}', 'price': f'{price}.00'}],
+                total_price=Decimal(price), status=status,
+            )
+            for table, price, status in [(1, 12, 'pending'), (2, 7, 'paid'), (3, 9, 'paid'), (4, 7, 'ready'), (5, 15, 'paid')]
+        ]
+
+    def expected(self, orders, fields=None):
+        return json.loads(json.dumps(self.serializer_class(orders, many=True, fields=fields).data))
+
+    def test_routes_to_async_views(self):
+        self.assertIs(resolve(reverse('orders_list')).func, async_views.order_list)
+        self.assertIs(resolve(reverse('order-list')).func, async_views.order_api_list)
+
+    async def test_order_list(self):
+        response = await self.async_client.get(reverse('orders_list'), {'ordering': 'total_price'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([order.pk for order in response.context['orders']], [self.orders[1].pk, self.orders[3].pk])
+        self.assertContains(response, 'Блюдо 2')
+        response = await self.async_client.get(f"{reverse('orders_list')}?{response.context['next_query']}")
+        self.assertEqual([order.pk for order in response.context['orders']], [self.orders[2].pk, self.orders[0].pk])
+        response = await self.async_client.get(reverse('orders_list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_order_list_not_modified(self):
+        await self.async_client.get(reverse('orders_list'))
+        response = await self.async_client.get(reverse('orders_list'))
+        response = await self.async_client.get(reverse('orders_list'), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_order_create(self):
+        response = await self.async_client.post(reverse('order_create'), {'table_number': 9, 'items': 'Суп 4.50, Чай 2.00'})
+        self.assertRedirects(response, reverse('orders_list'), fetch_redirect_response=False)
+        order = await Order.objects.alatest('id')
+        self.assertEqual(order.total_price, Decimal('6.50'))
+        self.assertEqual(await OrderItem.objects.filter(order=order).acount(), 2)
+        response = await self.async_client.post(reverse('order_create'), {'table_number': 9, 'items': ''})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_order_update_and_delete(self):
+        order = self.orders[0]
+        response = await self.async_client.get(reverse('order_edit', args=[order.pk]))
+        self.assertEqual(response.status_code, 200)
+        response = await self.async_client.post(reverse('order_edit', args=[order.pk]), {
+            'table_number': 8, 'items': json.dumps(order.items), 'status': 'paid',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual((await Order.objects.aget(pk=order.pk)).status, 'paid')
+        response = await self.async_client.post(reverse('order_delete', args=[order.pk]))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(await Order.objects.filter(pk=order.pk).aexists())
+        response = await self.async_client.get(reverse('order_edit', args=[order.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_api_list_matches_viewset(self):
+        url = reverse('order-list')
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['results'], self.expected(self.orders[::-1][:2]))
+        self.assertIsNone(body['previous'])
+
+        results = []
+        url = f'{url}?ordering=-total_price&fields=id,total_price'
+        while url:
+            body = (await self.async_client.get(url)).json()
+            results += body['results']
+            url = body['next']
+        by_price = sorted(self.orders, key=lambda order: (-order.total_price, -order.pk))
+        self.assertEqual(results, self.expected(by_price, fields=['id', 'total_price']))
+
+    async def test_api_list_filters_and_errors(self):
+        url = reverse('order-list')
+        body = (await self.async_client.get(url, {'status': 'paid', 'page_size': 10})).json()
+        self.assertEqual([order['id'] for order in body['results']], [self.orders[4].pk, self.orders[2].pk, self.orders[1].pk])
+        body = (await self.async_client.get(url, {'search': 'блюдо'})).json()
+        self.assertEqual(len(body['results']), 2)
+        self.assertEqual((await self.async_client.get(url, {'fields': 'nope'})).status_code, 400)
+        self.assertEqual((await self.async_client.get(url, {'status': 'nope'})).status_code, 400)
+        self.assertEqual((await self.async_client.get(url, {'cursor': 'garbage'})).status_code, 404)
+
+    async def test_api_detail(self):
+        order = self.orders[0]
+        response = await self.async_client.get(reverse('order-detail', args=[order.pk]))
+        self.assertEqual(response.json(), self.expected([order])[0])
+        response = await self.async_client.get(reverse('order-detail', args=[order.pk]), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        response = await self.async_client.get(reverse('order-detail', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+
+    async def test_api_writes_and_browsable_api_use_viewset(self):
+        response = await self.async_client.post(reverse('order-list'), {
+            'table_number': 3, 'items': [{'name': 'Чай', 'price': '2.00'}], 'total_price': '2.00', 'status': 'pending',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        response = await self.async_client.patch(
+            reverse('order-detail', args=[response.json()['id']]), {'status': 'ready'}, content_type='application/json',
+        )
+        self.assertEqual(response.json()['status'], 'ready')
+        response = await self.async_client.get(reverse('order-list'), headers={'Accept': 'text/html'})
+        self.assertContains(response, 'Django REST framework')
+
+
+
+@override_settings(ORDERS_WRITE_QUEUE=True)
+class WriteQueueTest(TransactionTestCase):
+    def setUp(self):
+        self.writer = writer
+        self.addCleanup(writer.stop)
+
+    def create(self, table):
+        return Order.objects.create(
+            table_number=table, items=[{'name': 'Чай', 'price': '2.00'}], total_price=Decimal('2.00'),
+        )
+
+    def hold_writer(self):
+        """Blocks the writer thread until the returned event is set, so that writes queue up."""
+        started, event = threading.Event(), threading.Event()
+
+        def hold():
+            started.set()
+            event.wait()
+
+        self.writer.get_writer().submit(hold)
+        started.wait()
+        return event
+
+    def test_sqlite_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_runs_on_writer_thread(self):
+        order = self.writer.run(self.create, 1)
+        self.assertEqual(Order.objects.get(pk=order.pk).table_number, 1)
+        self.assertEqual(self.writer.run(threading.current_thread).name, 'orders-writer')
+
+    def test_inline_inside_transaction(self):
+        with transaction.atomic():
+            self.assertIs(self.writer.run(threading.current_thread), threading.current_thread())
+
+    def test_concurrent_writes_are_batched(self):
+        writer = self.writer.get_writer()
+        release = self.hold_writer()
+
+        def create(table):
+            try:
+                return self.writer.run(self.create, table)
+            finally:
+                connections.close_all()
+
+        with patch.object(writer, 'run_batch', wraps=writer.run_batch) as run_batch:
+            with ThreadPoolExecutor(20) as pool:
+                futures = [pool.submit(create, table) for table in range(1, 21)]
+                while writer.queue.qsize() < 20:
+                    time.sleep(0.01)
+                release.set()
+                orders = [future.result() for future in futures]
+        self.assertEqual(sorted(order.table_number for order in orders), list(range(1, 21)))
+        self.assertEqual(Order.objects.count(), 20)
+        self.assertEqual(run_batch.call_count, 1)
+        self.assertEqual(len(run_batch.call_args.args[0]), 20)
+
+    def test_failing_write_does_not_affect_batch(self):
+        writer = self.writer.get_writer()
+        release = self.hold_writer()
+
+        def fail():
+            self.create(99)
+            raise ValueError("boom")
+
+        first = writer.submit(self.create, 1)
+        failing = writer.submit(fail)
+        second = writer.submit(self.create, 2)
+        release.set()
+        self.assertEqual(first.result().table_number, 1)
+        self.assertEqual(second.result().table_number, 2)
+        with self.assertRaisesMessage(ValueError, "boom"):
+            failing.result()
+        self.assertEqual(sorted(Order.objects.values_list('table_number', flat=True)), [1, 2])
+
+    def test_queued_creations_are_inserted_together(self):
+        writer = self.writer.get_writer()
+        release = self.hold_writer()
+        orders = [Order(table_number=table, items=[{'name': 'Чай', 'price': '2.00'}], total_price=Decimal('2.00')) for table in range(1, 6)]
+        with patch.object(bulk, 'create_orders', wraps=bulk.create_orders) as create_orders:
+            futures = [writer.submit(self.writer.insert, order) for order in orders]
+            release.set()
+            created = [future.result() for future in futures]
+        self.assertEqual([call.args[0] for call in create_orders.call_args_list], [orders])
+        self.assertEqual(created, orders)
+        self.assertEqual(len({order.pk for order in created}), 5)
+        self.assertEqual(sorted(Order.objects.values_list('pk', flat=True)), sorted(order.pk for order in created))
+        self.assertEqual(OrderItem.objects.count(), 5)
+
+    def test_failing_creation_does_not_affect_others(self):
+        writer = self.writer.get_writer()
+        release = self.hold_writer()
+        good = Order(table_number=1, items=[{'name': 'Чай', 'price': '2.00'}], total_price=Decimal('2.00'))
+        bad = Order(table_number='x', items=[{'name': 'Чай', 'price': '2.00'}], total_price=Decimal('2.00'))
+        futures = [writer.submit(self.writer.insert, order) for order in (good, bad)]
+        release.set()
+        self.assertEqual(futures[0].result().table_number, 1)
+        with self.assertRaises(ValueError):
+            futures[1].result()
+        self.assertEqual(list(Order.objects.values_list('pk', flat=True)), [good.pk])
+
+    def test_bounded_queue(self):
+        writer = Writer(queue_size=1)
+        self.addCleanup(writer.stop)
+        started, event = threading.Event(), threading.Event()
+        writer.submit(lambda: (started.set(), event.wait()))
+        started.wait()
+        writer.submit_nowait(int)
+        with self.assertRaises(queue.Full):
+            writer.submit_nowait(int)
+        event.set()
+
+    @override_settings(ORDERS_WRITE_TIMEOUT=0.05)
+    def test_timeout(self):
+        release = self.hold_writer()
+        self.addCleanup(release.set)
+        with self.assertRaises(writer.WriteTimeout):
+            self.writer.run(self.create, 1)
+        response = self.client.post(reverse('order-list'), {
+            'table_number': 2, 'items': [{'name': 'Чай', 'price': '2.00'}], 'total_price': '2.00',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        response = self.client.post(reverse('order_create'), {'table_number': 3, 'items': 'Суп 5.00'})
+        self.assertEqual(response.status_code, 503)
+        release.set()
+        self.assertEqual(self.writer.run(Order.objects.count), 0)  # the timed out writes were cancelled
+
+    def test_restarts_dead_thread(self):
+        dead = self.writer.get_writer()
+        with self.assertLogs('orders.writer', 'ERROR') as logs, patch.object(threading, 'excepthook'):
+            with patch.object(Writer, 'run_batch', side_effect=RuntimeError("writer is broken")):
+                with self.assertRaisesMessage(RuntimeError, "writer is broken"):
+                    self.writer.run(self.create, 1)
+                dead.thread.join()
+            order = self.writer.run(self.create, 2)
+        self.assertIsNot(self.writer.get_writer(), dead)
+        self.assertIn("starting a new one", logs.output[-1])
+        self.assertEqual(Order.objects.get().pk, order.pk)
+
+    def test_bench_ingest(self):
+        out = StringIO()
+        call_command('bench_ingest', '--clients', '1', '--requests', '4', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[1] for line in lines[2:]], ['direct', 'queue', 'coalesced'])
+        self.assertFalse(Order.objects.exists())
+
+    def test_views_write_through_queue(self):
+        response = self.client.post(reverse('order_create'), {'table_number': 4, 'items': 'Суп 5.00'})
+        self.assertEqual(response.status_code, 302)
+        order = Order.objects.get()
+        response = self.client.patch(reverse('order-detail', args=[order.pk]), {'status': 'paid'}, content_type='application/json')
+        self.assertEqual(response.json()['status'], 'paid')
+        self.assertEqual(revenue.total_revenue(), Decimal('5.00'))
+        self.client.post(reverse('order_delete', args=[order.pk]))
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(revenue.total_revenue(), 0)
+
+
+class OrderArchiveTest(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.old_paid, self.old_pending, self.recent_paid = [
+            Order.objects.create(
+                table_number=table, items=[{'name': dish, 'price': '5.00'}], total_price=Decimal('5.00'),
+                status=status, created_at=now - timedelta(days=days),
+            )
+            for table, dish, status, days in [(1, 'Борщ', 'paid', 200), (2, 'Пельмени', 'pending', 200), (3, 'Борщ', 'paid', 1)]
+        ]
+        self.cutoff = now - timedelta(days=90)
+
+    def archive(self):
+        return archive.archive_orders(self.cutoff)
+
+    def test_moves_old_paid_orders(self):
+        version, _ = current()
+        self.assertEqual(self.archive(), 1)
+        self.assertFalse(Order.objects.filter(pk=self.old_paid.pk).exists())
+        self.assertFalse(OrderItem.objects.filter(order_id=self.old_paid.pk).exists())
+        archived = OrderArchive.objects.get()
+        self.assertEqual(archived.state(), self.old_paid.state())
+        self.assertEqual(archived.updated_at, self.old_paid.updated_at)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertGreater(current()[0], version)
+        # Archived orders still count towards the revenue.
+        self.assertEqual(revenue.total_revenue(), Decimal('10.00'))
+        self.assertEqual(revenue.compare_ledger(), [])
+        self.assertEqual(self.archive(), 0)
+
+    @patch('orders.search.is_available', return_value=False)
+    def test_history_search_without_index(self, is_available):
+        self.archive()
+        history = OrderHistory.objects.all()
+        self.assertEqual(
+            sorted(history.search('Борщ').values_list('id', flat=True)), [self.old_paid.pk, self.recent_paid.pk],
+        )
+        self.assertEqual(list(history.search('Пельм').values_list('id', flat=True)), [self.old_pending.pk])
+        # Keys and prices of `items` are not dish names.
+        self.assertFalse(history.search('name').exists())
+        self.assertFalse(history.search('5.00').exists())
+        ranked = history.search('Борщ', ranked=True).order_by('search_rank', 'id')
+        self.assertEqual([order.search_rank for order in ranked], [0.0, 0.0])
+
+        with benchmarks.async_views():
+            response = self.client.get(reverse('order-list'), {'created_before': self.cutoff.isoformat(), 'search': 'Борщ'})
+        self.assertEqual([order['id'] for order in response.json()['results']], [self.old_paid.pk])
+
+    def test_admin_is_read_only(self):
+        self.archive()
+        model_admin = admin.site._registry[OrderArchive]
+        request = RequestFactory().get('/')
+        request.user = User(is_staff=True, is_superuser=True)
+        self.assertFalse(model_admin.has_add_permission(request))
+        self.assertFalse(model_admin.has_change_permission(request, OrderArchive.objects.get()))
+        self.assertFalse(model_admin.has_delete_permission(request, OrderArchive.objects.get()))
+
+    def test_batches(self):
+        more = Order.objects.create(
+            table_number=4, items=[], total_price=Decimal('1.00'), status='paid',
+            created_at=self.old_paid.created_at,
+        )
+        self.assertEqual(archive.archive_batch(self.cutoff, batch_size=1), [self.old_paid.pk])
+        # A new run starts over and picks up the orders that are left.
+        self.assertEqual(archive.archive_batch(self.cutoff, batch_size=1), [more.pk])
+        self.assertEqual(archive.archive_batch(self.cutoff, batch_size=1), [])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('archive_orders', '--dry-run', stdout=out)
+        self.assertIn("1 paid orders", out.getvalue())
+        self.assertEqual(Order.objects.count(), 3)
+        call_command('archive_orders', '--days', '300', stdout=out)
+        self.assertEqual(Order.objects.count(), 3)
+        call_command('archive_orders', stdout=out)
+        self.assertIn("Archived 1 paid orders", out.getvalue())
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_api_reads_archive_only_for_date_ranges(self):
+        self.archive()
+        url = reverse('order-list')
+
+        def ids(params=None):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            return [order['id'] for order in response.json()['results']]
+
+        hot = [self.recent_paid.pk, self.old_pending.pk]
+        self.assertEqual(ids(), hot)
+        self.assertEqual(ids({'created_after': (timezone.now() - timedelta(days=30)).isoformat()}), [self.recent_paid.pk])
+        everything = [self.recent_paid.pk, self.old_pending.pk, self.old_paid.pk]
+        self.assertEqual(ids({'created_after': (timezone.now() - timedelta(days=365)).isoformat()}), everything)
+        self.assertEqual(ids({'created_before': self.cutoff.isoformat()}), [self.old_pending.pk, self.old_paid.pk])
+        self.assertEqual(ids({
+            'created_before': self.cutoff.isoformat(), 'status': 'paid', 'fields': 'id,status',
+        }), [self.old_paid.pk])
+        self.assertEqual(ids({'created_before': self.cutoff.isoformat(), 'search': 'борщ'}), [self.old_paid.pk])
+        self.assertEqual(self.client.get(url, {'created_after': 'garbage'}).status_code, 400)
+
+        response = self.client.get(reverse('order-export'), {'created_before': self.cutoff.isoformat(), 'format': 'ndjson'})
+        exported = [json.loads(line)['id'] for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(exported, [self.old_pending.pk, self.old_paid.pk])
+
+    def test_ranked_history_search_joins_the_index(self):
+        self.archive()
+        ranked = OrderHistory.objects.search('борщ', ranked=True).order_by('search_rank', 'id')
+        self.assertEqual({order.pk for order in ranked}, {self.old_paid.pk, self.recent_paid.pk})
+        self.assertTrue(all(order.search_rank is not None for order in ranked))
+        # The index is joined once, not matched again for every candidate row.
+        with CaptureQueriesContext(connection) as queries:
+            list(ranked.all())
+        self.assertEqual(queries[0]['sql'].count('MATCH'), 1)
+        self.assertIn('JOIN "orders_order_fts"', queries[0]['sql'])
+
+    def test_archived_orders_are_read_only(self):
+        self.archive()
+        url = reverse('order-detail', args=[self.old_paid.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['table_number'], 1)
+        self.assertEqual(self.client.patch(url, {'status': 'ready'}, content_type='application/json').status_code, 404)
+        self.assertEqual(self.client.post(reverse('order_delete', args=[self.old_paid.pk])).status_code, 404)
+
+    def test_html_list_shows_only_live_orders(self):
+        self.archive()
+        response = self.client.get(reverse('orders_list'))
+        self.assertEqual({order.pk for order in response.context['orders']}, {self.recent_paid.pk, self.old_pending.pk})
+
+    async def test_async_api_list(self):
+        await sync_to_async(self.archive)()
+        with benchmarks.async_views():
+            response = await self.async_client.get(reverse('order-list'), {'created_before': self.cutoff.isoformat()})
+            self.assertEqual([order['id'] for order in response.json()['results']], [self.old_pending.pk, self.old_paid.pk])
+            response = await self.async_client.get(reverse('order-detail', args=[self.old_paid.pk]))
+            self.assertEqual(response.status_code, 200)
+
+
+class SalesReportsTest(TestCase):
+    def setUp(self):
+        self.start = datetime(2026, 3, 1, 10, 0, tzinfo=dt_timezone.utc)
+        self.orders = [
+            Order.objects.create(
+                table_number=table, items=items, total_price=sum(Decimal(item['price']) for item in items),
+                status=status, created_at=self.start + timedelta(minutes=minutes),
+            )
+            for table, items, status, minutes in [
+                (1, [{'name': 'Суп', 'price': '5.00'}, {'name': 'Чай', 'price': '2.00'}], 'paid', 5),
+                (1, [{'name': 'Суп', 'price': '5.00'}], 'paid', 30),
+                (2, [{'name': 'Чай', 'price': '2.00'}], 'pending', 70),
+                (2, [{'name': 'Пирог', 'price': '4.50'}], 'paid', 24 * 60),
+            ]
+        ]
+
+    def report(self, name, params=None, status_code=200):
+        response = self.client.get(reverse(f'report-{name}'), params)
+        self.assertEqual(response.status_code, status_code)
+        return response.json()
+
+    def test_sales_by_day_table_status(self):
+        self.assertEqual(self.report('sales')['results'], [
+            {'day': '2026-03-01', 'total': '14.00', 'orders_count': 3},
+            {'day': '2026-03-02', 'total': '4.50', 'orders_count': 1},
+        ])
+        self.assertEqual(self.report('sales', {'group_by': 'table,status'})['results'], [
+            {'table_number': 1, 'status': 'paid', 'total': '12.00', 'orders_count': 2},
+            {'table_number': 2, 'status': 'paid', 'total': '4.50', 'orders_count': 1},
+            {'table_number': 2, 'status': 'pending', 'total': '2.00', 'orders_count': 1},
+        ])
+        hours = self.report('sales', {
+            'group_by': 'hour', 'created_before': (self.start + timedelta(hours=2)).isoformat(), 'status': 'paid',
+        })['results']
+        self.assertEqual(hours, [{'hour': '2026-03-01T10:00:00Z', 'total': '12.00', 'orders_count': 2}])
+        self.report('sales', {'group_by': 'week'}, status_code=400)
+        self.report('sales', {'created_after': 'garbage'}, status_code=400)
+
+    def test_dishes(self):
+        self.assertEqual(self.report('dishes')['results'], [
+            {'dish': 'Пирог', 'quantity': 1, 'total': '4.50'},
+            {'dish': 'Суп', 'quantity': 2, 'total': '10.00'},
+            {'dish': 'Чай', 'quantity': 1, 'total': '2.00'},
+        ])
+        self.assertEqual(self.report('dishes', {'group_by': 'day', 'day_before': '2026-03-02'})['results'], [
+            {'day': '2026-03-01', 'quantity': 3, 'total': '12.00'},
+        ])
+
+    def test_rollups_follow_writes(self):
+        pending = self.orders[2]
+        url = reverse('order-detail', args=[pending.pk])
+        self.client.patch(url, {'status': 'paid'}, content_type='application/json')
+        self.client.patch(url, {'items': [{'name': 'Кофе', 'price': '3.00'}], 'total_price': '3.00'}, content_type='application/json')
+        self.client.patch(reverse('order-bulk-status'), [{'id': self.orders[0].pk, 'status': 'ready'}], content_type='application/json')
+        self.client.delete(reverse('order-detail', args=[self.orders[1].pk]))
+        bulk.create_orders([Order(table_number=3, items=[{'name': 'Чай', 'price': '2.00'}], total_price=Decimal('2.00'), status='paid')])
+        self.assertEqual(reports.compare_rollups(), [])
+        self.assertEqual(self.report('sales', {'group_by': 'status', 'created_before': '2026-03-02T00:00:00Z'})['results'], [
+            {'status': 'paid', 'total': '3.00', 'orders_count': 1},
+            {'status': 'ready', 'total': '7.00', 'orders_count': 1},
+        ])
+        dishes = {row['dish']: row['quantity'] for row in self.report('dishes')['results']}
+        self.assertEqual(dishes, {'Кофе': 1, 'Пирог': 1, 'Чай': 1})
+
+    def test_conditional_get(self):
+        response = self.client.get(reverse('report-sales'))
+        response = self.client.get(reverse('report-sales'), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_schema_documents_reports(self):
+        errors = StringIO()
+        with contextlib.redirect_stderr(errors):
+            document = self.client.get(reverse('schema'), {'format': 'json'}).json()
+        self.assertNotIn('ReportViewSet', errors.getvalue())
+        for path, parameters, row in [
+            ('/api/reports/sales/', {'group_by', 'created_after', 'created_before', 'status', 'table_number'}, 'SalesReport'),
+            ('/api/reports/dishes/', {'group_by', 'day_after', 'day_before', 'dish'}, 'DishReport'),
+        ]:
+            operation = document['paths'][path]['get']
+            self.assertEqual({parameter['name'] for parameter in operation['parameters']}, parameters)
+            ref = operation['responses']['200']['content']['application/json']['schema']['$ref']
+            results = document['components']['schemas'][ref.rsplit('/', 1)[1]]['properties']['results']
+            self.assertEqual(results['items']['$ref'], f'#/components/schemas/{row}')
+
+    def test_rebuild_command(self):
+        HourlySales.objects.filter(status='pending').delete()
+        DishSales.objects.filter(dish='Суп').update(quantity=5)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_reports', '--check', stdout=StringIO())
+        out = StringIO()
+        call_command('rebuild_reports', stdout=out)
+        self.assertIn("2 bucket(s) were out of date", out.getvalue())
+        call_command('rebuild_reports', '--check', stdout=StringIO())
+
+
+class FastOrderListTest(TestCase):
+    def setUp(self):
+        created = datetime(2026, 1, 15, 9, 30, 15, 123456, tzinfo=dt_timezone.utc)
+        rows = [
+            (1, [{'name': 'Борщ "домашний"', 'price': '5.5'}], Decimal('5.5'), 'paid', 0),
+            (2, [{'name': 'Line\u2028sep', 'price': 2}, {'name': 'Tab\t', 'price': 1.25}], Decimal('3.25'), 'pending', 1),
+            (3, [], Decimal('0'), 'ready', 2),
+            (3, {'odd': ['shape', None, True]}, Decimal('12345678.90'), 'paid', 3),
+        ]
+        for table, items, price, status, days in rows:
+            Order.objects.create(
+                table_number=table, items=items, total_price=price, status=status,
+                created_at=created + timedelta(days=days, microseconds=-days),
+            )
+
+    def assertSameAsSerializer(self, params=None):
+        url = reverse('order-list')
+        fast = self.client.get(url, params)
+        with patch.object(views.OrderViewSet, 'fast_list', False):
+            slow = self.client.get(url, params)
+        self.assertEqual(fast.status_code, slow.status_code)
+        self.assertEqual(fast.content, slow.content)
+        self.assertEqual(fast['Content-Type'], slow['Content-Type'])
+        return fast
+
+    def test_byte_identical_json(self):
+        response = self.assertSameAsSerializer()
+        self.assertIn('\\u2028'.encode(), response.content)
+        self.assertSameAsSerializer({'fields': 'total_price,id,created_at'})
+        self.assertSameAsSerializer({'ordering': 'total_price', 'page_size': 2})
+        next_url = self.assertSameAsSerializer({'ordering': '-created_at', 'page_size': 2}).json()['next']
+        self.assertSameAsSerializer(dict(pair.split('=', 1) for pair in next_url.split('?', 1)[1].split('&')))
+        self.assertSameAsSerializer({'search': 'борщ'})
+        self.assertSameAsSerializer({'status': 'nope'})
+
+    @override_settings(TIME_ZONE='Asia/Kolkata')
+    def test_byte_identical_json_in_other_time_zone(self):
+        self.assertSameAsSerializer()
+
+    def test_browsable_api_uses_serializer(self):
+        with patch.object(views.encoders, 'encode_page') as encode_page:
+            self.client.get(reverse('order-list'), headers={'Accept': 'text/html'})
+            self.client.get(reverse('order-list'), {'format': 'json'})
+        self.assertEqual(encode_page.call_count, 1)
+
+
+class ImportOrdersTest(TestCase):
+    CSV = (
+        'table_number,status,total_price,created_at,items\n'
+        '1,,,2024-05-01T12:30:00,"Суп 5.00, Чай 2.00"\n'
+        '2,pending,3.50,2024-05-01T13:00:00Z,Кофе 3.50\n'
+        '3,,,2024-05-02T09:00:00,Суп\n'
+        '4,,99.00,2024-05-02T10:00:00,Чай 2.00\n'
+        'x,,,2024-05-02T11:00:00,Чай 2.00\n'
+        '5,lost,,2024-05-02T12:00:00,Чай 2.00\n'
+        '6,paid,,,Чай 2.00\n'
+        '7,paid,,2024-05-03T08:00:00,"[{""name"": ""Пирог"", ""price"": ""4.50""}]"\n'
+    )
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def call(self, *args):
+        out = StringIO()
+        call_command('import_orders', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_csv(self):
+        path = self.write('orders.csv', self.CSV)
+        rejects = self.write('rejects.jsonl', '')
+        out = self.call(path, '--batch-size', '3', '--rejects', rejects)
+        self.assertIn("Imported 3 orders", out)
+        self.assertIn("5 records rejected", out)
+
+        orders = {order.table_number: order for order in Order.objects.all()}
+        self.assertEqual(sorted(orders), [1, 2, 7])
+        self.assertEqual(orders[1].status, 'paid')
+        self.assertEqual(orders[1].total_price, Decimal('7.00'))
+        self.assertEqual(orders[1].items, [{'name': 'Суп', 'price': '5.00'}, {'name': 'Чай', 'price': '2.00'}])
+        self.assertEqual(orders[1].created_at.isoformat(), '2024-05-01T12:30:00+00:00')
+        self.assertEqual(orders[2].status, 'pending')
+        self.assertEqual(orders[7].items, [{'name': 'Пирог', 'price': '4.50'}])
+        self.assertEqual(OrderItem.objects.count(), 4)
+        self.assertEqual(DailyRevenue.objects.get(day='2024-05-01').total, Decimal('7.00'))
+        self.assertEqual(reports.compare_rollups(), [])
+
+        with open(rejects, encoding='utf-8') as f:
+            rejected = [json.loads(line) for line in f]
+        self.assertEqual([row['line'] for row in rejected], [4, 5, 6, 7, 8])
+        self.assertIn('does not match', rejected[1]['error'])
+        self.assertIn('table_number', rejected[2]['error'])
+        self.assertIn('status', rejected[3]['error'])
+        self.assertIn('created_at', rejected[4]['error'])
+        self.assertEqual(rejected[0]['record']['items'], 'Суп')
+
+    def test_jsonl(self):
+        path = self.write('orders.jsonl', '\n'.join([
+            json.dumps({'table_number': 1, 'created_at': '2024-05-01T12:00:00Z', 'items': [{'name': 'Чай', 'price': '2.00'}]}),
+            '',
+            json.dumps({'table_number': 2, 'created_at': '2024-05-01T12:00:00Z', 'items': 'Суп 5, Хлеб 1.5'}),
+            '{"table_number": 3,',
+            json.dumps({'table_number': 4, 'created_at': '2024-05-01T12:00:00Z', 'items': [{'name': '', 'price': '1'}]}),
+            json.dumps({'table_number': 5, 'created_at': '2024-05-01T12:00:00Z', 'items': 'Суп NaN'}),
+            json.dumps([1, 2]),
+        ]) + '\n')
+        out = self.call(path, '--batch-size', '2')
+        self.assertIn("Imported 2 orders", out)
+        self.assertIn("4 records rejected", out)
+        self.assertEqual(Order.objects.get(table_number=2).total_price, Decimal('6.5'))
+
+    def test_resume_after_failure(self):
+        lines = ['table_number,created_at,items'] + [f'{n},2024-05-01T12:00:00,Чай 2.00' for n in range(1, 8)]
+        path = self.write('orders.csv', '\n'.join(lines) + '\nx,2024-05-01T12:00:00,Чай 2.00\n')
+
+        create_orders = bulk.create_orders
+        calls = []
+
+        def failing(orders):
+            calls.append(len(orders))
+            if len(calls) == 2:
+                raise RuntimeError("disk full")
+            return create_orders(orders)
+
+        with patch.object(bulk, 'create_orders', failing), self.assertRaises(RuntimeError):
+            self.call(path, '--batch-size', '3')
+        self.assertEqual(Order.objects.count(), 3)
+        run = OrderImport.objects.get()
+        self.assertEqual((run.position, run.imported, run.finished), (3, 3, False))
+
+        with self.assertRaises(CommandError):
+            self.call(path)
+        out = self.call(path, '--resume', '--batch-size', '3')
+        self.assertIn("Resuming after 3 records", out)
+        self.assertIn("Imported 4 orders", out)
+        self.assertEqual(sorted(Order.objects.values_list('table_number', flat=True)), list(range(1, 8)))
+        run.refresh_from_db()
+        self.assertEqual((run.position, run.imported, run.rejected, run.finished), (8, 7, 1, True))
+
+        with self.assertRaises(CommandError):
+            self.call(path, '--resume')
+        self.call(path, '--restart')
+        self.assertEqual(Order.objects.count(), 14)
+
+    def test_dry_run(self):
+        path = self.write('orders.csv', self.CSV)
+        out = self.call(path, '--dry-run')
+        self.assertIn("Checked 3 orders", out)
+        self.assertFalse(Order.objects.exists())
+
+
+class OrderTransitionTest(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(
+            table_number=3, items=[{'name': 'Суп', 'price': '5.00'}], total_price=Decimal('5.00'),
+        )
+        self.url = reverse('order-transition', args=[self.order.pk])
+
+    def test_single_conditional_update(self):
+        order = Order(pk=self.order.pk)
+        with CaptureQueriesContext(connection) as queries:
+            order.transition('ready')
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "orders_order"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"status" = ', updates[0].split('WHERE', 1)[1])
+        self.assertEqual((order.status, order.table_number), ('ready', 3))
+        order.transition('paid')
+        self.assertEqual(revenue.total_revenue(), Decimal('5.00'))
+        self.assertEqual(reports.compare_rollups(), [])
+
+    def test_conflicts(self):
+        first, second = Order.objects.get(pk=self.order.pk), Order.objects.get(pk=self.order.pk)
+        first.transition('ready')
+        with self.assertRaises(TransitionConflict) as conflict:
+            second.transition('ready')
+        self.assertEqual(conflict.exception.status, 'ready')
+        with self.assertRaises(TransitionConflict):
+            Order(pk=self.order.pk).transition('ready')
+        with self.assertRaises(ValueError):
+            Order(pk=self.order.pk).transition('pending')
+        with self.assertRaises(Order.DoesNotExist):
+            Order(pk=self.order.pk + 1).transition('ready')
+
+    def test_keeps_concurrent_edits(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        Order.objects.filter(pk=self.order.pk).update(table_number=8)
+        stale.transition('ready')
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.table_number), ('ready', 8))
+
+    def test_api(self):
+        response = self.client.post(self.url, {'status': 'ready'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'ready')
+        self.assertEqual(response.json()['total_price'], '5.00')
+
+        response = self.client.post(self.url, {'status': 'ready'}, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['status'], 'ready')
+
+        self.assertEqual(self.client.post(self.url, {'status': 'pending'}, content_type='application/json').status_code, 400)
+        missing = reverse('order-transition', args=[self.order.pk + 1])
+        self.assertEqual(self.client.post(missing, {'status': 'ready'}, content_type='application/json').status_code, 404)
+        self.assertEqual(self.client.post(self.url, {'status': 'paid'}, content_type='application/json').status_code, 200)
+        invalid = reverse('order-transition', args=['abc'])
+        self.assertEqual(self.client.post(invalid, {'status': 'ready'}, content_type='application/json').status_code, 404)
+
+    def test_api_does_not_hide_errors_of_receivers(self):
+        with patch('orders.revenue.apply_changes', side_effect=ValueError("ledger is broken")):
+            with self.assertRaisesMessage(ValueError, "ledger is broken"):
+                self.client.post(self.url, {'status': 'ready'}, content_type='application/json')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+
+
+class ConcurrentTransitionTest(TransactionTestCase):
+    def setUp(self):
+        self.addCleanup(writer.stop)
+
+    def test_only_one_concurrent_transition_wins(self):
+        order = Order.objects.create(
+            table_number=3, items=[{'name': 'Суп', 'price': '5.00'}], total_price=Decimal('5.00'), status='ready',
+        )
+        url = reverse('order-transition', args=[order.pk])
+
+        def pay(_):
+            try:
+                return Client().post(url, {'status': 'paid'}, content_type='application/json').status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(10) as pool:
+            codes = list(pool.map(pay, range(10)))
+        self.assertEqual(sorted(codes), [200] + [409] * 9)
+        self.assertEqual(revenue.total_revenue(), Decimal('5.00'))
+        self.assertEqual(DailyRevenue.objects.get().orders_count, 1)
+
+
+@override_settings(ORDERS_READ_REPLICAS=['replica'])
+class ReplicaRouterTest(TestCase):
+    def test_routing(self):
+        replica_router = ReplicaRouter()
+        self.assertIsNone(replica_router.db_for_read(Order))
+        with replica_reads('replica'):
+            self.assertEqual(replica_router.db_for_read(Order), 'replica')
+            self.assertIsNone(replica_router.db_for_read(User))
+            self.assertIsNone(replica_router.db_for_write(Order))
+            with replica_reads(None):
+                self.assertIsNone(replica_router.db_for_read(Order))
+        self.assertIs(replica_router.allow_migrate('replica', 'orders'), False)
+        self.assertIsNone(replica_router.allow_migrate('default', 'orders'))
+        with override_settings(ORDERS_READ_REPLICAS=[]):
+            self.assertIs(replica_router.allow_migrate('replica', 'auth'), False)
+
+    def test_middleware(self):
+        seen = []
+        middleware = ReplicaMiddleware(lambda request: seen.append(router.db_for_read(Order)) or HttpResponse())
+        factory = RequestFactory()
+
+        self.assertNotIn('orders_primary', middleware(factory.get('/')).cookies)
+        response = middleware(factory.post('/create/'))
+        self.assertEqual(response.cookies['orders_primary']['max-age'], 10)
+        pinned = factory.get('/')
+        pinned.COOKIES['orders_primary'] = '1'
+        middleware(pinned)
+        self.assertEqual(seen, ['replica', 'default', 'default'])
+
+    @override_settings(ORDERS_READ_REPLICAS=['replica', 'replica_2'])
+    def test_one_replica_per_request(self):
+        def view(request):
+            seen.append({router.db_for_read(Order) for _ in range(10)})
+            return HttpResponse()
+
+        seen = []
+        middleware = ReplicaMiddleware(view)
+        with patch('orders.replicas.random.choice', side_effect=['replica_2', 'replica']) as choice:
+            middleware(RequestFactory().get('/'))
+            middleware(RequestFactory().get('/'))
+        self.assertEqual(choice.call_count, 2)
+        self.assertEqual(seen, [{'replica_2'}, {'replica'}])
+
+    @override_settings(ORDERS_READ_REPLICAS=[])
+    def test_disabled(self):
+        self.assertIsNone(choose_replica(RequestFactory().get('/')))
+        response = self.client.post(reverse('order_create'), {'table_number': 4, 'items': 'Суп 5.00'})
+        self.assertNotIn('orders_primary', response.cookies)
+
+
+@override_settings(ORDERS_READ_REPLICAS=['replica'])
+class ReadReplicaTest(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.addCleanup(writer.stop)
+
+    def sync(self):
+        out = StringIO()
+        call_command('sync_replica', stdout=out)
+        self.assertIn("Copied default to replica", out.getvalue())
+
+    def ids(self, client, url=None):
+        response = client.get(url or reverse('order-list'))
+        self.assertEqual(response.status_code, 200)
+        return [order['id'] for order in response.json()['results']]
+
+    def test_reads_replica_until_synced(self):
+        self.sync()
+        order = Order.objects.create(table_number=1, items=[{'name': 'Чай', 'price': '2.00'}], total_price=Decimal('2.00'))
+        self.assertEqual(self.ids(Client()), [])
+        self.assertEqual(Client().get(reverse('order-detail', args=[order.pk])).status_code, 404)
+        self.sync()
+        self.assertEqual(self.ids(Client()), [order.pk])
+        self.assertContains(Client().get(reverse('orders_list')), 'Чай')
+
+    def test_read_your_writes(self):
+        self.sync()
+        waiter = Client()
+        response = waiter.post(reverse('order-list'), {
+            'table_number': 2, 'items': [{'name': 'Суп', 'price': '5.00'}], 'total_price': '5.00',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        created = response.json()['id']
+        self.assertEqual(self.ids(waiter), [created])
+        self.assertEqual(self.ids(Client()), [])
+
+    def test_export_reads_replica(self):
+        self.sync()
+        Order.objects.create(table_number=1, items=[{'name': 'Чай', 'price': '2.00'}], total_price=Decimal('2.00'))
+        response = Client().get(reverse('order-export'))
+        self.assertEqual(b''.join(response.streaming_content).decode().count('\n'), 1)
+
+    def test_sync_replica_rejects_unknown_alias(self):
+        with self.assertRaises(CommandError):
+            call_command('sync_replica', 'default')
+        with self.assertRaises(CommandError):
+            call_command('sync_replica', 'nope')
+
+
+class PrebuiltSchemaTest(TestCase):
+    def setUp(self):
+        self.dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.addCleanup(reload_urlconf)
+        self.enterContext(override_settings(ORDERS_SCHEMA_DIR=self.dir, ORDERS_PRECOMPUTED_SCHEMA=True))
+        reload_urlconf()
+
+    def build(self, *args):
+        out = StringIO()
+        # drf_spectacular reports the views it cannot describe on stderr.
+        with contextlib.redirect_stderr(StringIO()):
+            call_command('build_schema', *args, stdout=out)
+        return out.getvalue()
+
+    def test_serves_built_schema(self):
+        self.assertIn("(new)", self.build())
+        version = schema.current_version()
+        names = schema.file_names(version)
+
+        response = self.client.get(reverse('schema'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/vnd.oai.openapi; charset=utf-8')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        with open(f"{self.dir}/{names['yaml']}", 'rb') as f:
+            self.assertEqual(response.content, f.read())
+        self.assertEqual(self.client.get(reverse('schema'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        data = self.client.get(reverse('schema'), {'format': 'json'}).json()
+        self.assertIn('/api/orders/', data['paths'])
+        self.assertEqual(self.client.get(reverse('schema'), {'format': 'xml'}).status_code, 404)
+
+        response = self.client.get(reverse('schema-file', args=[names['json']]))
+        self.assertEqual(response.json(), data)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        self.assertEqual(self.client.get(reverse('schema-file', args=['openapi-0.json'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('schema-file', args=[schema.MANIFEST])).status_code, 404)
+
+        self.assertContains(self.client.get(reverse('redoc')), reverse('schema-file', args=[names['json']]))
+        self.assertContains(self.client.get(reverse('swagger-ui')), 'swagger-ui')
+
+    def test_matches_generated_schema(self):
+        self.build()
+        with open(f"{self.dir}/{schema.file_names(schema.current_version())['yaml']}", 'rb') as f:
+            built = f.read()
+        with override_settings(ORDERS_PRECOMPUTED_SCHEMA=False):
+            reload_urlconf()
+            with contextlib.redirect_stderr(StringIO()):
+                self.assertEqual(self.client.get(reverse('schema')).content, built)
+
+    def test_swagger_reads_csrf_cookie(self):
+        self.build()
+        with open(f"{self.dir}/{schema.file_names(schema.current_version())['swagger']}", 'rb') as f:
+            page = f.read()
+        self.assertIn(b'request.headers["X-CSRFTOKEN"] = (document.cookie.match(/(?:^|;\\s*)csrftoken=', page)
+        self.assertIsNone(re.search(rb'X-CSRFTOKEN"\] = "', page))
+        self.assertIsNone(re.search(rb'[A-Za-z0-9]{64}', page))
+
+        response = self.client.get(reverse('swagger-ui'))
+        self.assertEqual(response.content, page)
+        self.assertIn('csrftoken', response.cookies)
+
+    def test_builds_without_drf_spectacular_installed(self):
+        self.build()
+        # As with ORDERS_PRECOMPUTED_SCHEMA in the settings.
+        with modify_settings(INSTALLED_APPS={'remove': ['drf_spectacular']}):
+            self.assertIn("(unchanged)", self.build())
+            self.assertFalse(apps.is_installed('drf_spectacular'))
+            self.assertContains(self.client.get(reverse('swagger-ui')), 'swagger-ui')
+
+    def test_not_built(self):
+        self.assertEqual(self.client.get(reverse('schema')).status_code, 404)
+        self.assertEqual(self.client.get(reverse('swagger-ui')).status_code, 404)
+
+    def test_check(self):
+        with self.assertRaises(CommandError):
+            self.build('--check')
+        self.build()
+        self.assertIn("up to date", self.build('--check'))
+        self.assertIn("(unchanged)", self.build())
+
+    def test_keeps_previous_builds(self):
+        files = {kind: b'{}' for kind in ('yaml', 'json', 'swagger', 'redoc')}
+        for age, version in enumerate(['d4', 'c3', 'b2', 'a1']):
+            schema.write_build(self.dir, version, files, keep=2)
+            for name in schema.file_names(version).values():
+                os.utime(f"{self.dir}/{name}", (1000 + age, 1000 + age))
+        self.assertEqual(schema.current_version(), 'a1')
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.dir) if name.startswith('openapi-') and name.endswith('.json')),
+            ['openapi-a1.json', 'openapi-b2.json', 'openapi-c3.json'],
+        )
+
+
+class OpenBillsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def create(self, table_number, status, price):
+        return Order.objects.create(
+            table_number=table_number, status=status, total_price=Decimal(price),
+            items=[{'name': 'Суп', 'price': price}],
+        )
+
+    def test_open_bills_per_table(self):
+        self.create(1, 'pending', '5.00')
+        self.create(1, 'ready', '3.00')
+        self.create(1, 'paid', '10.00')
+        self.create(2, 'pending', '2.50')
+        self.create(2, 'pending', '1.50')
+        self.create(3, 'paid', '7.00')
+
+        response = self.client.get('/api/tables/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [
+            {'table_number': 1, 'orders_count': 2, 'total': '8.00', 'statuses': {
+                'pending': {'orders_count': 1, 'total': '5.00'}, 'ready': {'orders_count': 1, 'total': '3.00'},
+            }},
+            {'table_number': 2, 'orders_count': 2, 'total': '4.00', 'statuses': {
+                'pending': {'orders_count': 2, 'total': '4.00'}, 'ready': {'orders_count': 0, 'total': '0.00'},
+            }},
+        ])
+        self.assertEqual(
+            self.client.get('/api/tables/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304,
+        )
+
+    def test_one_query_then_cached(self):
+        for table_number in range(1, 21):
+            self.create(table_number, 'pending', '1.00')
+        version, _ = conditional.current()
+        with self.assertNumQueries(1):
+            self.assertEqual(len(tables.open_bills(version)), 20)
+        with self.assertNumQueries(0):
+            tables.open_bills(version)
+
+    def test_writes_invalidate(self):
+        order = self.create(1, 'pending', '5.00')
+        paid = self.create(2, 'paid', '4.00')
+        self.assertEqual([bill['table_number'] for bill in tables.open_bills()], [1])
+
+        # Paid orders are not on any bill.
+        paid.items = [{'name': 'Чай', 'price': '4.00'}]
+        paid.save()
+        self.assertEqual([bill['table_number'] for bill in tables.open_bills()], [1])
+
+        order.transition('ready')
+        self.assertEqual(tables.open_bills()[0]['statuses']['ready']['orders_count'], 1)
+        self.create(3, 'pending', '1.00')
+        self.assertEqual([bill['table_number'] for bill in tables.open_bills()], [1, 3])
+        order.transition('paid')
+        self.assertEqual([bill['table_number'] for bill in tables.open_bills()], [3])
+        bulk.create_orders([Order(table_number=4, items=[{'name': 'Суп', 'price': '2.00'}], total_price=Decimal('2.00'))])
+        self.assertEqual([bill['table_number'] for bill in tables.open_bills()], [3, 4])
+
+    def test_fill_from_old_snapshot_is_not_served_after_write(self):
+        self.create(1, 'pending', '5.00')
+        compute = tables.compute_open_bills
+
+        def write_during_fill(queryset):
+            bills = compute(queryset)
+            # A write commits after the bills were read but before they are stored.
+            self.create(2, 'pending', '3.00')
+            return bills
+
+        with patch('orders.tables.compute_open_bills', side_effect=write_during_fill):
+            self.assertEqual([bill['table_number'] for bill in tables.open_bills()], [1])
+        self.assertEqual([bill['table_number'] for bill in tables.open_bills()], [1, 2])
+        version, _ = conditional.current()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(tables.open_bills(version)), 2)
+
+    def test_drops_replaced_version(self):
+        order = self.create(1, 'pending', '5.00')
+        tables.open_bills()
+        version, _ = conditional.current()
+        self.assertIsNotNone(cache.get(tables.cache_key('default', version)))
+        with self.captureOnCommitCallbacks(execute=True):
+            order.transition('ready')
+        self.assertIsNone(cache.get(tables.cache_key('default', version)))
+
+    def test_schema_documents_tables(self):
+        errors = StringIO()
+        with contextlib.redirect_stderr(errors):
+            document = self.client.get(reverse('schema'), {'format': 'json'}).json()
+        self.assertNotIn('TableViewSet', errors.getvalue())
+        operation = document['paths']['/api/tables/']['get']
+        ref = operation['responses']['200']['content']['application/json']['schema']['$ref']
+        results = document['components']['schemas'][ref.rsplit('/', 1)[1]]['properties']['results']
+        self.assertEqual(results['items']['$ref'], '#/components/schemas/OpenBill')
+
+    def test_page(self):
+        response = self.client.get(reverse('order_tables'))
+        self.assertContains(response, 'Открытых счетов нет')
+        self.create(5, 'pending', '5.00')
+        self.create(5, 'ready', '2.50')
+        response = self.client.get(reverse('order_tables'))
+        self.assertContains(response, '<td>5</td>', html=True)
+        self.assertContains(response, '7.50 ₽')
+        self.assertContains(response, 'В ожидании')
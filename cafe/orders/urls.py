@@ -1,28 +1,69 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
 from . import views
 
 
 router = DefaultRouter()
 router.register(r'orders', views.OrderViewSet)  # API /api/orders/
+router.register(r'reports', views.ReportViewSet, basename='report')  # API /api/reports/
+router.register(r'tables', views.TableViewSet, basename='table')  # API /api/tables/
+
+# Async views for ASGI deployments (see orders.async_views).
+if getattr(settings, 'ORDERS_ASYNC_VIEWS', False):
+    from . import async_views as crud_views
+else:
+    crud_views = views
 
 # API
-urlpatterns = [
+urlpatterns = []
+if crud_views is not views:
+    # Ahead of the router: JSON reads are served by async views, the rest by the viewset.
+    urlpatterns += [
+        path('api/orders/', crud_views.order_api_list, name='order-list'),
+        path('api/orders/<int:pk>/', crud_views.order_api_detail, name='order-detail'),
+    ]
+urlpatterns += [
     path('api/', include(router.urls)),
 ]
 
-# API docs
+# API docs: prebuilt by `build_schema` (see orders.schema), or generated per request.
+if getattr(settings, 'ORDERS_PRECOMPUTED_SCHEMA', False):
+    from . import schema
+    urlpatterns += [
+        path('api/schema/', schema.schema_view, name='schema'),
+        path('api/schema/<str:name>', schema.schema_file_view, name='schema-file'),
+        path('api/docs/', schema.swagger_view, name='swagger-ui'),
+        path('api/redoc/', schema.redoc_view, name='redoc'),
+    ]
+else:
+    from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
+    urlpatterns += [
+        path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+        path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
+        path('api/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
+    ]
+
+# CRUD
 urlpatterns += [
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
-    path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
-    path('api/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
+    path('', crud_views.order_list, name='orders_list'),
+    path('create/', crud_views.order_create, name='order_create'),
+    path('<int:pk>/edit/', crud_views.order_update, name='order_edit'), 
+    path('<int:pk>/delete/', crud_views.order_delete, name='order_delete'),
 ]
 
-# CRUD
+# Live board
 urlpatterns += [
-    path('', views.order_list, name='orders_list'),
-    path('create/', views.order_create, name='order_create'),
-    path('<int:pk>/edit/', views.order_update, name='order_edit'), 
-    path('<int:pk>/delete/', views.order_delete, name='order_delete'),
-]
\ No newline at end of file
+    path('tables/', views.order_tables, name='order_tables'),
+]
+# The event stream of the board needs an ASGI server.
+if getattr(settings, 'ORDERS_LIVE_BOARD', False):
+    urlpatterns += [
+        path('board/', views.order_board, name='order_board'),
+        path('events/', views.order_events, name='order_events'),
+    ]
+
+# Monitoring
+urlpatterns += [
+    path('metrics', views.metrics_view, name='metrics'),
+]
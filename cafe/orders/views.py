@@ -1,29 +1,371 @@
 from rest_framework import viewsets, filters, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import Http404, HttpResponseBadRequest, HttpResponseServerError
-from django.db.models import Sum, Q  # Import Q for complex queries
-from .models import Order
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseServerError, StreamingHttpResponse
+from .models import DishSales, HourlySales, Order, OrderHistory, TransitionConflict
 from .forms import OrderUpdateForm, OrderFilterForm
-from .serializers import OrderSerializer
+from .serializers import (
+    DishReportSerializer, OpenBillSerializer, OrderSerializer, OrderStatusSerializer, OrderTransitionSerializer,
+    SalesReportSerializer,
+)
+from .filters import (
+    DishSalesFilter, DishSearchFilter, HourlySalesFilter, OrderFilter, OrderFilterBackend, ReportGroupingFilter,
+)
+from .renderers import CSVRenderer, NDJSONRenderer
+from . import archive, bulk, conditional, encoders, events, export, fragments, reports, tables, writer
+from .revenue import total_revenue
+from .pagination import InvalidCursor, OrderCursorPagination, ResultsPagination, keyset_paginate
+from . import metrics
+from collections import Counter
 from decimal import Decimal
+import asyncio
 import json
+import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_fields(param):
+    """Parses a `fields` parameter into field names; None if it is empty. Raises ValidationError on unknown names."""
+    if not param:
+        return None
+    fields = [name.strip() for name in param.split(',') if name.strip()]
+    available = [field.name for field in Order._meta.concrete_fields]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ValidationError({'fields': f"Unknown fields: {', '.join(unknown)}"})
+    return fields
 
 
 class OrderViewSet(viewsets.ModelViewSet):
+    """
+    API for orders.
+
+    List responses are cursor-paginated. Read actions accept a `fields`
+    parameter (e.g. `?fields=id,status,total_price`) that limits both the
+    columns selected from the database and the serialized fields.
+
+    Archived orders (see `orders.archive`) are listed only when the
+    `created_after`/`created_before` range reaches into the archive, and can
+    be retrieved but not changed.
+    """
     queryset = Order.objects.all().order_by('-id')
     serializer_class = OrderSerializer
+    pagination_class = OrderCursorPagination
 
     # Filters
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['status', 'table_number']
-    search_fields = ['items']  #  search by item name
+    filter_backends = [OrderFilterBackend, DishSearchFilter, filters.OrderingFilter]
+    filterset_class = OrderFilter
     ordering_fields = ['total_price', 'created_at']
 
+    # JSON lists read plain rows and encode them with orders.encoders instead
+    # of OrderSerializer; the output is the same.
+    fast_list = True
+
+    def get_requested_fields(self):
+        """Returns the field names from the `fields` parameter, or None if it is absent."""
+        if self.action not in ('list', 'retrieve'):
+            return None
+        return parse_fields(self.request.query_params.get('fields'))
+
+    def get_base_queryset(self):
+        """Order, or OrderHistory for reads that may concern archived orders."""
+        if self.action == 'retrieve':
+            return OrderHistory.objects.all()
+        if self.action in ('list', 'export'):
+            return archive.orders_for(self.request.query_params)
+        return Order.objects.all()
+
+    def get_queryset(self):
+        queryset = self.get_base_queryset().order_by('-id')
+        fields = self.get_requested_fields()
+        if fields is not None:
+            # Cursor pagination reads the ordering fields from every row.
+            ordering = filters.OrderingFilter().get_ordering(self.request, queryset, self) or []
+            ordering_fields = [name.lstrip('-') for name in ordering]
+            queryset = queryset.only('id', *fields, *ordering_fields)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    @method_decorator(condition(etag_func=conditional.api_etag, last_modified_func=conditional.last_modified))
+    def list(self, request, *args, **kwargs):
+        if not (self.fast_list and request.accepted_renderer.format == 'json'):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        fields = self.get_requested_fields()
+        columns, encode = encoders.row_encoder(tuple(fields) if fields is not None else None)
+        # Cursor pagination reads the ordering fields from every row.
+        ordering = [name.lstrip('-') for name in self.paginator.get_ordering(request, queryset, self)]
+        rows = self.paginate_queryset(queryset.values(*columns, *[name for name in ordering if name not in columns]))
+        content = encoders.encode_page(rows, encode, self.paginator.get_next_link(), self.paginator.get_previous_link())
+        return HttpResponse(content, content_type='application/json')
+
+    @method_decorator(condition(etag_func=conditional.api_etag, last_modified_func=conditional.last_modified))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    # Writes go through the writer thread when ORDERS_WRITE_QUEUE is enabled;
+    # creations queued together are inserted together.
+    def perform_create(self, serializer):
+        serializer.instance = writer.create(Order(**serializer.validated_data))
+
+    def perform_update(self, serializer):
+        writer.run(serializer.save)
+
+    def perform_destroy(self, instance):
+        writer.run(instance.delete)
+
+    def get_bulk_payload(self, request):
+        """Returns the list sent to a bulk action, or raises ValidationError."""
+        payload = request.data
+        if not isinstance(payload, list):
+            raise ValidationError({'detail': "Expected a list."})
+        limit = getattr(settings, 'ORDERS_BULK_MAX_ITEMS', 1000)
+        if len(payload) > limit:
+            raise ValidationError({'detail': f"At most {limit} items per request."})
+        return payload
+
+    @staticmethod
+    def bulk_response(results, succeeded, success_status=status.HTTP_200_OK):
+        """`success_status` when every item succeeded, 400 when none did, 207 otherwise."""
+        if succeeded == len(results):
+            code = success_status
+        elif succeeded == 0:
+            code = status.HTTP_400_BAD_REQUEST
+        else:
+            code = status.HTTP_207_MULTI_STATUS
+        return Response({'results': results}, status=code)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Creates many orders in one request (`POST /api/orders/bulk/` with a list of orders).
+
+        Every order is validated with OrderSerializer; the valid ones are
+        inserted with a single bulk_create. The response lists one result per
+        submitted order, in order: `created` with the new order, or `invalid`
+        with the validation errors.
+        """
+        results = []
+        valid = []
+        for index, data in enumerate(self.get_bulk_payload(request)):
+            serializer = self.get_serializer(data=data)
+            if serializer.is_valid():
+                valid.append((index, Order(**serializer.validated_data)))
+                results.append(None)
+            else:
+                results.append({'index': index, 'result': 'invalid', 'errors': serializer.errors})
+
+        writer.run(bulk.create_orders, [order for _, order in valid])
+        for index, order in valid:
+            results[index] = {'index': index, 'result': 'created', 'order': self.get_serializer(order).data}
+        return self.bulk_response(results, len(valid), status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        """
+        Streams all orders matching the list filters (`status`, `table_number`,
+        `created_after`, `created_before`, `search`, `ordering`).
+
+        The format is CSV (default) or NDJSON, chosen with `?format=csv|ndjson`
+        or the `Accept` header. `?rows=item` writes one row per dish instead of
+        one row per order.
+        """
+        per_item = request.query_params.get('rows') == 'item'
+        if request.query_params.get('rows', 'order') not in ('order', 'item'):
+            raise ValidationError({'rows': "Expected 'order' or 'item'."})
+        queryset = self.filter_queryset(self.get_queryset())
+        # Choose the database now: the rows are read while the response
+        # streams, after ReplicaMiddleware has returned.
+        queryset = queryset.using(queryset.db)
+        rows = export.item_rows(queryset) if per_item else export.order_rows(queryset)
+        columns = export.ITEM_COLUMNS if per_item else export.ORDER_COLUMNS
+
+        if request.accepted_renderer.format == 'ndjson':
+            content, extension = export.stream_ndjson(rows), 'ndjson'
+        else:
+            content, extension = export.stream_csv(rows, columns), 'csv'
+        response = StreamingHttpResponse(content, content_type=f'{request.accepted_renderer.media_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="orders.{extension}"'
+        return response
+
+    @action(detail=False, methods=['patch'], url_path='bulk-status')
+    def bulk_status(self, request):
+        """
+        Changes the status of many orders (`PATCH /api/orders/bulk-status/`
+        with a list of `{"id": ..., "status": ...}`).
+
+        Orders are updated with one `UPDATE ... WHERE id IN (...)` per target
+        status. Each entry gets a result: `updated`, `unchanged`, `not_found`
+        or `invalid`. Valid entries repeating an id are all `invalid`, since
+        it is unclear which status was meant.
+        """
+        results = []
+        entries = []
+        for index, data in enumerate(self.get_bulk_payload(request)):
+            serializer = OrderStatusSerializer(data=data)
+            if serializer.is_valid():
+                entries.append((index, serializer.validated_data['id'], serializer.validated_data['status']))
+                results.append(None)
+            else:
+                results.append({'index': index, 'result': 'invalid', 'errors': serializer.errors})
+
+        counts = Counter(order_id for _, order_id, _ in entries)
+        statuses = {}
+        for index, order_id, new_status in entries:
+            if counts[order_id] > 1:
+                results[index] = {
+                    'index': index, 'result': 'invalid', 'errors': {'id': ["This order is listed more than once."]},
+                }
+            else:
+                statuses[order_id] = new_status
+                results[index] = {'index': index, 'id': order_id}
+
+        outcome = writer.run(bulk.set_statuses, statuses)
+        for result in results:
+            if 'id' in result:
+                result['result'] = outcome[result['id']]
+                result['status'] = statuses[result['id']]
+        succeeded = sum(result['result'] in ('updated', 'unchanged') for result in results)
+        return self.bulk_response(results, succeeded)
+
+    @action(detail=True, methods=['post'])
+    def transition(self, request, pk=None):
+        """
+        Moves an order to the next status (`POST /api/orders/{id}/transition/`
+        with `{"status": "ready"}` or `{"status": "paid"}`).
+
+        The order is not read first: it is changed with one conditional
+        UPDATE (see `Order.transition`). If it is no longer in the status
+        before the requested one, for example because another waiter moved it
+        already, the response is 409 Conflict with its current `status`.
+        """
+        serializer = OrderTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            order = Order(pk=int(pk))
+        except ValueError:
+            raise Http404
+        try:
+            writer.run(order.transition, serializer.validated_data['status'])
+        except Order.DoesNotExist:
+            raise Http404
+        except TransitionConflict as e:
+            return Response(
+                {'detail': str(e), 'status': e.status},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(self.get_serializer(order).data)
+
+
+def parse_group_by(param, groups, default):
+    """Parses a `group_by` parameter into fields of the rollup rows. Raises ValidationError on unknown names."""
+    names = [name.strip() for name in (param or default).split(',') if name.strip()]
+    unknown = [name for name in names if name not in groups]
+    if unknown or not names:
+        raise ValidationError({'group_by': f"Expected a comma-separated list of: {', '.join(groups)}."})
+    return list(dict.fromkeys(groups[name] for name in names))
 
 
+class ReportViewSet(viewsets.GenericViewSet):
+    """
+    Sales reports, read from the rollups of `orders.reports` instead of the
+    orders, so a report costs the same however many orders there are.
+
+    Both reports take a `group_by` parameter with a comma-separated list of
+    groupings and answer `{"results": [...]}` with one row per group. The
+    rollup, filters, row serializer and groupings of each report are picked
+    by action, which also lets the schema generator document them.
+    """
+    filter_backends = [DjangoFilterBackend, ReportGroupingFilter]
+    pagination_class = ResultsPagination
+    rollups = {'sales': HourlySales, 'dishes': DishSales}
+    filtersets = {'sales': HourlySalesFilter, 'dishes': DishSalesFilter}
+    serializers = {'sales': SalesReportSerializer, 'dishes': DishReportSerializer}
+    groupings = {'sales': (reports.SALES_GROUPS, 'day'), 'dishes': (reports.DISH_GROUPS, 'dish')}
+
+    @property
+    def filterset_class(self):
+        return self.filtersets[self.action]
+
+    def get_queryset(self):
+        return self.rollups[self.action].objects.all()
+
+    def get_serializer_class(self):
+        return self.serializers[self.action]
+
+    def get_serializer(self, *args, **kwargs):
+        # A report is always a list of rows.
+        kwargs.setdefault('many', True)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_grouping(self):
+        """(groups, default) of the current report's `group_by`."""
+        return self.groupings[self.action]
+
+    def report(self, build):
+        groups = parse_group_by(self.request.query_params.get('group_by'), *self.get_grouping())
+        rows = build(self.filter_queryset(self.get_queryset()), groups)
+        return self.get_paginated_response(self.get_serializer(rows).data)
+
+    @action(detail=False, methods=['get'])
+    @method_decorator(condition(etag_func=conditional.api_etag, last_modified_func=conditional.last_modified))
+    def sales(self, request):
+        """
+        Number and value of orders (`GET /api/reports/sales/`), grouped by
+        `hour`, `day`, `table` and/or `status` (default `day`).
+
+        Filters: `created_after`, `created_before` (ISO 8601, applied to hour
+        buckets), `status`, `table_number`.
+        """
+        return self.report(reports.sales_report)
+
+    @action(detail=False, methods=['get'])
+    @method_decorator(condition(etag_func=conditional.api_etag, last_modified_func=conditional.last_modified))
+    def dishes(self, request):
+        """
+        Dishes sold in paid orders (`GET /api/reports/dishes/`), grouped by
+        `day` and/or `dish` (default `dish`).
+
+        Filters: `day_after`, `day_before` (ISO dates), `dish`.
+        """
+        return self.report(reports.dish_report)
+
+
+class TableViewSet(viewsets.GenericViewSet):
+    """
+    Open bills per table (`GET /api/tables/`): the number and value of the
+    orders of each table that are not paid yet, in all and per status. Read
+    with one grouped query for all tables (see `orders.tables`) and answered
+    as `{"results": [...]}`.
+    """
+    serializer_class = OpenBillSerializer
+    pagination_class = ResultsPagination
+    filter_backends = []
+
+    @method_decorator(condition(etag_func=conditional.api_etag, last_modified_func=conditional.last_modified))
+    def list(self, request):
+        version, _ = conditional.request_version(request)
+        bills = self.paginate_queryset(tables.open_bills(version))
+        return self.get_paginated_response(self.get_serializer(bills, many=True).data)
+
+
+@condition(etag_func=conditional.page_etag, last_modified_func=conditional.last_modified)
 def order_list(request):
     """
     Display a list of orders with filtering and sorting options.
@@ -31,41 +373,84 @@ def order_list(request):
     This view renders 'orders/orders_list.html' template and passes the following
     context variables to it:
 
-    - orders: A list of orders filtered and sorted according to the query
+    - orders: One page of orders filtered and sorted according to the query
       parameters.
+    - rows: The rendered table rows of `orders`, served from the fragment
+      cache when the orders have not changed since they were last rendered.
+    - page: The KeysetPage the orders belong to.
+    - next_query, previous_query: Query strings of the neighbouring pages, or
+      None when there is no such page.
     - revenue: The total revenue of all paid orders.
     - form: An instance of OrderFilterForm bound to the query parameters.
 
+    Orders are paginated with a keyset on (ordering, id), so the page is
+    selected by an indexed seek instead of OFFSET. An invalid `cursor`
+    parameter results in a 400 response.
+
+    Responses carry an ETag and Last-Modified from the orders change version,
+    and a conditional request for an unchanged list gets a 304 without
+    reading any orders.
+
     The view handles exceptions by logging them and returning a 500 error
     response.
     """
     try:
-        orders = Order.objects.all()
-        revenue = Order.objects.filter(status='paid').aggregate(total=Sum('total_price'))['total'] or 0
+        revenue = total_revenue()
         form = OrderFilterForm(request.GET)
-
-        if form.is_valid():
-            status = form.cleaned_data.get('status')
-            table_number = form.cleaned_data.get('table_number')
-            search = form.cleaned_data.get('search')
-            ordering = form.cleaned_data.get('ordering')
-
-            if status:
-                orders = orders.filter(status=status)
-            if table_number:
-                orders = orders.filter(table_number=table_number)
-            if search:
-                orders = orders.filter(items__icontains=search)
-            if ordering:
-                orders = orders.order_by(ordering)
-
-        return render(request, 'orders/orders_list.html', {'orders': orders, 'revenue': revenue, 'form': form})
+        orders, ordering = filter_orders(form)
+        page = keyset_paginate(orders, ordering, request.GET.get('cursor'))
+        return render(request, 'orders/orders_list.html', list_context(request, page, revenue, form))
+    except InvalidCursor as e:
+        return HttpResponseBadRequest(str(e))
     except Exception as e:
-        #  Log the exception for debugging
-        print(f"Error in order_list: {e}")
+        logger.exception("Error in order_list: %s", e)
         return HttpResponseServerError("An error occurred while processing your request.")
 
 
+def filter_orders(form):
+    """Applies a bound OrderFilterForm to the orders. Returns (queryset, ordering for keyset_paginate)."""
+    orders = Order.objects.all()
+    ordering = None
+    if form.is_valid():
+        status = form.cleaned_data.get('status')
+        table_number = form.cleaned_data.get('table_number')
+        search = form.cleaned_data.get('search')
+        ordering = form.cleaned_data.get('ordering')
+
+        if status:
+            orders = orders.filter(status=status)
+        if table_number:
+            orders = orders.filter(table_number=table_number)
+        if search:
+            # Without an explicit ordering the most relevant orders come first.
+            orders = orders.search(search, ranked=not ordering)
+            ordering = ordering or 'search_rank'
+    return orders, ordering
+
+
+def list_context(request, page, revenue, form):
+    """Context of orders_list.html; see `order_list`."""
+    return {
+        'orders': page.items,
+        'rows': fragments.render_rows(page.items),
+        'page': page,
+        'next_query': _page_query(request, page.next_cursor),
+        'previous_query': _page_query(request, page.previous_cursor),
+        'revenue': revenue,
+        'form': form,
+    }
+
+
+def _page_query(request, cursor):
+    """Returns the current query string with `cursor` replaced, or None without a cursor."""
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query.pop('csrfmiddlewaretoken', None)
+    query['cursor'] = cursor
+    return query.urlencode()
+
+
 def order_create(request):
     """
     Handles the creation of a new order.
@@ -99,18 +484,20 @@ def order_create(request):
                return HttpResponseBadRequest("Invalid items format.")
             total_price = sum(Decimal(item['price']) for item in items)
 
-            order = Order.objects.create(
+            order = writer.create(Order(
                 table_number=table_number,
                 items=items,
                 total_price=total_price,
                 status='pending'
-            )
+            ))
             return redirect('orders_list')
         except (ValueError, KeyError) as e:
             # Handle specific errors during parsing or creation
             return HttpResponseBadRequest(f"Invalid input data: {e}")
+        except writer.WriteTimeout as e:
+            return HttpResponse(e.detail, status=e.status_code)
         except Exception as e:
-            print(f"Error in order_create: {e}")
+            logger.exception("Error in order_create: %s", e)
             return HttpResponseServerError("An error occurred while creating the order.")
 
     return render(request, 'orders/order_form.html')
@@ -136,7 +523,7 @@ def order_update(request, pk):
         if request.method == 'POST':
             form = OrderUpdateForm(request.POST, instance=order)
             if form.is_valid():
-                form.save()
+                writer.run(form.save)
                 return redirect('orders_list')
             else:
                 return render(request, 'orders/order_edit.html', {'form': form, 'order': order}) #return form with errors
@@ -146,8 +533,10 @@ def order_update(request, pk):
 
     except Http404:
         raise Http404("Order not found")  #  explicitly raise 404
+    except writer.WriteTimeout as e:
+        return HttpResponse(e.detail, status=e.status_code)
     except Exception as e:
-        print(f"Error in order_update: {e}")
+        logger.exception("Error in order_update: %s", e)
         return HttpResponseServerError("An error occurred while updating the order.")
 
 
@@ -175,13 +564,15 @@ def order_delete(request, pk):
     try:
         order = get_object_or_404(Order, pk=pk)
         if request.method == 'POST':
-            order.delete()
+            writer.run(order.delete)
             return redirect('orders_list')
         return render(request, 'orders/order_confirm_delete.html', {'order': order})
     except Http404:
         raise Http404("Order not found")
+    except writer.WriteTimeout as e:
+        return HttpResponse(e.detail, status=e.status_code)
     except Exception as e:
-        print(f"Error in order_delete: {e}")
+        logger.exception("Error in order_delete: %s", e)
         return HttpResponseServerError("An error occurred while deleting the order.")
 
 def parse_items(items_input):
@@ -203,6 +594,109 @@ def parse_items(items_input):
 
             items.append({'name': name, 'price': str(price)})
     except ValueError as e:
-        print(f"Error parsing items: {e}")
+        logger.warning("Error parsing items: %s", e)
         return [] # Return empty if error
-    return items
\ No newline at end of file
+    return items
+
+
+def metrics_view(request):
+    """Returns the request metrics of this process in the Prometheus text format."""
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@condition(etag_func=conditional.page_etag, last_modified_func=conditional.last_modified)
+def order_tables(request):
+    """
+    Display the open bill of every table with unpaid orders.
+
+    This view renders 'orders/order_tables.html' template and passes the
+    following context variables to it:
+
+    - statuses: Labels of the open statuses, in the order of the columns.
+    - tables: One entry per table with its `table_number`, `orders_count`,
+      `total` and `by_status`, the statuses' counts and totals in column order.
+    - orders_count, total: The open orders of all tables.
+    """
+    version, _ = conditional.request_version(request)
+    bills = tables.open_bills(version)
+    labels = dict(Order.STATUS_CHOICES)
+    rows = [
+        {**bill, 'by_status': [bill['statuses'][status] for status in tables.OPEN_STATUSES]}
+        for bill in bills
+    ]
+    return render(request, 'orders/order_tables.html', {
+        'statuses': [labels[status] for status in tables.OPEN_STATUSES],
+        'tables': rows,
+        'orders_count': sum(bill['orders_count'] for bill in bills),
+        'total': sum((bill['total'] for bill in bills), Decimal('0.00')),
+    })
+
+
+def order_board(request):
+    """Renders the kitchen/floor board, which stays current through `order_events`."""
+    return render(request, 'orders/order_board.html')
+
+
+async def order_events(request):
+    """
+    Streams order events as server-sent events.
+
+    The stream opens with a `snapshot` event listing the open (not paid)
+    orders, followed by `order_created`, `order_updated` and `order_deleted`
+    deltas. Every event carries an id; a client reconnecting with a
+    `Last-Event-ID` header that is still in the broker's history receives
+    the missed deltas instead of a new snapshot. Idle clients cost no
+    database queries: only the snapshot reads the orders table.
+
+    Requires an ASGI server (`cafe.asgi.application`). Under WSGI the
+    response would be read to its end before it is sent, which never comes,
+    so the view answers 501 instead.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse("The event stream needs an ASGI server.", status=501)
+    return StreamingHttpResponse(
+        _event_stream(request.headers.get('Last-Event-ID')),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+async def _event_stream(last_event_id):
+    subscription, seq = events.broker.subscribe()
+    keepalive = getattr(settings, 'ORDERS_EVENTS_KEEPALIVE', 15)
+    try:
+        backlog = None
+        if last_event_id:
+            try:
+                backlog = events.broker.events_since(int(last_event_id))
+            except ValueError:
+                backlog = None
+        if backlog is None:
+            orders = await sync_to_async(events.snapshot)()
+            yield events.format_event('snapshot', {'orders': orders}, seq)
+        else:
+            for event in backlog:
+                if event.seq <= seq:
+                    yield events.format_event(event.kind, event.data, event.seq)
+
+        while True:
+            if subscription.overflowed:
+                # The client fell behind and lost events: start over from a snapshot.
+                subscription.overflowed = False
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                seq = events.broker.seq
+                orders = await sync_to_async(events.snapshot)()
+                yield events.format_event('snapshot', {'orders': orders}, seq)
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if event.seq <= seq:
+                continue
+            seq = event.seq
+            yield events.format_event(event.kind, event.data, event.seq)
+    finally:
+        events.broker.unsubscribe(subscription)
+
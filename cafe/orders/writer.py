@@ -0,0 +1,300 @@
+"""
+A single writer thread for order writes on SQLite.
+
+SQLite allows one writer at a time. When request threads write directly, they
+wait on each other's locks and, past the busy timeout, fail with "database is
+locked". With `ORDERS_WRITE_QUEUE` enabled the views hand their writes to
+this thread instead. It takes every job waiting in the queue (up to
+`ORDERS_WRITE_BATCH_SIZE`), runs them in one transaction and commits them
+together, so a burst of writes costs one lock acquisition and one sync to
+disk. Each job runs in its own savepoint: a failing job is rolled back and
+reported to its caller without affecting the rest of the batch. Callers wait
+until their batch is committed, so a redirect after a write still shows it.
+
+With WAL enabled (see DATABASES in settings) readers do not wait for the
+writer at all.
+
+Order creations get more out of a batch: consecutive `create` jobs are
+merged into one `bulk.create_orders` call, a single multi-row INSERT, and
+each caller gets its order back with the id assigned by that insert. To
+let a burst of creations gather, the thread waits up to
+`ORDERS_WRITE_LINGER_MS` for more jobs once a batch has more than one. The
+queue holds at most `ORDERS_WRITE_QUEUE_SIZE` jobs; when it is full,
+callers wait for room.
+
+Writes requested inside a transaction run inline in the calling thread,
+since they must be part of that transaction.
+
+Callers wait at most `ORDERS_WRITE_TIMEOUT` seconds for their batch; past
+that their job is cancelled if it has not started yet, and WriteTimeout is
+raised (a 503 in the API). If the thread dies, the jobs it had taken or
+still queued fail with its error, and the next write starts a new thread.
+"""
+import asyncio
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, wait
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from rest_framework.exceptions import APIException
+
+from . import bulk
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+
+DEFAULT_QUEUE_SIZE = 1000
+
+DEFAULT_LINGER_MS = 2
+
+DEFAULT_TIMEOUT = 30
+
+_STOP = object()
+
+
+class WriteTimeout(APIException):
+    """A write was not committed within ORDERS_WRITE_TIMEOUT seconds."""
+    status_code = 503
+    default_detail = "The write was not committed in time; try again later."
+    default_code = 'write_timeout'
+
+
+def insert(order):
+    """Inserts an unsaved Order. Consecutive queued insert jobs are merged into one (see `Writer.run_inserts`)."""
+    bulk.create_orders([order])
+    return order
+
+
+class Writer:
+    def __init__(self, using=DEFAULT_DB_ALIAS, batch_size=None, queue_size=None, linger_ms=None):
+        self.using = using
+        self.batch_size = batch_size or getattr(settings, 'ORDERS_WRITE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        self.queue = queue.Queue(queue_size or getattr(settings, 'ORDERS_WRITE_QUEUE_SIZE', DEFAULT_QUEUE_SIZE))
+        if linger_ms is None:
+            linger_ms = getattr(settings, 'ORDERS_WRITE_LINGER_MS', DEFAULT_LINGER_MS)
+        self.linger = linger_ms / 1000
+        # Committed batches and jobs, for benchmarks and tests.
+        self.batches = 0
+        self.jobs = 0
+        self.thread = threading.Thread(target=self.loop, name='orders-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queues `fn(*args, **kwargs)`, waiting for room if the queue is full.
+        Returns a Future resolved once its batch is committed.
+        """
+        future = Future()
+        self.queue.put((future, fn, args, kwargs))
+        return future
+
+    def submit_nowait(self, fn, *args, **kwargs):
+        """Like `submit`, but raises queue.Full instead of waiting."""
+        future = Future()
+        self.queue.put_nowait((future, fn, args, kwargs))
+        return future
+
+    def stop(self):
+        self.queue.put(_STOP)
+        self.thread.join()
+
+    def loop(self):
+        batch = []
+        try:
+            while True:
+                batch = [self.queue.get()]
+                deadline = None
+                while batch[-1] is not _STOP and len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                        continue
+                    except queue.Empty:
+                        pass
+                    # A lone write is committed at once; a burst is given a
+                    # moment to gather.
+                    if len(batch) == 1 or not self.linger:
+                        break
+                    if deadline is None:
+                        deadline = time.monotonic() + self.linger
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(self.queue.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                stopping = batch[-1] is _STOP
+                if stopping:
+                    batch.pop()
+                if batch:
+                    self.run_batch(batch)
+                if stopping:
+                    return
+        except BaseException as e:
+            logger.exception("The writer thread stopped")
+            self.fail(batch, e)
+            while True:
+                try:
+                    self.fail([self.queue.get_nowait()], e)
+                except queue.Empty:
+                    break
+            raise
+        finally:
+            connections.close_all()
+
+    def fail(self, jobs, error):
+        """Fails the jobs that have no result yet with `error`."""
+        for job in jobs:
+            if job is not _STOP and not job[0].done():
+                job[0].set_exception(error)
+
+    def run_batch(self, batch):
+        connection = connections[self.using]
+        connection.close_if_unusable_or_obsolete()
+        results = []
+        try:
+            with transaction.atomic(using=self.using):
+                inserts = []
+                for job in batch:
+                    if not job[0].set_running_or_notify_cancel():
+                        continue
+                    if job[1] is insert:
+                        inserts.append(job)
+                        continue
+                    if inserts:
+                        self.run_inserts(inserts, results)
+                        inserts = []
+                    self.run_job(job, results)
+                if inserts:
+                    self.run_inserts(inserts, results)
+        except Exception as e:
+            logger.exception("Write batch of %d jobs failed to commit", len(batch))
+            for future, _, _ in results:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.jobs += len(results)
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def run_job(self, job, results):
+        future, fn, args, kwargs = job
+        try:
+            with transaction.atomic(using=self.using):
+                results.append((future, fn(*args, **kwargs), None))
+        except Exception as e:
+            results.append((future, None, e))
+
+    def run_inserts(self, jobs, results):
+        """Runs consecutive `insert` jobs as one bulk insert; one by one if that fails."""
+        orders = [args[0] for _, _, args, _ in jobs]
+        if len(jobs) > 1:
+            try:
+                with transaction.atomic(using=self.using):
+                    bulk.create_orders(orders)
+            except Exception:
+                for order in orders:
+                    order.pk = None
+                    order._state.adding = True
+            else:
+                results.extend((future, order, None) for (future, *_), order in zip(jobs, orders))
+                return
+        for job in jobs:
+            self.run_job(job, results)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def is_enabled(using=DEFAULT_DB_ALIAS):
+    """True if writes should go through the writer thread from the current thread."""
+    if not getattr(settings, 'ORDERS_WRITE_QUEUE', False):
+        return False
+    return not connections[using].in_atomic_block
+
+
+def get_writer():
+    """The writer thread, started if there is none or the previous one died."""
+    global _writer
+    with _writer_lock:
+        if _writer is not None and not _writer.thread.is_alive():
+            logger.error("The writer thread is gone; starting a new one")
+            _writer = None
+        if _writer is None:
+            _writer = Writer()
+        return _writer
+
+
+def stop():
+    """Stops the writer thread after the queued jobs are done; it is restarted on the next write."""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.stop()
+
+
+atexit.register(stop)
+
+
+def get_timeout():
+    return getattr(settings, 'ORDERS_WRITE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def run(fn, *args, **kwargs):
+    """
+    Runs a write through the writer thread (or inline, see `is_enabled`) and
+    returns its result. Raises WriteTimeout if it is not committed within
+    ORDERS_WRITE_TIMEOUT seconds.
+    """
+    if not is_enabled():
+        return fn(*args, **kwargs)
+    future = get_writer().submit(fn, *args, **kwargs)
+    done, _ = wait([future], timeout=get_timeout())
+    if not done:
+        future.cancel()
+        raise WriteTimeout
+    return future.result()
+
+
+async def arun(fn, *args, **kwargs):
+    """Async version of `run`: awaits the writer thread without holding a thread."""
+    if not await sync_to_async(is_enabled)():
+        return await sync_to_async(fn)(*args, **kwargs)
+    writer = get_writer()
+    try:
+        future = writer.submit_nowait(fn, *args, **kwargs)
+    except queue.Full:
+        # Wait for room in a thread rather than blocking the event loop.
+        future = await sync_to_async(writer.submit, thread_sensitive=False)(fn, *args, **kwargs)
+    waiter = asyncio.wrap_future(future)
+    done, _ = await asyncio.wait([waiter], timeout=get_timeout())
+    if not done:
+        # Cancels the job too, unless it has started.
+        waiter.cancel()
+        raise WriteTimeout
+    return waiter.result()
+
+
+def create(order):
+    """
+    Inserts an unsaved Order through the writer thread, in one bulk insert
+    with the other creations queued at the same time. Returns the order
+    with its id set.
+    """
+    return run(insert, order)
+
+
+async def acreate(order):
+    return await arun(insert, order)